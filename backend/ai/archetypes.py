@@ -0,0 +1,252 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from db import get_db_pool
+from ai.generation import GenerationHandler, generation_handler
+from ai.resilience import Deadline
+from embedding_cache import get_or_embed
+from models import CompressedContext
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ARCHETYPES = [
+    "Technical recruiter hiring for IT support, systems administration and software roles",
+    "Backend or infrastructure engineer interested in homelabs, networking and self-hosting",
+    "Startup founder looking for a versatile early hire who can build and ship products",
+    "Esports organization looking for a coach or team manager",
+]
+# Pipe-separated visitor summaries to pre-generate initial_load blocks for
+ARCHETYPES = [a.strip() for a in os.getenv("ARCHETYPES", "|".join(DEFAULT_ARCHETYPES)).split("|") if a.strip()]
+ARCHETYPE_CACHE_ENABLED = os.getenv("ARCHETYPE_CACHE_ENABLED", "true").lower() == "true"
+# Minimum cosine similarity between a visitor summary and an archetype to serve its block
+ARCHETYPE_MATCH_THRESHOLD = float(os.getenv("ARCHETYPE_MATCH_THRESHOLD", "0.85"))
+ARCHETYPE_GENERATION_DEADLINE_SECONDS = 90
+
+
+async def corpus_version() -> str:
+    """Fingerprint of the seeded corpus; changes whenever seeding adds, edits or removes a file."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        version = await conn.fetchval("""
+            SELECT md5(COALESCE(string_agg(source_file || ':' || content_hash, ',' ORDER BY source_file), ''))
+            FROM experiences
+        """)
+    return version
+
+
+def is_initial_load(action_type: Optional[str], context: Optional[CompressedContext], regenerate: bool) -> bool:
+    """Only a visitor's very first block can be served from an archetype."""
+    if regenerate or (action_type or "initial_load") != "initial_load":
+        return False
+    return not context or not (context.block_summaries or context.shown_experience_counts)
+
+
+class ArchetypeWarmCache:
+    """
+    Pre-generated initial_load blocks and buttons for common visitor archetypes.
+
+    Blocks are generated in the background at startup and persisted in the
+    archetype_blocks table tagged with the corpus version, so restarts reuse
+    them until seeding changes the corpus. An incoming visitor summary is
+    matched to the nearest archetype by embedding.
+    """
+
+    def __init__(
+        self,
+        handler: GenerationHandler,
+        archetypes: List[str] = ARCHETYPES,
+        threshold: float = ARCHETYPE_MATCH_THRESHOLD,
+        enabled: bool = ARCHETYPE_CACHE_ENABLED
+    ):
+        self.handler = handler
+        self.archetypes = archetypes
+        self.threshold = threshold
+        self.enabled = enabled
+        self.started = False
+        self.corpus_version: Optional[str] = None
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.loaded = 0
+        self.last_warm_seconds: Optional[float] = None
+
+    def start(self):
+        """Warm the cache in the background and keep it refreshable from then on."""
+        if not self.enabled or not self.archetypes:
+            return
+        self.started = True
+        self.refresh()
+
+    def refresh(self):
+        """Re-warm in the background (e.g. after the corpus changed); no-op until started."""
+        if not self.started:
+            return
+        if self._task and not self._task.done():
+            self._task.cancel()
+        self._task = asyncio.create_task(self.warm())
+
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _embed(self, text: str, deadline: Optional[Deadline] = None) -> np.ndarray:
+        vector = np.asarray(await get_or_embed(text, "semantic_similarity", deadline), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    async def warm(self):
+        """Load persisted archetype blocks for the current corpus and generate the missing ones."""
+        start = time.perf_counter()
+        try:
+            version = await corpus_version()
+            pool = await get_db_pool()
+            async with pool.acquire() as conn:
+                rows = await conn.fetch("""
+                    SELECT archetype, embedding, html, block_summary, experience_ids, buttons
+                    FROM archetype_blocks
+                    WHERE corpus_version = $1 AND archetype = ANY($2::text[])
+                """, version, self.archetypes)
+                # Blocks for an older corpus or a dropped archetype can never be served again
+                await conn.execute("""
+                    DELETE FROM archetype_blocks
+                    WHERE corpus_version <> $1 OR NOT (archetype = ANY($2::text[]))
+                """, version, self.archetypes)
+
+            entries = {}
+            for row in rows:
+                entries[row["archetype"]] = {
+                    "embedding": row["embedding"],
+                    "html": row["html"],
+                    "block_summary": row["block_summary"],
+                    "experience_ids": list(row["experience_ids"]),
+                    "buttons": json.loads(row["buttons"])
+                }
+            self.loaded += len(entries)
+            self.corpus_version = version
+            self._entries = entries
+
+            for archetype in self.archetypes:
+                if archetype in entries:
+                    continue
+                try:
+                    entry = await self._generate(archetype)
+                except Exception as e:
+                    logger.warning(f"[ARCHETYPE] Failed to warm '{archetype}': {e}")
+                    continue
+                await self._persist(archetype, version, entry)
+                self._entries = {**self._entries, archetype: entry}
+                self.generated += 1
+
+            self.last_warm_seconds = time.perf_counter() - start
+            logger.info(f"[ARCHETYPE] Warm cache ready: {len(self._entries)}/{len(self.archetypes)} archetypes in {self.last_warm_seconds:.1f}s")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"[ARCHETYPE] Warm-up failed: {e}", exc_info=True)
+
+    async def _generate(self, archetype: str) -> Dict[str, Any]:
+        deadline = Deadline(ARCHETYPE_GENERATION_DEADLINE_SECONDS)
+        embedding_task = asyncio.create_task(self._embed(archetype, deadline))
+        experiences = await self.handler.retrieve_experiences(archetype, None, deadline)
+        block, buttons = await asyncio.gather(
+            self.handler.generate_block(
+                visitor_summary=archetype,
+                action_type="initial_load",
+                action_value=archetype,
+                context=None,
+                deadline=deadline,
+                experiences=experiences
+            ),
+            self.handler.generate_buttons(archetype, [], None, deadline, experiences)
+        )
+        return {
+            "embedding": await embedding_task,
+            "html": block["html"],
+            "block_summary": block["block_summary"],
+            "experience_ids": block["experience_ids"],
+            "buttons": [b.model_dump() for b in buttons]
+        }
+
+    async def _persist(self, archetype: str, version: str, entry: Dict[str, Any]):
+        pool = await get_db_pool()
+        async with pool.acquire() as conn:
+            await conn.execute("""
+                INSERT INTO archetype_blocks (archetype, corpus_version, embedding, html, block_summary, experience_ids, buttons)
+                VALUES ($1, $2, $3, $4, $5, $6, $7)
+                ON CONFLICT (archetype) DO UPDATE
+                SET corpus_version = EXCLUDED.corpus_version, embedding = EXCLUDED.embedding,
+                    html = EXCLUDED.html, block_summary = EXCLUDED.block_summary,
+                    experience_ids = EXCLUDED.experience_ids, buttons = EXCLUDED.buttons,
+                    created_at = NOW()
+            """, archetype, version, entry["embedding"],
+                entry["html"], entry["block_summary"], entry["experience_ids"], json.dumps(entry["buttons"]))
+
+    async def match(self, visitor_summary: str, deadline: Optional[Deadline] = None) -> Optional[Dict[str, Any]]:
+        """
+        Find the pre-generated block for the archetype nearest to a visitor summary.
+
+        Returns:
+            Dict with 'html', 'block_summary', 'experience_ids', 'buttons' and
+            'archetype', or None if no archetype is similar enough
+        """
+        entries = self._entries
+        if not self.enabled or not entries or not visitor_summary:
+            return None
+
+        try:
+            query = await self._embed(visitor_summary, deadline)
+        except Exception as e:
+            logger.warning(f"[ARCHETYPE] Could not embed visitor summary: {e}")
+            return None
+
+        best, best_score = None, self.threshold
+        for archetype, entry in entries.items():
+            score = float(entry["embedding"] @ query)
+            if score >= best_score:
+                best, best_score = archetype, score
+
+        if best is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        logger.info(f"[ARCHETYPE] Serving warm block for '{best}' (similarity {best_score:.3f})")
+        entry = entries[best]
+        return {
+            "html": entry["html"],
+            "block_summary": entry["block_summary"],
+            "experience_ids": list(entry["experience_ids"]),
+            "buttons": list(entry["buttons"]),
+            "archetype": best
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "archetypes": len(self.archetypes),
+            "warm": len(self._entries),
+            "corpus_version": self.corpus_version,
+            "loaded": self.loaded,
+            "generated": self.generated,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "last_warm_seconds": self.last_warm_seconds
+        }
+
+
+# Global archetype warm cache instance
+archetype_cache = ArchetypeWarmCache(generation_handler)
@@ -0,0 +1,161 @@
+import os
+import time
+import uuid
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from ai.resilience import Deadline
+from embedding_cache import get_or_embed
+
+logger = logging.getLogger(__name__)
+
+BLOCK_CACHE_ENABLED = os.getenv("BLOCK_CACHE_ENABLED", "true").lower() == "true"
+# Minimum cosine similarity between (visitor_summary, action_value) embeddings for a hit
+BLOCK_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("BLOCK_CACHE_SIMILARITY_THRESHOLD", "0.95"))
+BLOCK_CACHE_MAX_ENTRIES = int(os.getenv("BLOCK_CACHE_MAX_ENTRIES", "500"))
+BLOCK_CACHE_TTL_SECONDS = float(os.getenv("BLOCK_CACHE_TTL_SECONDS", str(24 * 3600)))
+
+
+class _CachedBlock:
+    def __init__(
+        self,
+        embedding: np.ndarray,
+        experience_ids: List[str],
+        block: Dict[str, Any],
+        generation_seconds: float,
+        estimated_tokens: int,
+        created_at: float
+    ):
+        self.embedding = embedding
+        self.experience_ids = frozenset(experience_ids)
+        self.block = block
+        self.generation_seconds = generation_seconds
+        self.estimated_tokens = estimated_tokens
+        self.created_at = created_at
+
+
+class SemanticBlockCache:
+    """
+    Semantic cache of generated blocks keyed on visitor persona and action.
+
+    Entries are found by cosine similarity between embeddings of
+    "visitor_summary / action_value", and only served when retrieval picked
+    exactly the same experiences, so a hit never shows content the request
+    wouldn't have been generated from. Least recently used entries are evicted
+    first, and the whole cache is cleared when the corpus changes.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = BLOCK_CACHE_ENABLED,
+        threshold: float = BLOCK_CACHE_SIMILARITY_THRESHOLD,
+        max_entries: int = BLOCK_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = BLOCK_CACHE_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[str, _CachedBlock]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.seconds_saved = 0.0
+        self.tokens_saved = 0
+
+    @staticmethod
+    def key_text(visitor_summary: str, action_value: str) -> str:
+        return f"Visitor: {visitor_summary}\nRequest: {action_value}"
+
+    async def key_embedding(
+        self,
+        visitor_summary: str,
+        action_value: str,
+        deadline: Optional[Deadline] = None
+    ) -> np.ndarray:
+        """Normalized embedding of the (visitor_summary, action_value) pair."""
+        embedding = await get_or_embed(self.key_text(visitor_summary, action_value), "semantic_similarity", deadline)
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding: np.ndarray, experience_ids: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        Find the most similar cached block generated from the same experiences.
+
+        Returns:
+            Dict with 'html', 'block_summary' and 'experience_ids', or None on a miss
+        """
+        if not self.enabled:
+            return None
+
+        now = self._clock()
+        best_id, best_score = None, self.threshold
+        for entry_id, entry in list(self._entries.items()):
+            if now - entry.created_at > self.ttl_seconds:
+                del self._entries[entry_id]
+                self.evictions += 1
+                continue
+            if entry.experience_ids != frozenset(experience_ids):
+                continue
+            score = float(entry.embedding @ embedding)
+            if score >= best_score:
+                best_id, best_score = entry_id, score
+
+        if best_id is None:
+            self.misses += 1
+            return None
+
+        entry = self._entries[best_id]
+        self._entries.move_to_end(best_id)
+        self.hits += 1
+        self.seconds_saved += entry.generation_seconds
+        self.tokens_saved += entry.estimated_tokens
+        logger.info(f"[BLOCK CACHE] Hit (similarity {best_score:.3f}, saved {entry.generation_seconds:.1f}s)")
+        return dict(entry.block)
+
+    def store(
+        self,
+        embedding: np.ndarray,
+        experience_ids: List[str],
+        block: Dict[str, Any],
+        generation_seconds: float,
+        estimated_tokens: int
+    ):
+        """Cache a freshly generated block (html, block_summary, experience_ids)."""
+        if not self.enabled:
+            return
+        self._entries[uuid.uuid4().hex] = _CachedBlock(
+            embedding, experience_ids, block, generation_seconds, estimated_tokens, self._clock()
+        )
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Drop every entry, e.g. after the corpus changed under the cached blocks."""
+        if self._entries:
+            logger.info(f"[BLOCK CACHE] Cleared {len(self._entries)} entries")
+        self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "latency_saved_seconds": round(self.seconds_saved, 3),
+            "estimated_tokens_saved": self.tokens_saved
+        }
+
+
+# Global semantic block cache instance
+block_cache = SemanticBlockCache()
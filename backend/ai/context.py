@@ -0,0 +1,133 @@
+import os
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+from ai.tokens import count_tokens, truncate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Token budget per prompt section (local approximation, see ai.tokens)
+CONTEXT_BUDGETS = {
+    "visitor_summary": int(os.getenv("CONTEXT_VISITOR_SUMMARY_TOKENS", "250")),
+    "user_input": int(os.getenv("CONTEXT_USER_INPUT_TOKENS", "200")),
+    "block_summaries": int(os.getenv("CONTEXT_BLOCK_SUMMARIES_TOKENS", "400")),
+    "rag_results": int(os.getenv("CONTEXT_RAG_RESULTS_TOKENS", "2500")),
+    "history": int(os.getenv("CONTEXT_HISTORY_TOKENS", "1500")),
+    "html": int(os.getenv("CONTEXT_HTML_TOKENS", "3000")),
+}
+
+
+class ContextPacker:
+    """
+    Fits the variable sections of a prompt into fixed token budgets.
+
+    Free text (visitor summary, user input, block HTML) is truncated; lists
+    (prior block summaries, chat turns, RAG results) are packed by priority
+    and the lowest-priority items are dropped whole. Each assembled prompt's
+    final section sizes are logged and aggregated per template, so prompt
+    size stays flat however long a session gets.
+    """
+
+    def __init__(self, budgets: Optional[Dict[str, int]] = None):
+        self.budgets = dict(budgets or CONTEXT_BUDGETS)
+        self.truncated: Dict[str, int] = {}
+        self.dropped: Dict[str, int] = {}
+        self._templates: Dict[str, Dict[str, Any]] = {}
+
+    def pack_text(self, section: str, text: str) -> str:
+        """
+        Truncate text to its section budget.
+
+        Args:
+            section: Key into the budgets
+            text: Section text
+
+        Returns:
+            text, cut at the budget if it didn't fit
+        """
+        packed = truncate_tokens(text, self.budgets[section])
+        if packed != text:
+            self.truncated[section] = self.truncated.get(section, 0) + 1
+        return packed
+
+    def pack_items(
+        self,
+        section: str,
+        items: Sequence[str],
+        scores: Optional[Sequence[float]] = None,
+        separator_tokens: int = 1
+    ) -> List[int]:
+        """
+        Choose which items of a list section fit its budget.
+
+        Scored items are considered highest score first, and each one that
+        fits is kept. Without scores the most recent (last) items are kept,
+        stopping at the first that doesn't fit so the kept run stays contiguous.
+
+        Args:
+            section: Key into the budgets
+            items: Rendered text of each item
+            scores: Optional priority per item
+            separator_tokens: Tokens joining consecutive items (e.g. a newline)
+
+        Returns:
+            Indexes of the kept items in their original order
+        """
+        budget = self.budgets[section]
+        priority = scores if scores is not None else range(len(items))
+        order = sorted(range(len(items)), key=lambda i: priority[i], reverse=True)
+
+        kept, used = [], 0
+        for i in order:
+            cost = count_tokens(items[i]) + separator_tokens
+            if used + cost <= budget:
+                kept.append(i)
+                used += cost
+            elif scores is None:
+                break
+
+        dropped = len(items) - len(kept)
+        if dropped:
+            self.dropped[section] = self.dropped.get(section, 0) + dropped
+        return sorted(kept)
+
+    def record(self, template: str, sections: Dict[str, str]) -> Dict[str, int]:
+        """
+        Log and aggregate the final token size of each section of a prompt.
+
+        Args:
+            template: Prompt template name ('block', 'chat', ...)
+            sections: Final text of every variable section
+
+        Returns:
+            {section: tokens} plus the 'total'
+        """
+        sizes = {section: count_tokens(text) for section, text in sections.items()}
+        total = sum(sizes.values())
+        details = ", ".join(f"{section}={tokens}" for section, tokens in sizes.items())
+        logger.info(f"[CONTEXT] {template}: {details} (total {total} tokens)")
+
+        stats = self._templates.setdefault(template, {"prompts": 0, "total_tokens": 0, "max_tokens": 0})
+        stats["prompts"] += 1
+        stats["total_tokens"] += total
+        stats["max_tokens"] = max(stats["max_tokens"], total)
+        return {**sizes, "total": total}
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "budgets": self.budgets,
+            "templates": {
+                template: {
+                    "prompts": stats["prompts"],
+                    "avg_tokens": round(stats["total_tokens"] / stats["prompts"], 1),
+                    "max_tokens": stats["max_tokens"]
+                }
+                for template, stats in self._templates.items()
+            },
+            "truncated": dict(self.truncated),
+            "dropped": dict(self.dropped)
+        }
+
+
+# Global context packer instance
+context_packer = ContextPacker()
@@ -0,0 +1,129 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from ai.llm import llm_handler, LLMHandler
+from ai.resilience import Deadline, DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+# How long the first query in a batch waits for others to join (0 disables batching)
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "3"))
+EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "32"))
+
+
+class _Pending:
+    """A queued embedding request waiting for its batch to be sent."""
+
+    def __init__(self, text: str, deadline: Optional[Deadline]):
+        self.text = text
+        self.deadline = deadline
+        self.enqueued_at = time.monotonic()
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent embedding requests into batched provider calls.
+
+    The first request for a task type opens a short window; every request that
+    arrives before it closes (or until the batch is full) is sent in the same
+    generate_embeddings call. A batch of one uses the single-text endpoint.
+    """
+
+    def __init__(
+        self,
+        llm: LLMHandler,
+        window_ms: float = EMBEDDING_BATCH_WINDOW_MS,
+        max_batch: int = EMBEDDING_MAX_BATCH
+    ):
+        self.llm = llm
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+        self._queues: Dict[str, List[_Pending]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self.batches = 0
+        self.requests = 0
+        self.max_batch_seen = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    async def embed(self, text: str, task_type: str = "retrieval_query", deadline: Optional[Deadline] = None) -> List[float]:
+        """Embed a single text, sharing a provider call with concurrent requests."""
+        if self.window_ms <= 0:
+            return await self.llm.generate_embedding(text, task_type=task_type, deadline=deadline)
+
+        pending = _Pending(text, deadline)
+        queue = self._queues.setdefault(task_type, [])
+        queue.append(pending)
+
+        if len(queue) >= self.max_batch:
+            self._flush(task_type)
+        elif task_type not in self._timers:
+            loop = asyncio.get_running_loop()
+            self._timers[task_type] = loop.call_later(self.window_ms / 1000, self._flush, task_type)
+
+        # Shield the shared future so one caller timing out doesn't cancel the batch
+        waiter = asyncio.shield(pending.future)
+        if deadline:
+            try:
+                return await asyncio.wait_for(waiter, deadline.remaining())
+            except asyncio.TimeoutError as e:
+                raise DeadlineExceeded("Query embedding ran out of time") from e
+        return await waiter
+
+    def _flush(self, task_type: str):
+        timer = self._timers.pop(task_type, None)
+        if timer:
+            timer.cancel()
+        batch = self._queues.pop(task_type, [])
+        if batch:
+            asyncio.get_running_loop().create_task(self._send(task_type, batch))
+
+    async def _send(self, task_type: str, batch: List[_Pending]):
+        now = time.monotonic()
+        waits = [(now - p.enqueued_at) * 1000 for p in batch]
+        self.batches += 1
+        self.requests += len(batch)
+        self.max_batch_seen = max(self.max_batch_seen, len(batch))
+        self.total_wait_ms += sum(waits)
+        self.max_wait_ms = max(self.max_wait_ms, max(waits))
+
+        # The batch may run as long as its most patient caller allows
+        deadline = None
+        if all(p.deadline for p in batch):
+            deadline = max((p.deadline for p in batch), key=lambda d: d.expires_at)
+
+        try:
+            if len(batch) == 1:
+                embeddings = [await self.llm.generate_embedding(batch[0].text, task_type=task_type, deadline=deadline)]
+            else:
+                logger.info(f"[EMBED] Batched {len(batch)} {task_type} embeddings (max wait {max(waits):.1f}ms)")
+                embeddings = await self.llm.generate_embeddings([p.text for p in batch], task_type=task_type, deadline=deadline)
+        except Exception as e:
+            for p in batch:
+                if not p.future.done():
+                    p.future.set_exception(e)
+                # Mark retrieved for callers that already gave up
+                p.future.exception()
+            return
+
+        for p, embedding in zip(batch, embeddings):
+            if not p.future.done():
+                p.future.set_result(embedding)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "avg_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_seen,
+            "avg_queue_wait_ms": self.total_wait_ms / self.requests if self.requests else 0.0,
+            "max_queue_wait_ms": self.max_wait_ms
+        }
+
+
+# Global embedding batcher instance for query embeddings
+embedding_batcher = EmbeddingBatcher(llm_handler)
@@ -1,20 +1,31 @@
+import time
+import asyncio
 import logging
 import json
 import re
-from typing import List, Optional, Dict, Any
+from typing import AsyncIterator, List, Optional, Dict, Any, Tuple
 
 from ai.llm import llm_handler, ModelSize, StructuredOutputError
-from rag import search_similar_experiences, format_rag_results
-from ai.prompts import (
-    CHAT_SYSTEM_PROMPT,
-    BLOCK_GENERATION_SYSTEM_PROMPT,
-    BUTTON_GENERATION_PROMPT,
-    SUMMARY_GENERATION_PROMPT
-)
+from ai.resilience import Deadline
+from ai.streaming import StreamCleaner
+from ai.summaries import summary_store
+from ai.summarizer import summarize_block, LLM_BLOCK_SUMMARIES
+from ai.block_cache import block_cache
+from ai.context import context_packer
+from ai.tokens import count_tokens
+from rag import search_similar_experiences, format_rag_results, RAG_RESULT_LIMIT
+from ai.prompt_assembly import prompt_assembler
 from models import CompressedContext, SuggestedButton, ButtonList
 
 logger = logging.getLogger(__name__)
 
+# Static buttons used whenever button generation fails
+DEFAULT_BUTTONS = [
+    SuggestedButton(label="Experience", prompt="Tell me about your professional experience"),
+    SuggestedButton(label="Skills", prompt="What are your key technical skills?"),
+    SuggestedButton(label="Projects", prompt="Show me some of your notable projects")
+]
+
 
 class GenerationHandler:
     """Consolidates prompt handling and generation logic for different request types."""
@@ -26,7 +37,8 @@ class GenerationHandler:
         self,
         message: str,
         history: List[Dict[str, str]],
-        user_turns: int
+        user_turns: int,
+        deadline: Optional[Deadline] = None
     ) -> Dict[str, Any]:
         """
         Generate chat response for onboarding conversation.
@@ -34,17 +46,19 @@ class GenerationHandler:
         Returns:
             Dict with 'ready', 'message', and optionally 'visitor_summary'
         """
-        # Build history text
-        history_text = ""
+        # Build history text from the most recent turns that fit the budget
+        lines = []
         for msg in history:
             role = "Visitor" if msg.get("role") == "user" else "Assistant"
-            history_text += f"{role}: {msg.get('content')}\n"
+            lines.append(f"{role}: {msg.get('content')}\n")
+        history_text = "".join(lines[i] for i in context_packer.pack_items("history", lines))
 
-        if message:
-            history_text += f"Visitor: {message}\n"
+        message_text = f"Visitor: {context_packer.pack_text('user_input', message)}\n" if message else ""
+        context_packer.record("chat", {"history": history_text, "user_input": message_text})
+        history_text += message_text
 
-        # Build system prompt with turn-based hints
-        system_instruction = CHAT_SYSTEM_PROMPT
+        # Build system prompt with turn-based hints after the static prefix
+        system_instruction = prompt_assembler.render("chat")
         if user_turns >= 5:
             system_instruction += "\n\nCRITICAL: You have reached the maximum conversation turns. You MUST now respond with the visitor summary in XML tags. Summarize what you know so far."
         elif user_turns >= 2:
@@ -57,7 +71,8 @@ class GenerationHandler:
             prompt=full_prompt,
             system_prompt=system_instruction,
             size=ModelSize.LARGE,
-            timeout=30
+            timeout=30,
+            deadline=deadline
         )
 
         # Parse response for XML tags
@@ -73,66 +88,351 @@ class GenerationHandler:
         else:
             return {"ready": False, "message": response_text}
 
-    async def generate_block(
+    async def _prepare_block(
         self,
         visitor_summary: str,
-        action_type: str,
         action_value: str,
-        context: Optional[CompressedContext]
-    ) -> Dict[str, Any]:
+        context: Optional[CompressedContext],
+        deadline: Optional[Deadline] = None,
+        experiences: Optional[List[Dict[str, Any]]] = None
+    ) -> Tuple[str, List[str], List[str]]:
         """
-        Generate HTML block content with RAG.
+        Run RAG and build the block generation system prompt.
+
+        Args:
+            experiences: Already retrieved experiences; RAG is skipped when given
 
         Returns:
-            Dict with 'html', 'block_summary', and 'experience_ids'
+            Tuple of (formatted system prompt, experience_ids, experience titles)
         """
         # 1. Perform RAG search with user input query
         user_input = action_value or visitor_summary
-        shown_counts = context.shown_experience_counts if context else {}
-        experiences = await search_similar_experiences(
-            query=user_input,
-            limit=5,
-            shown_counts=shown_counts
-        )
+        if experiences is None:
+            experiences = await self.retrieve_experiences(user_input, context, deadline)
 
-        rag_results = await format_rag_results(experiences)
-
-        # 2. Use all retrieved experiences for block generation
-        selected_experiences = experiences
+        # 2. Use the best retrieved experiences that fit the RAG budget
+        selected_experiences, rag_results = await self._pack_experiences(experiences)
         experience_ids = [exp['id'] for exp in selected_experiences]
+        titles = [exp['title'] for exp in selected_experiences]
 
         logger.info(f"[BLOCK] Using {len(experience_ids)} experiences for block generation")
 
         # 3. Format System Prompt with visitor context
-        block_summaries = context.block_summaries if context else []
-        block_summaries_text = "\n".join(f"- {summary}" for summary in block_summaries) if block_summaries else "No prior blocks"
-        formatted_prompt = BLOCK_GENERATION_SYSTEM_PROMPT.format(
-            visitor_summary=visitor_summary,
-            user_input=user_input,
-            block_summaries=block_summaries_text,
-            rag_results=rag_results
+        # Oldest block summaries are dropped first once they outgrow their budget
+        block_summaries = [f"- {summary}" for summary in (context.block_summaries if context else [])]
+        kept_summaries = context_packer.pack_items("block_summaries", block_summaries)
+        sections = {
+            "visitor_summary": context_packer.pack_text("visitor_summary", visitor_summary),
+            "user_input": context_packer.pack_text("user_input", user_input),
+            "block_summaries": "\n".join(block_summaries[i] for i in kept_summaries) or "No prior blocks",
+            "rag_results": rag_results
+        }
+        context_packer.record("block", sections)
+        formatted_prompt = prompt_assembler.render("block", **sections)
+
+        return formatted_prompt, experience_ids, titles
+
+    async def _pack_experiences(
+        self,
+        experiences: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], str]:
+        """
+        Fit retrieved experiences into the RAG results budget, dropping the
+        lowest-scored ones. If not even the best fits, it is kept truncated.
+
+        Returns:
+            Tuple of (kept experiences in retrieval order, formatted RAG results)
+        """
+        if not experiences:
+            return [], await format_rag_results([])
+        rendered = [await format_rag_results([exp]) for exp in experiences]
+        scores = [exp.get("score", exp.get("similarity", 0.0)) for exp in experiences]
+        kept = context_packer.pack_items("rag_results", rendered, scores, separator_tokens=0)
+        if not kept:
+            best = max(range(len(experiences)), key=lambda i: scores[i])
+            return [experiences[best]], context_packer.pack_text("rag_results", rendered[best])
+        return [experiences[i] for i in kept], "".join(rendered[i] for i in kept)
+
+    async def retrieve_experiences(
+        self,
+        query: str,
+        context: Optional[CompressedContext],
+        deadline: Optional[Deadline] = None
+    ) -> List[Dict[str, Any]]:
+        """RAG search for a query, penalizing experiences already shown in this context."""
+        shown_counts = context.shown_experience_counts if context else {}
+        return await search_similar_experiences(
+            query=query,
+            limit=RAG_RESULT_LIMIT,
+            shown_counts=shown_counts,
+            deadline=deadline
         )
 
-        # 5. Generate Block (Large model for quality)
+    def _start_cache_key(
+        self,
+        visitor_summary: str,
+        user_input: str,
+        deadline: Optional[Deadline]
+    ) -> Optional[asyncio.Task]:
+        """Start embedding the semantic cache key so it overlaps with retrieval."""
+        if not block_cache.enabled:
+            return None
+        task = asyncio.create_task(block_cache.key_embedding(visitor_summary, user_input, deadline))
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    async def _await_cache_key(self, task: Optional[asyncio.Task]):
+        if task is None:
+            return None
+        try:
+            return await task
+        except Exception as e:
+            logger.warning(f"[BLOCK CACHE] Key embedding failed, skipping cache: {e}")
+            return None
+
+    def _cache_block(
+        self,
+        cache_key,
+        formatted_prompt: str,
+        html: str,
+        summary: str,
+        experience_ids: List[str],
+        started: float
+    ):
+        if cache_key is None:
+            return
+        block_cache.store(
+            cache_key,
+            experience_ids,
+            {"html": html, "block_summary": summary, "experience_ids": experience_ids},
+            generation_seconds=time.perf_counter() - started,
+            estimated_tokens=count_tokens(formatted_prompt) + count_tokens(html)
+        )
+
+    async def generate_block(
+        self,
+        visitor_summary: str,
+        action_type: str,
+        action_value: str,
+        context: Optional[CompressedContext],
+        deadline: Optional[Deadline] = None,
+        experiences: Optional[List[Dict[str, Any]]] = None,
+        defer_summary: bool = False,
+        use_cache: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Generate HTML block content with RAG.
+
+        Every stage (retrieval, block and summary generation) is bounded by the
+        remaining time on the optional request deadline.
+
+        Args:
+            defer_summary: Return as soon as the HTML is ready and generate the
+                summary in the background, retrievable by 'block_id' (callers
+                pass summaries.DEFER_BLOCK_SUMMARIES, set only for LLM summaries)
+            use_cache: Serve from (and populate) the semantic block cache
+
+        Returns:
+            Dict with 'html', 'block_summary', 'experience_ids' and 'block_id'
+            ('block_summary' is None and 'block_id' set when deferred)
+        """
+        key_task = self._start_cache_key(visitor_summary, action_value or visitor_summary, deadline) if use_cache else None
+        formatted_prompt, experience_ids, titles = await self._prepare_block(
+            visitor_summary, action_value, context, deadline, experiences
+        )
+
+        cache_key = await self._await_cache_key(key_task)
+        if cache_key is not None:
+            cached = block_cache.lookup(cache_key, experience_ids)
+            if cached:
+                return {**cached, "block_id": None}
+        started = time.perf_counter()
+
+        # 4. Generate Block (Large model for quality)
         response = await self.llm.llm_call(
             prompt="Generate the next block.",
             system_prompt=formatted_prompt,
             size=ModelSize.LARGE,
-            timeout=30
+            timeout=30,
+            deadline=deadline
         )
 
-        # 6. Parse HTML from response
+        # 5. Parse HTML from response
         html = self._extract_block_html(response)
 
-        # 7. Generate summary separately with small model
-        summary = await self._generate_block_summary(html, visitor_summary)
+        # 6. Summarize the block (locally, or with the small model when opted in)
+        if defer_summary:
+            # Only the next request needs the summary, so keep it off this one's critical path
+            block_id = summary_store.defer(self._generate_block_summary(html, visitor_summary, titles=titles))
+            self._cache_block(cache_key, formatted_prompt, html, summarize_block(html, titles), experience_ids, started)
+            return {
+                "html": html,
+                "block_summary": None,
+                "experience_ids": experience_ids,
+                "block_id": block_id
+            }
+
+        summary = await self._generate_block_summary(html, visitor_summary, deadline, titles)
+        self._cache_block(cache_key, formatted_prompt, html, summary, experience_ids, started)
 
         return {
             "html": html,
             "block_summary": summary,
-            "experience_ids": experience_ids
+            "experience_ids": experience_ids,
+            "block_id": None
         }
 
+    async def stream_block(
+        self,
+        visitor_summary: str,
+        action_type: str,
+        action_value: str,
+        context: Optional[CompressedContext],
+        deadline: Optional[Deadline] = None,
+        experiences: Optional[List[Dict[str, Any]]] = None,
+        use_cache: bool = False
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Streaming variant of generate_block.
+
+        Yields (event, data) tuples: any number of 'html' events carrying cleaned
+        HTML fragments as they arrive from the model, followed by trailing
+        'experience_ids' and 'block_summary' events. A semantic cache hit is
+        sent as a single 'html' event.
+        """
+        key_task = self._start_cache_key(visitor_summary, action_value or visitor_summary, deadline) if use_cache else None
+        formatted_prompt, experience_ids, titles = await self._prepare_block(
+            visitor_summary, action_value, context, deadline, experiences
+        )
+
+        cache_key = await self._await_cache_key(key_task)
+        if cache_key is not None:
+            cached = block_cache.lookup(cache_key, experience_ids)
+            if cached:
+                yield "html", cached["html"]
+                yield "experience_ids", cached["experience_ids"]
+                yield "block_summary", cached["block_summary"]
+                return
+        started = time.perf_counter()
+
+        cleaner = StreamCleaner()
+        html_parts = []
+        async for chunk in self.llm.llm_stream(
+            prompt="Generate the next block.",
+            system_prompt=formatted_prompt,
+            size=ModelSize.LARGE,
+            timeout=30,
+            deadline=deadline
+        ):
+            text = cleaner.feed(chunk)
+            if text:
+                html_parts.append(text)
+                yield "html", text
+
+        tail = cleaner.flush()
+        if tail:
+            html_parts.append(tail)
+            yield "html", tail
+
+        yield "experience_ids", experience_ids
+
+        html = "".join(html_parts)
+        summary = await self._generate_block_summary(html, visitor_summary, deadline, titles)
+        self._cache_block(cache_key, formatted_prompt, html, summary, experience_ids, started)
+        yield "block_summary", summary
+
+    async def stream_block_and_buttons(
+        self,
+        visitor_summary: str,
+        action_type: str,
+        action_value: str,
+        context: Optional[CompressedContext],
+        chat_history: List[Dict[str, str]],
+        deadline: Optional[Deadline] = None,
+        buttons_deadline: Optional[Deadline] = None,
+        use_cache: bool = False
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Stream a block and generate suggested buttons concurrently from one retrieval.
+
+        Yields the same events as stream_block, plus a single 'buttons' event
+        (a list of button dicts) as soon as button generation finishes, which is
+        usually while block HTML is still streaming.
+        """
+        user_input = action_value or visitor_summary
+        experiences = await self.retrieve_experiences(user_input, context, deadline)
+
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+
+        async def produce_block():
+            try:
+                async for event in self.stream_block(
+                    visitor_summary, action_type, action_value, context, deadline, experiences, use_cache
+                ):
+                    await queue.put(event)
+                await queue.put(done)
+            except Exception as e:
+                await queue.put(e)
+
+        async def produce_buttons():
+            try:
+                buttons = await self.generate_buttons(
+                    visitor_summary, chat_history, context, buttons_deadline or deadline, experiences
+                )
+            except Exception as e:
+                logger.warning(f"[BUTTONS] Concurrent button generation failed: {e}. Using fallback.")
+                buttons = DEFAULT_BUTTONS
+            await queue.put(("buttons", [b.model_dump() for b in buttons]))
+            await queue.put(done)
+
+        tasks = [asyncio.create_task(produce_block()), asyncio.create_task(produce_buttons())]
+        try:
+            remaining = len(tasks)
+            while remaining:
+                item = await queue.get()
+                if item is done:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def replay_block_and_buttons(
+        self,
+        block: Dict[str, Any],
+        visitor_summary: str,
+        context: Optional[CompressedContext],
+        chat_history: List[Dict[str, str]],
+        deadline: Optional[Deadline] = None
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Serve an already generated block with the same events as stream_block_and_buttons.
+
+        Buttons stored with the block (archetype blocks) are replayed as-is;
+        otherwise they are generated fresh from the experiences the block was
+        built on.
+        """
+        yield "html", block["html"]
+        yield "experience_ids", block["experience_ids"]
+
+        if "buttons" in block:
+            yield "buttons", block["buttons"]
+        else:
+            try:
+                buttons = await self.generate_buttons(
+                    visitor_summary, chat_history, context, deadline, block["experiences"]
+                )
+            except Exception as e:
+                logger.warning(f"[BUTTONS] Button generation failed: {e}. Using fallback.")
+                buttons = DEFAULT_BUTTONS
+            yield "buttons", [b.model_dump() for b in buttons]
+
+        yield "block_summary", block["block_summary"]
+
     def _extract_block_html(self, response: str) -> str:
         """Extract HTML content from block generation response."""
         # The response should be pure HTML now (no XML tags)
@@ -141,67 +441,88 @@ class GenerationHandler:
         html = html.replace("```html", "").replace("```", "").strip()
         return html
 
-    async def _generate_block_summary(self, html: str, visitor_summary: str) -> str:
+    async def _generate_block_summary(
+        self,
+        html: str,
+        visitor_summary: str,
+        deadline: Optional[Deadline] = None,
+        titles: Optional[List[str]] = None
+    ) -> str:
         """
-        Generate a concise summary of what the block covered using small model.
+        Generate a concise summary of what the block covered.
+
+        Summaries are extracted locally from the block's headings and the titles
+        of the experiences it was built from, unless LLM_BLOCK_SUMMARIES opts in
+        to the small model (which falls back to the local summary on failure).
 
         Args:
             html: The generated HTML content
             visitor_summary: Context about the visitor
+            deadline: Optional request deadline; the local summary is used once it runs out
+            titles: Titles of the experiences the block was generated from
 
         Returns:
             One-sentence summary
         """
-        formatted_prompt = SUMMARY_GENERATION_PROMPT.format(
-            html=html,
-            visitor_summary=visitor_summary
-        )
+        if not LLM_BLOCK_SUMMARIES:
+            return summarize_block(html, titles or [])
+
+        sections = {
+            "html": context_packer.pack_text("html", html),
+            "visitor_summary": context_packer.pack_text("visitor_summary", visitor_summary)
+        }
+        context_packer.record("summary", sections)
+        formatted_prompt = prompt_assembler.render("summary", **sections)
 
         try:
             summary = await self.llm.llm_call(
                 prompt="Generate the summary.",
                 system_prompt=formatted_prompt,
                 size=ModelSize.SMALL,
-                timeout=5
+                timeout=5,
+                deadline=deadline
             )
             return summary.strip()
         except Exception as e:
-            logger.warning(f"Summary generation failed: {e}, using fallback")
-            return "Displayed relevant experience block"
+            logger.warning(f"Summary generation failed: {e}, using local summary")
+            return summarize_block(html, titles or [])
 
     async def generate_buttons(
         self,
         visitor_summary: str,
         chat_history: List[Dict[str, str]],
-        context: Optional[CompressedContext]
+        context: Optional[CompressedContext],
+        deadline: Optional[Deadline] = None,
+        experiences: Optional[List[Dict[str, Any]]] = None
     ) -> List[SuggestedButton]:
         """
         Generate suggested prompt buttons based on RAG items and visitor summary.
 
+        Args:
+            experiences: Already retrieved experiences; RAG is skipped when given
+
         Returns:
             List of SuggestedButton objects
         """
-        # Find the most recent user message for RAG search
-        search_query = visitor_summary  # fallback
-        for msg in reversed(chat_history):
-            if msg.get("role") == "user":
-                search_query = msg.get("content", "")
-                break
-
-        # RAG Search - get relevant experiences
-        shown_counts = context.shown_experience_counts if context else {}
-        experiences = await search_similar_experiences(
-            query=search_query,
-            limit=5,
-            shown_counts=shown_counts
-        )
-        rag_results = await format_rag_results(experiences)
+        if experiences is None:
+            # Find the most recent user message for RAG search
+            search_query = visitor_summary  # fallback
+            for msg in reversed(chat_history):
+                if msg.get("role") == "user":
+                    search_query = msg.get("content", "")
+                    break
+
+            # RAG Search - get relevant experiences
+            experiences = await self.retrieve_experiences(search_query, context, deadline)
+        _, rag_results = await self._pack_experiences(experiences)
 
         # Construct prompt with visitor summary
-        formatted_prompt = BUTTON_GENERATION_PROMPT.format(
-            visitor_summary=visitor_summary,
-            rag_results=rag_results
-        )
+        sections = {
+            "visitor_summary": context_packer.pack_text("visitor_summary", visitor_summary),
+            "rag_results": rag_results
+        }
+        context_packer.record("buttons", sections)
+        formatted_prompt = prompt_assembler.render("buttons", **sections)
 
         # Generate using structured output method
         try:
@@ -210,7 +531,8 @@ class GenerationHandler:
                 system_prompt=formatted_prompt,
                 size=ModelSize.SMALL,
                 response_model=ButtonList,
-                timeout=10
+                timeout=10,
+                deadline=deadline
             )
             logger.info(f"Successfully generated {len(button_list.buttons)} buttons via structured output")
             return button_list.buttons
@@ -218,11 +540,7 @@ class GenerationHandler:
         except StructuredOutputError as e:
             # All retries and fallback failed - return static buttons
             logger.warning(f"Button generation failed after all attempts: {e}. Using fallback.")
-            return [
-                SuggestedButton(label="Experience", prompt="Tell me about your professional experience"),
-                SuggestedButton(label="Skills", prompt="What are your key technical skills?"),
-                SuggestedButton(label="Projects", prompt="Show me some of your notable projects")
-            ]
+            return list(DEFAULT_BUTTONS)
 
 
 # Global generation handler instance
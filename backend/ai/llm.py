@@ -4,14 +4,19 @@ import asyncio
 import re
 import time
 import json
-from typing import List, Literal, Optional, Callable, Type, TypeVar
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Literal, Optional, Callable, Type, TypeVar
 from enum import Enum
 
+import httpx
+
 # Official SDKs
 import google.generativeai as genai
-from cerebras.cloud.sdk import Cerebras
+from cerebras.cloud.sdk import AsyncCerebras
 from pydantic import BaseModel, ValidationError
 
+from ai.prompt_assembly import prompt_assembler
+from ai.resilience import CircuitBreaker, CircuitOpenError, Deadline, DeadlineExceeded, HedgeStats, RetryBudget
+
 logger = logging.getLogger(__name__)
 
 CEREBRAS_API_KEY = os.getenv("CEREBRAS_API_KEY")
@@ -40,30 +45,122 @@ MODEL_CONFIG = {
 }
 
 EMBEDDING_MODEL = "models/text-embedding-004"
+# Max texts per batchEmbedContents request
+EMBEDDING_BATCH_SIZE = 100
 
 # Retry configuration
 MAX_RETRIES = 3
 BASE_BACKOFF_SECONDS = 1.0
 
+# Connection pool configuration for the shared provider HTTP client
+LLM_POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "100"))
+LLM_POOL_MAX_KEEPALIVE = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "20"))
+LLM_POOL_KEEPALIVE_EXPIRY = float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", "60"))
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "true").lower() == "true"
+
+# Hedged requests: if the primary hasn't answered within the given latency
+# percentile of its recent calls, race the fallback provider in parallel
+HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "5.0"))
+HEDGE_MIN_DELAY_SECONDS = 0.25
+
+# Circuit breakers (one per provider/model) and per-provider retry budgets
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_WINDOW_SECONDS = float(os.getenv("LLM_BREAKER_WINDOW_SECONDS", "30"))
+BREAKER_RESET_TIMEOUT_SECONDS = float(os.getenv("LLM_BREAKER_RESET_TIMEOUT", "15"))
+RETRY_BUDGET_RATIO = float(os.getenv("LLM_RETRY_BUDGET_RATIO", "0.2"))
+RETRY_BUDGET_REFILL_PER_SECOND = float(os.getenv("LLM_RETRY_BUDGET_REFILL_PER_SECOND", "0.5"))
+RETRY_BUDGET_MAX_TOKENS = float(os.getenv("LLM_RETRY_BUDGET_MAX_TOKENS", "10"))
+
 
 class StructuredOutputError(Exception):
     """Raised when structured output generation fails after all retries."""
     pass
 
 
+def build_http_client() -> httpx.AsyncClient:
+    """
+    Create the pooled HTTP client shared by all provider requests.
+
+    Connections are kept alive between requests so concurrent calls reuse TLS
+    sessions (and multiplex over HTTP/2 when enabled) instead of reconnecting.
+    """
+    return httpx.AsyncClient(
+        http2=LLM_HTTP2,
+        limits=httpx.Limits(
+            max_connections=LLM_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_POOL_KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(60.0, connect=10.0)
+    )
+
+
+def _record_cerebras_usage(system_prompt: str, usage: Any):
+    """Attribute a Cerebras (OpenAI-style) usage block, including prefix-cache hits, to its prompt template."""
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    prompt_assembler.record_usage(
+        system_prompt,
+        getattr(usage, "prompt_tokens", None),
+        getattr(details, "cached_tokens", 0) if details is not None else 0
+    )
+
+
+def _record_gemini_usage(system_prompt: str, metadata: Any):
+    """Attribute Gemini usage_metadata, including implicitly cached tokens, to its prompt template."""
+    if metadata is None:
+        return
+    prompt_assembler.record_usage(
+        system_prompt,
+        getattr(metadata, "prompt_token_count", None),
+        getattr(metadata, "cached_content_token_count", 0)
+    )
+
+
 class LLMHandler:
     """Handles LLM client initialization and request routing with fallback support."""
 
     def __init__(self):
-        self.cerebras_client: Optional[Cerebras] = None
+        self.http_client: Optional[httpx.AsyncClient] = None
+        self.cerebras_client: Optional[AsyncCerebras] = None
         self.gemini_configured: bool = False
+        self.hedge_enabled: bool = HEDGE_ENABLED
+        self.hedge_stats: Dict[str, HedgeStats] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.retry_budgets: Dict[str, RetryBudget] = {
+            provider: RetryBudget(
+                ratio=RETRY_BUDGET_RATIO,
+                refill_per_second=RETRY_BUDGET_REFILL_PER_SECOND,
+                max_tokens=RETRY_BUDGET_MAX_TOKENS
+            )
+            for provider in ("cerebras", "gemini")
+        }
+        for config in MODEL_CONFIG.values():
+            self._breaker("cerebras", config["main"])
+            self._breaker("gemini", config["fallback"])
         self._init_clients()
 
     def _init_clients(self):
-        """Initialize API clients."""
+        """
+        Initialize API clients.
+
+        Cerebras uses the SDK's async client on top of the shared httpx pool.
+        Gemini's async methods run over a grpc.aio channel, which multiplexes
+        concurrent requests on a single HTTP/2 connection.
+        """
         if CEREBRAS_API_KEY:
             try:
-                self.cerebras_client = Cerebras(api_key=CEREBRAS_API_KEY)
+                self.http_client = build_http_client()
+                self.cerebras_client = AsyncCerebras(
+                    api_key=CEREBRAS_API_KEY,
+                    http_client=self.http_client,
+                    max_retries=0,  # Retries are handled by _call_with_retries
+                    warm_tcp_connection=False
+                )
                 logger.info("Cerebras client initialized successfully")
             except Exception as e:
                 logger.warning(f"Failed to initialize Cerebras client: {e}")
@@ -76,6 +173,11 @@ class LLMHandler:
             except Exception as e:
                 logger.warning(f"Failed to configure Gemini: {e}")
 
+    async def aclose(self):
+        """Close pooled provider connections."""
+        if self.http_client:
+            await self.http_client.aclose()
+
     def _format_schema_for_cerebras(self, pydantic_model: Type[BaseModel]) -> dict:
         """
         Convert Pydantic model to Cerebras-compatible schema format.
@@ -104,40 +206,109 @@ class LLMHandler:
         """
         return pydantic_model
 
-    async def _cerebras_call(self, prompt: str, system_prompt: str, model: str, timeout: int = 10) -> str:
+    def _breaker(self, provider: str, model: str) -> CircuitBreaker:
+        """Shared circuit breaker for a provider/model pair."""
+        key = f"{provider}:{model}"
+        if key not in self.breakers:
+            self.breakers[key] = CircuitBreaker(
+                key,
+                failure_threshold=BREAKER_FAILURE_THRESHOLD,
+                window_seconds=BREAKER_WINDOW_SECONDS,
+                reset_timeout=BREAKER_RESET_TIMEOUT_SECONDS
+            )
+        return self.breakers[key]
+
+    async def _call_with_retries(
+        self,
+        name: str,
+        make_call: Callable[[], Awaitable[Any]],
+        provider: str,
+        model: str,
+        deadline: Deadline
+    ) -> Any:
+        """
+        Await make_call() up to MAX_RETRIES times with exponential backoff.
+
+        Every attempt goes through the provider/model circuit breaker (an open
+        breaker raises CircuitOpenError so the caller moves on to the fallback),
+        and retries are only made while the provider's retry budget allows.
+        Each attempt is bounded by the deadline's remaining time, and no attempt
+        or backoff is started that the deadline can't accommodate.
+        """
+        breaker = self._breaker(provider, model)
+        budget = self.retry_budgets[provider]
+        budget.record_request()
+
+        last_exception = None
+        for attempt in range(MAX_RETRIES):
+            if deadline.expired:
+                last_exception = DeadlineExceeded(f"Deadline exceeded before {name} attempt {attempt + 1}")
+                break
+            if attempt > 0 and not budget.try_spend():
+                logger.warning(f"{name} retry budget exhausted, not retrying")
+                break
+            if not breaker.allow_request():
+                if last_exception is None:
+                    last_exception = CircuitOpenError(f"Circuit open for {breaker.name}")
+                break
+            try:
+                result = await asyncio.wait_for(make_call(), deadline.remaining())
+                breaker.record_success()
+                return result
+            except asyncio.CancelledError:
+                breaker.release_probe()
+                raise
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError) and deadline.expired:
+                    # The caller's time budget ran out, which says nothing about the provider
+                    e = DeadlineExceeded(f"{name} attempt {attempt + 1} ran out of time")
+                    breaker.release_probe()
+                else:
+                    breaker.record_failure()
+                last_exception = e
+                if attempt < MAX_RETRIES - 1:
+                    backoff_time = BASE_BACKOFF_SECONDS * (2 ** attempt)
+                    if backoff_time >= deadline.remaining():
+                        logger.warning(f"{name} attempt {attempt + 1}/{MAX_RETRIES} failed: {e}. No time left in deadline to retry")
+                        break
+                    logger.warning(f"{name} attempt {attempt + 1}/{MAX_RETRIES} failed: {e}. Retrying in {backoff_time}s...")
+                    await asyncio.sleep(backoff_time)
+                else:
+                    logger.error(f"{name} failed after {MAX_RETRIES} attempts: {e}")
+
+        raise last_exception
+
+    async def _cerebras_call(
+        self,
+        prompt: str,
+        system_prompt: str,
+        model: str,
+        timeout: int = 10,
+        deadline: Optional[Deadline] = None
+    ) -> str:
         """Make a Cerebras API call with retry logic."""
         if not self.cerebras_client:
             raise Exception("Cerebras client not initialized")
 
-        def _call():
-            response = self.cerebras_client.chat.completions.create(
+        deadline = Deadline.within(timeout, deadline)
+
+        async def _call():
+            response = await self.cerebras_client.chat.completions.create(
                 model=model,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": prompt}
                 ],
-                temperature=0.7
+                temperature=0.7,
+                timeout=deadline.remaining()
             )
+            _record_cerebras_usage(system_prompt, getattr(response, "usage", None))
             content = response.choices[0].message.content
             # Remove <think> tags and their content
             clean_content = re.sub(r'<think>.*?</think>', '', content, flags=re.DOTALL).strip()
             return clean_content
 
-        # Retry logic with exponential backoff
-        last_exception = None
-        for attempt in range(MAX_RETRIES):
-            try:
-                return await asyncio.to_thread(_call)
-            except Exception as e:
-                last_exception = e
-                if attempt < MAX_RETRIES - 1:
-                    backoff_time = BASE_BACKOFF_SECONDS * (2 ** attempt)
-                    logger.warning(f"Cerebras call attempt {attempt + 1}/{MAX_RETRIES} failed: {e}. Retrying in {backoff_time}s...")
-                    await asyncio.sleep(backoff_time)
-                else:
-                    logger.error(f"Cerebras call failed after {MAX_RETRIES} attempts: {e}")
-
-        raise last_exception
+        return await self._call_with_retries("Cerebras call", _call, "cerebras", model, deadline)
 
     async def _cerebras_structured_call(
         self,
@@ -145,24 +316,29 @@ class LLMHandler:
         system_prompt: str,
         model: str,
         response_model: Type[BaseModel],
-        timeout: int = 10
+        timeout: int = 10,
+        deadline: Optional[Deadline] = None
     ) -> BaseModel:
         """Make a Cerebras API call with structured output and retry logic."""
         if not self.cerebras_client:
             raise Exception("Cerebras client not initialized")
 
+        deadline = Deadline.within(timeout, deadline)
+
         schema_format = self._format_schema_for_cerebras(response_model)
 
-        def _call():
-            response = self.cerebras_client.chat.completions.create(
+        async def _call():
+            response = await self.cerebras_client.chat.completions.create(
                 model=model,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": prompt}
                 ],
                 response_format=schema_format,
-                temperature=0.0  # Use deterministic temperature for structured output
+                temperature=0.0,  # Use deterministic temperature for structured output
+                timeout=deadline.remaining()
             )
+            _record_cerebras_usage(system_prompt, getattr(response, "usage", None))
             content = response.choices[0].message.content
 
             # Remove <think> tags and their content
@@ -175,80 +351,71 @@ class LLMHandler:
             except (json.JSONDecodeError, ValidationError) as e:
                 raise Exception(f"Failed to parse/validate structured output: {e}")
 
-        # Retry logic with exponential backoff
-        last_exception = None
-        for attempt in range(MAX_RETRIES):
-            try:
-                return await asyncio.to_thread(_call)
-            except Exception as e:
-                last_exception = e
-                if attempt < MAX_RETRIES - 1:
-                    backoff_time = BASE_BACKOFF_SECONDS * (2 ** attempt)
-                    logger.warning(
-                        f"Cerebras structured call attempt {attempt + 1}/{MAX_RETRIES} failed: {e}. "
-                        f"Retrying in {backoff_time}s..."
-                    )
-                    await asyncio.sleep(backoff_time)
-                else:
-                    logger.error(f"Cerebras structured call failed after {MAX_RETRIES} attempts: {e}")
-
-        raise last_exception
+        return await self._call_with_retries("Cerebras structured call", _call, "cerebras", model, deadline)
 
-    async def _gemini_call(self, prompt: str, system_prompt: str, timeout: int = 30) -> str:
-        """Make a Gemini API call with retry logic."""
+    async def _gemini_call(
+        self,
+        prompt: str,
+        system_prompt: str,
+        size: ModelSize = ModelSize.SMALL,
+        timeout: int = 30,
+        deadline: Optional[Deadline] = None
+    ) -> str:
+        """Make a Gemini API call with retry logic, using the fallback model for size."""
         if not self.gemini_configured:
             raise Exception("Gemini API key not configured")
 
-        def _call():
+        deadline = Deadline.within(timeout, deadline)
+
+        model_name = MODEL_CONFIG[size]["fallback"]
+
+        async def _call():
             model = genai.GenerativeModel(
-                model_name=MODEL_CONFIG[ModelSize.SMALL]["fallback"],
+                model_name=model_name,
                 system_instruction=system_prompt
             )
-            response = model.generate_content(prompt)
+            response = await model.generate_content_async(
+                prompt,
+                request_options={"timeout": deadline.remaining()}
+            )
+            _record_gemini_usage(system_prompt, getattr(response, "usage_metadata", None))
             return response.text
 
-        # Retry logic with exponential backoff
-        last_exception = None
-        for attempt in range(MAX_RETRIES):
-            try:
-                return await asyncio.to_thread(_call)
-            except Exception as e:
-                last_exception = e
-                if attempt < MAX_RETRIES - 1:
-                    backoff_time = BASE_BACKOFF_SECONDS * (2 ** attempt)
-                    logger.warning(f"Gemini call attempt {attempt + 1}/{MAX_RETRIES} failed: {e}. Retrying in {backoff_time}s...")
-                    await asyncio.sleep(backoff_time)
-                else:
-                    logger.error(f"Gemini call failed after {MAX_RETRIES} attempts: {e}")
-
-        raise last_exception
+        return await self._call_with_retries("Gemini call", _call, "gemini", model_name, deadline)
 
     async def _gemini_structured_call(
         self,
         prompt: str,
         system_prompt: str,
         response_model: Type[BaseModel],
-        timeout: int = 30
+        size: ModelSize = ModelSize.SMALL,
+        timeout: int = 30,
+        deadline: Optional[Deadline] = None
     ) -> BaseModel:
-        """Make a Gemini API call with structured output and retry logic."""
+        """Make a Gemini API call with structured output and retry logic, using the fallback model for size."""
         if not self.gemini_configured:
             raise Exception("Gemini API key not configured")
 
+        deadline = Deadline.within(timeout, deadline)
+
         schema_format = self._format_schema_for_gemini(response_model)
+        model_name = MODEL_CONFIG[size]["fallback"]
 
-        def _call():
+        async def _call():
             model = genai.GenerativeModel(
-                model_name=MODEL_CONFIG[ModelSize.SMALL]["fallback"],
+                model_name=model_name,
                 system_instruction=system_prompt
             )
-            response = model.generate_content(
+            response = await model.generate_content_async(
                 prompt,
                 generation_config=genai.GenerationConfig(
                     response_mime_type="application/json",
                     response_schema=schema_format,
                     temperature=1.0  # Use default temperature for Gemini 2.5/3
-                )
+                ),
+                request_options={"timeout": deadline.remaining()}
             )
+            _record_gemini_usage(system_prompt, getattr(response, "usage_metadata", None))
 
             # Parse and validate against response model
             try:
@@ -257,44 +424,309 @@ class LLMHandler:
             except (json.JSONDecodeError, ValidationError) as e:
                 raise Exception(f"Failed to parse/validate structured output: {e}")
 
-        # Retry logic with exponential backoff
+        return await self._call_with_retries("Gemini structured call", _call, "gemini", model_name, deadline)
+
+    async def _cerebras_stream(
+        self,
+        prompt: str,
+        system_prompt: str,
+        model: str,
+        timeout: int = 30,
+        deadline: Optional[Deadline] = None
+    ) -> AsyncIterator[str]:
+        """Stream raw content deltas from the Cerebras chat completions API."""
+        if not self.cerebras_client:
+            raise Exception("Cerebras client not initialized")
+
+        deadline = Deadline.within(timeout, deadline)
+
+        stream = await self.cerebras_client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.7,
+            stream=True,
+            timeout=deadline.remaining()
+        )
+        async for chunk in stream:
+            # The final chunk carries the usage for the whole completion
+            _record_cerebras_usage(system_prompt, getattr(chunk, "usage", None))
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+    async def _gemini_stream(
+        self,
+        prompt: str,
+        system_prompt: str,
+        model_name: str,
+        timeout: int = 30,
+        deadline: Optional[Deadline] = None
+    ) -> AsyncIterator[str]:
+        """Stream raw text chunks from Gemini generate_content(stream=True)."""
+        if not self.gemini_configured:
+            raise Exception("Gemini API key not configured")
+
+        deadline = Deadline.within(timeout, deadline)
+
+        model = genai.GenerativeModel(
+            model_name=model_name,
+            system_instruction=system_prompt
+        )
+        response = await model.generate_content_async(
+            prompt,
+            stream=True,
+            request_options={"timeout": deadline.remaining()}
+        )
+        async for chunk in response:
+            text = chunk.text
+            if text:
+                yield text
+        _record_gemini_usage(system_prompt, getattr(response, "usage_metadata", None))
+
+    async def _stream_with_retries(
+        self,
+        name: str,
+        make_stream: Callable[[], AsyncIterator[str]],
+        provider: str,
+        model: str,
+        deadline: Deadline
+    ) -> AsyncIterator[str]:
+        """
+        Retry a streaming call with exponential backoff until it produces output.
+
+        Once the first chunk has been yielded the stream is committed to this
+        provider: a mid-stream failure is re-raised rather than retried, since the
+        caller has already forwarded partial content. Uses the same circuit
+        breaker, retry budget and deadline handling as _call_with_retries; every
+        chunk must arrive within the deadline's remaining time.
+        """
+        breaker = self._breaker(provider, model)
+        budget = self.retry_budgets[provider]
+        budget.record_request()
+
         last_exception = None
         for attempt in range(MAX_RETRIES):
+            if deadline.expired:
+                last_exception = DeadlineExceeded(f"Deadline exceeded before {name} stream attempt {attempt + 1}")
+                break
+            if attempt > 0 and not budget.try_spend():
+                logger.warning(f"{name} stream retry budget exhausted, not retrying")
+                break
+            if not breaker.allow_request():
+                if last_exception is None:
+                    last_exception = CircuitOpenError(f"Circuit open for {breaker.name}")
+                break
+            started = False
+            stream = make_stream()
             try:
-                return await asyncio.to_thread(_call)
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(stream.__anext__(), deadline.remaining())
+                    except StopAsyncIteration:
+                        break
+                    if not started:
+                        started = True
+                        breaker.record_success()
+                    yield chunk
+                if not started:
+                    breaker.record_success()
+                return
+            except (asyncio.CancelledError, GeneratorExit):
+                if not started:
+                    breaker.release_probe()
+                raise
             except Exception as e:
+                out_of_time = isinstance(e, asyncio.TimeoutError) and deadline.expired
+                if out_of_time:
+                    e = DeadlineExceeded(f"{name} stream attempt {attempt + 1} ran out of time")
+                if started:
+                    logger.error(f"{name} stream failed mid-response: {e}")
+                    raise e
+                if out_of_time:
+                    # The caller's time budget ran out, which says nothing about the provider
+                    breaker.release_probe()
+                else:
+                    breaker.record_failure()
                 last_exception = e
                 if attempt < MAX_RETRIES - 1:
                     backoff_time = BASE_BACKOFF_SECONDS * (2 ** attempt)
-                    logger.warning(
-                        f"Gemini structured call attempt {attempt + 1}/{MAX_RETRIES} failed: {e}. "
-                        f"Retrying in {backoff_time}s..."
-                    )
+                    if backoff_time >= deadline.remaining():
+                        logger.warning(f"{name} stream attempt {attempt + 1}/{MAX_RETRIES} failed: {e}. No time left in deadline to retry")
+                        break
+                    logger.warning(f"{name} stream attempt {attempt + 1}/{MAX_RETRIES} failed: {e}. Retrying in {backoff_time}s...")
                     await asyncio.sleep(backoff_time)
                 else:
-                    logger.error(f"Gemini structured call failed after {MAX_RETRIES} attempts: {e}")
+                    logger.error(f"{name} stream failed after {MAX_RETRIES} attempts: {e}")
+            finally:
+                await stream.aclose()
 
         raise last_exception
 
-    async def handle_fallback(self, main_callable: Callable, fallback_callable: Callable) -> str:
+    async def llm_stream(
+        self,
+        prompt: str,
+        system_prompt: str,
+        size: ModelSize,
+        timeout: int = 30,
+        deadline: Optional[Deadline] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream an LLM response with automatic fallback.
+
+        Yields raw content chunks (callers are responsible for cleanup such as
+        <think> stripping, see ai.streaming.StreamCleaner). Falls back to Gemini
+        only if Cerebras fails before producing any output.
+
+        Args:
+            prompt: User prompt
+            system_prompt: System instruction
+            size: Model size (SMALL, MEDIUM, or LARGE)
+            timeout: Request timeout in seconds
+            deadline: Optional end-to-end deadline that caps timeout
+        """
+        config = MODEL_CONFIG[size]
+        deadline = Deadline.within(timeout, deadline)
+        started = False
+        try:
+            async for chunk in self._stream_with_retries(
+                "Cerebras",
+                lambda: self._cerebras_stream(prompt, system_prompt, config["main"], timeout, deadline),
+                "cerebras",
+                config["main"],
+                deadline
+            ):
+                started = True
+                yield chunk
+            return
+        except Exception as e:
+            if started:
+                raise
+            logger.warning(f"Main provider stream failed after all retries: {e}. Falling back to secondary provider.")
+
+        async for chunk in self._stream_with_retries(
+            "Gemini",
+            lambda: self._gemini_stream(prompt, system_prompt, config["fallback"], timeout, deadline),
+            "gemini",
+            config["fallback"],
+            deadline
+        ):
+            yield chunk
+
+    async def handle_fallback(
+        self,
+        main_callable: Callable,
+        fallback_callable: Callable,
+        model: Optional[str] = None
+    ) -> Any:
         """
         Try main provider with retries, fallback to secondary if all retries fail.
 
         The main provider will retry MAX_RETRIES times with exponential backoff
-        before falling back to the secondary provider.
+        before falling back to the secondary provider. When hedging is enabled
+        and a model is given, the call is routed through _hedged_call instead.
         """
+        if self.hedge_enabled and model:
+            return await self._hedged_call(main_callable, fallback_callable, model)
+
         try:
             return await main_callable()
         except Exception as e:
             logger.warning(f"Main provider failed after all retries: {e}. Falling back to secondary provider.")
             return await fallback_callable()
 
+    def _hedge_delay(self, stats: HedgeStats) -> float:
+        """How long to wait on the primary before racing the fallback."""
+        if len(stats.latency) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY_SECONDS
+        return max(stats.latency.percentile(HEDGE_PERCENTILE), HEDGE_MIN_DELAY_SECONDS)
+
+    async def _hedged_call(self, main_callable: Callable, fallback_callable: Callable, model: str) -> Any:
+        """
+        Run the primary and, if it is slower than usual, race the fallback against it.
+
+        The first successful (i.e. valid) response wins and the other task is
+        cancelled. If the primary fails before the hedge fires, the fallback is
+        tried as in the non-hedged path.
+        """
+        stats = self.hedge_stats.setdefault(model, HedgeStats())
+        stats.requests += 1
+        delay = self._hedge_delay(stats)
+
+        start = time.monotonic()
+        primary = asyncio.create_task(main_callable())
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+
+        if done:
+            try:
+                result = primary.result()
+            except Exception as e:
+                logger.warning(f"Main provider failed after all retries: {e}. Falling back to secondary provider.")
+                return await fallback_callable()
+            stats.latency.record(time.monotonic() - start)
+            stats.primary_wins += 1
+            return result
+
+        logger.info(f"[HEDGE] {model} slower than {delay:.2f}s, racing fallback provider")
+        stats.hedged += 1
+        secondary = asyncio.create_task(fallback_callable())
+        pending = {primary, secondary}
+        last_exception = None
+
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        last_exception = task.exception()
+                        continue
+                    if task is primary:
+                        stats.latency.record(time.monotonic() - start)
+                        stats.primary_wins += 1
+                    else:
+                        stats.fallback_wins += 1
+                    return task.result()
+        finally:
+            if not primary.done():
+                # The primary took at least this long; keep the tail in the window
+                stats.latency.record(time.monotonic() - start)
+            for task in (primary, secondary):
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    task.exception()  # Mark as retrieved so the loser's error isn't logged
+
+        raise last_exception
+
+    def get_breaker_stats(self) -> Dict[str, Any]:
+        """Circuit breaker state per provider/model and retry budget per provider."""
+        return {
+            "circuit_breakers": {key: breaker.snapshot() for key, breaker in self.breakers.items()},
+            "retry_budgets": {provider: budget.snapshot() for provider, budget in self.retry_budgets.items()}
+        }
+
+    def get_hedge_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Hedge rate and win counts per primary model."""
+        return {
+            model: stats.snapshot(self._hedge_delay(stats))
+            for model, stats in self.hedge_stats.items()
+        }
+
     async def llm_call(
         self,
         prompt: str,
         system_prompt: str,
         size: ModelSize,
-        timeout: int = 10
+        timeout: int = 10,
+        deadline: Optional[Deadline] = None
     ) -> str:
         """
         Make an LLM call with automatic fallback.
@@ -303,13 +735,19 @@ class LLMHandler:
             prompt: User prompt
             system_prompt: System instruction
             size: Model size (SMALL, MEDIUM, or LARGE)
-            timeout: Request timeout in seconds
+            timeout: Request timeout in seconds, covering retries and fallback
+            deadline: Optional end-to-end deadline that caps timeout
+
+        Raises:
+            DeadlineExceeded: If the time budget ran out before any provider answered
         """
         config = MODEL_CONFIG[size]
+        deadline = Deadline.within(timeout, deadline)
 
         return await self.handle_fallback(
-            lambda: self._cerebras_call(prompt, system_prompt, config["main"], timeout),
-            lambda: self._gemini_call(prompt, system_prompt, timeout)
+            lambda: self._cerebras_call(prompt, system_prompt, config["main"], timeout, deadline=deadline),
+            lambda: self._gemini_call(prompt, system_prompt, size, timeout, deadline=deadline),
+            model=config["main"]
         )
 
     async def output_structure(
@@ -318,7 +756,8 @@ class LLMHandler:
         system_prompt: str,
         size: ModelSize,
         response_model: Type[BaseModel],
-        timeout: int = 10
+        timeout: int = 10,
+        deadline: Optional[Deadline] = None
     ) -> BaseModel:
         """
         Make an LLM call with structured output validation using Pydantic models.
@@ -332,7 +771,8 @@ class LLMHandler:
             system_prompt: System instruction
             size: Model size (SMALL, MEDIUM, or LARGE)
             response_model: Pydantic model class for response validation
-            timeout: Request timeout in seconds
+            timeout: Request timeout in seconds, covering retries and fallback
+            deadline: Optional end-to-end deadline that caps timeout
 
         Returns:
             Instance of response_model with validated data
@@ -351,15 +791,17 @@ class LLMHandler:
             >>> print(result.buttons[0].label)
         """
         config = MODEL_CONFIG[size]
+        deadline = Deadline.within(timeout, deadline)
 
         try:
             return await self.handle_fallback(
                 lambda: self._cerebras_structured_call(
-                    prompt, system_prompt, config["main"], response_model, timeout
+                    prompt, system_prompt, config["main"], response_model, timeout, deadline=deadline
                 ),
                 lambda: self._gemini_structured_call(
-                    prompt, system_prompt, response_model, timeout
-                )
+                    prompt, system_prompt, response_model, size, timeout, deadline=deadline
+                ),
+                model=config["main"]
             )
         except Exception as e:
             # Both providers failed after all retries
@@ -370,33 +812,101 @@ class LLMHandler:
             logger.error(error_msg)
             raise StructuredOutputError(error_msg) from e
 
-    async def generate_embedding(self, text: str, task_type: str = "retrieval_document") -> List[float]:
+    async def generate_embedding(
+        self,
+        text: str,
+        task_type: str = "retrieval_document",
+        deadline: Optional[Deadline] = None
+    ) -> List[float]:
         """
         Generates embedding using Gemini API (text-embedding-004).
 
         Args:
             text: The text to embed
             task_type: Either "retrieval_document" for stored content or "retrieval_query" for search queries
+            deadline: Optional deadline bounding the call
         """
         if not self.gemini_configured:
             raise Exception("Gemini API key not configured")
 
-        def _call():
-            result = genai.embed_content(
+        request_options = None
+        if deadline:
+            deadline.check("embedding")
+            request_options = {"timeout": deadline.remaining()}
+
+        try:
+            call = genai.embed_content_async(
                 model=EMBEDDING_MODEL,
                 content=text,
                 task_type=task_type,
                 title="Resume Section" if task_type == "retrieval_document" else None,
-                output_dimensionality=768
+                output_dimensionality=768,
+                request_options=request_options
+            )
+            result = await (asyncio.wait_for(call, deadline.remaining()) if deadline else call)
+            return result['embedding']
+        except asyncio.TimeoutError as e:
+            if deadline and deadline.expired:
+                raise DeadlineExceeded("Embedding ran out of time") from e
+            logger.error(f"Embedding generation failed: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"Embedding generation failed: {e}")
+            raise
+
+    async def generate_embeddings(
+        self,
+        texts: List[str],
+        task_type: str = "retrieval_document",
+        deadline: Optional[Deadline] = None
+    ) -> List[List[float]]:
+        """
+        Generates embeddings for many texts with one provider call per batch.
+
+        Args:
+            texts: The texts to embed (split into EMBEDDING_BATCH_SIZE batches)
+            task_type: Either "retrieval_document" for stored content or "retrieval_query" for search queries
+            deadline: Optional deadline bounding the calls
+
+        Returns:
+            One embedding per input text, in input order
+        """
+        if not self.gemini_configured:
+            raise Exception("Gemini API key not configured")
+        if not texts:
+            return []
+
+        request_options = None
+        if deadline:
+            deadline.check("embedding")
+            request_options = {"timeout": deadline.remaining()}
+
+        async def _embed_batch(batch: List[str]) -> List[List[float]]:
+            result = await genai.embed_content_async(
+                model=EMBEDDING_MODEL,
+                content=batch,
+                task_type=task_type,
+                title="Resume Section" if task_type == "retrieval_document" else None,
+                output_dimensionality=768,
+                request_options=request_options
             )
             return result['embedding']
 
+        batches = [texts[i:i + EMBEDDING_BATCH_SIZE] for i in range(0, len(texts), EMBEDDING_BATCH_SIZE)]
         try:
-            return await asyncio.to_thread(_call)
+            call = asyncio.gather(*(_embed_batch(batch) for batch in batches))
+            results = await (asyncio.wait_for(call, deadline.remaining()) if deadline else call)
+        except asyncio.TimeoutError as e:
+            if deadline and deadline.expired:
+                raise DeadlineExceeded(f"Batch embedding ({len(texts)} texts) ran out of time") from e
+            logger.error(f"Batch embedding generation failed ({len(texts)} texts): {e}")
+            raise
         except Exception as e:
-            logger.error(f"Embedding generation failed: {e}")
+            logger.error(f"Batch embedding generation failed ({len(texts)} texts): {e}")
             raise
 
+        return [embedding for batch in results for embedding in batch]
+
 
 # Global LLM handler instance
 llm_handler = LLMHandler()
@@ -0,0 +1,116 @@
+import hashlib
+import logging
+from string import Formatter
+from typing import Any, Dict, Optional
+
+from ai.tokens import count_tokens
+from ai.prompts import (
+    CHAT_SYSTEM_PROMPT,
+    BLOCK_GENERATION_SYSTEM_PROMPT,
+    BUTTON_GENERATION_PROMPT,
+    SUMMARY_GENERATION_PROMPT
+)
+
+logger = logging.getLogger(__name__)
+
+
+class PromptTemplate:
+    """
+    A system prompt split into a byte-stable static prefix and a variable tail.
+
+    The prefix is everything before the first placeholder, so every rendering
+    starts with exactly the same bytes and providers can reuse its cached
+    prefill across visitors.
+    """
+
+    def __init__(self, name: str, template: str):
+        self.name = name
+        self.template = template
+        prefix = ""
+        for literal, field, _, _ in Formatter().parse(template):
+            prefix += literal
+            if field is not None:
+                break
+        self.prefix = prefix
+        self.fingerprint = hashlib.sha256(prefix.encode("utf-8")).hexdigest()[:16]
+        self.prefix_tokens = count_tokens(prefix)
+
+    def render(self, **sections: str) -> str:
+        return self.template.format(**sections)
+
+
+class PromptAssembler:
+    """
+    Registry of prompt templates that renders them and attributes provider
+    prompt-cache usage back to the template whose prefix a request started with.
+    """
+
+    def __init__(self):
+        self.templates: Dict[str, PromptTemplate] = {}
+        self._usage: Dict[str, Dict[str, int]] = {}
+
+    def register(self, name: str, template: str) -> PromptTemplate:
+        prompt = PromptTemplate(name, template)
+        self.templates[name] = prompt
+        logger.info(f"[PROMPT] {name}: static prefix {prompt.fingerprint} ({prompt.prefix_tokens} tokens)")
+        return prompt
+
+    def render(self, name: str, **sections: str) -> str:
+        """
+        Fill a template's variable sections.
+
+        Args:
+            name: Registered template name
+            **sections: Value for every placeholder
+
+        Returns:
+            The system prompt, starting with the template's static prefix
+        """
+        return self.templates[name].render(**sections)
+
+    def match(self, system_prompt: str) -> Optional[PromptTemplate]:
+        """The registered template with the longest prefix the system prompt starts with."""
+        best = None
+        for prompt in self.templates.values():
+            if system_prompt.startswith(prompt.prefix) and (best is None or len(prompt.prefix) > len(best.prefix)):
+                best = prompt
+        return best
+
+    def record_usage(self, system_prompt: str, prompt_tokens: Any, cached_tokens: Any):
+        """
+        Record provider-reported prompt and cached token counts for one call.
+
+        Args:
+            system_prompt: The system prompt the call was made with
+            prompt_tokens: Input tokens billed by the provider (ignored unless an int)
+            cached_tokens: Input tokens served from the provider's prefix cache
+        """
+        if not isinstance(prompt_tokens, int):
+            return
+        prompt = self.match(system_prompt)
+        name = prompt.name if prompt else "other"
+        usage = self._usage.setdefault(name, {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0})
+        usage["calls"] += 1
+        usage["prompt_tokens"] += prompt_tokens
+        usage["cached_tokens"] += cached_tokens if isinstance(cached_tokens, int) else 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {}
+        for name in [*self.templates, *(n for n in self._usage if n not in self.templates)]:
+            prompt = self.templates.get(name)
+            usage = self._usage.get(name, {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0})
+            stats[name] = {
+                "fingerprint": prompt.fingerprint if prompt else None,
+                "prefix_tokens": prompt.prefix_tokens if prompt else None,
+                **usage,
+                "cached_ratio": usage["cached_tokens"] / usage["prompt_tokens"] if usage["prompt_tokens"] else 0.0
+            }
+        return stats
+
+
+# Global prompt assembler with every generation template registered
+prompt_assembler = PromptAssembler()
+prompt_assembler.register("chat", CHAT_SYSTEM_PROMPT)
+prompt_assembler.register("block", BLOCK_GENERATION_SYSTEM_PROMPT)
+prompt_assembler.register("buttons", BUTTON_GENERATION_PROMPT)
+prompt_assembler.register("summary", SUMMARY_GENERATION_PROMPT)
@@ -13,19 +13,13 @@ When you have enough information (usually after 2-3 turns), respond with ONLY th
 Otherwise, respond with just your chat message.
 """
 
+# Templates keep all static instructions first and every {placeholder} at the
+# end, so the text before the first placeholder is byte-identical across
+# requests and served from the provider's prefix cache (see ai.prompt_assembly)
 BLOCK_GENERATION_SYSTEM_PROMPT = """You are generating an interactive HTML section for a resume website.
 
-VISITOR SUMMARY: {visitor_summary}
-
-USER QUERY: {user_input}
-
-PREVIOUS BLOCK SUMMARIES: {block_summaries}
-
-RELEVANT EXPERIENCES:
-{rag_results}
-
 Generation Guidelines:
-1. Create content that emphasizes the visitor's interests and query using ONLY experiences provided
+1. Create content that emphasizes the visitor's interests and query using ONLY the RELEVANT EXPERIENCES provided below
 2. Be creative and dynamic with layouts, typography, and visual hierarchy
 3. Ensure accessibility (semantic HTML, color contrast, readable fonts)
 4. Long sections are allowed when they add value
@@ -45,15 +39,19 @@ Return ONLY the HTML content - no markdown code fences, no explanations, no wrap
 IMPORTANT:
 - Do NOT use markdown code fences (```html)
 - Ensure all information is accurate and based on the provided context
-- Return pure HTML that can be inserted directly into the page"""
-
-BUTTON_GENERATION_PROMPT = """You are generating suggested prompt buttons for an AI-powered interactive resume chatbot.
+- Return pure HTML that can be inserted directly into the page
 
 VISITOR SUMMARY: {visitor_summary}
 
-RELEVANT CONTENT:
+PREVIOUS BLOCK SUMMARIES: {block_summaries}
+
+RELEVANT EXPERIENCES:
 {rag_results}
 
+USER QUERY: {user_input}"""
+
+BUTTON_GENERATION_PROMPT = """You are generating suggested prompt buttons for an AI-powered interactive resume chatbot.
+
 Generate 3 diverse, interesting prompts that:
 1. Are specific and actionable
 2. Build on or explore different angles of the visitor's interests
@@ -70,20 +68,25 @@ Return ONLY a JSON object with this structure:
   ]
 }}
 
-Return ONLY the JSON object. No markdown, no explanation."""
+Return ONLY the JSON object. No markdown, no explanation.
 
-SUMMARY_GENERATION_PROMPT = """You are summarizing what an HTML block on a resume website covered.
+VISITOR SUMMARY: {visitor_summary}
 
-HTML CONTENT:
-{html}
+RELEVANT CONTENT:
+{rag_results}"""
 
-VISITOR CONTEXT: {visitor_summary}
+SUMMARY_GENERATION_PROMPT = """You are summarizing what an HTML block on a resume website covered.
 
-Generate a concise summary describing what experiences and skills were highlighted in this block and what the focus was.
+Generate a concise summary describing what experiences and skills were highlighted in the HTML CONTENT below and what the focus was.
 
 Examples:
 - "Covered AI/ML projects with a focus on technical leadership and impact at Google."
 - "Outlined backend infrastructure expertise, emphasizing distributed systems and scalability."
 - "Showcased early-stage startup involvement, highlighting product management and rapid iteration."
 
-Return ONLY the summary. No additional text or formatting."""
+Return ONLY the summary. No additional text or formatting.
+
+VISITOR CONTEXT: {visitor_summary}
+
+HTML CONTENT:
+{html}"""
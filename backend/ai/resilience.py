@@ -0,0 +1,243 @@
+import logging
+import math
+import time
+from collections import deque
+from enum import Enum
+from typing import Any, Callable, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """Rolling window of observed call latencies used to derive a hedge delay."""
+
+    def __init__(self, window: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Nearest-rank percentile of the window, or None if it is empty."""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        rank = max(1, math.ceil(pct / 100 * len(ordered)))
+        return ordered[rank - 1]
+
+
+class HedgeStats:
+    """Per-model counters for hedged requests."""
+
+    def __init__(self):
+        self.requests = 0
+        self.hedged = 0
+        self.primary_wins = 0
+        self.fallback_wins = 0
+        self.latency = LatencyTracker()
+
+    def snapshot(self, hedge_delay: float) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_rate": self.hedged / self.requests if self.requests else 0.0,
+            "primary_wins": self.primary_wins,
+            "fallback_wins": self.fallback_wins,
+            "latency_samples": len(self.latency),
+            "hedge_delay_seconds": hedge_delay
+        }
+
+
+class CircuitState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit breaker is open."""
+    pass
+
+
+class CircuitBreaker:
+    """
+    Failure-rate circuit breaker for a single provider/model pair.
+
+    Opens after failure_threshold failures within window_seconds. While open,
+    calls are rejected immediately; after reset_timeout seconds a single probe
+    is let through (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        window_seconds: float = 30.0,
+        reset_timeout: float = 15.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.window_seconds = window_seconds
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._state = CircuitState.CLOSED
+        self._failures: Deque[float] = deque()
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.rejected = 0
+        self.transitions: Deque[Dict[str, Any]] = deque(maxlen=20)
+
+    @property
+    def state(self) -> CircuitState:
+        if self._state == CircuitState.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._transition(CircuitState.HALF_OPEN)
+        return self._state
+
+    def allow_request(self) -> bool:
+        """Whether a call may go to this provider right now."""
+        state = self.state
+        if state == CircuitState.CLOSED:
+            return True
+        if state == CircuitState.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def release_probe(self):
+        """Free the half-open probe slot when a call ends without an outcome (e.g. cancelled)."""
+        self._probe_in_flight = False
+
+    def record_success(self):
+        self._probe_in_flight = False
+        self._failures.clear()
+        if self._state != CircuitState.CLOSED:
+            self._transition(CircuitState.CLOSED)
+
+    def record_failure(self):
+        now = self._clock()
+        self._probe_in_flight = False
+        if self._state == CircuitState.HALF_OPEN:
+            self._open(now)
+            return
+
+        self._failures.append(now)
+        while self._failures and now - self._failures[0] > self.window_seconds:
+            self._failures.popleft()
+        if self._state == CircuitState.CLOSED and len(self._failures) >= self.failure_threshold:
+            self._open(now)
+
+    def _open(self, now: float):
+        self._opened_at = now
+        self._failures.clear()
+        self._transition(CircuitState.OPEN)
+
+    def _transition(self, new_state: CircuitState):
+        old_state = self._state
+        self._state = new_state
+        self.transitions.append({"from": old_state.value, "to": new_state.value, "at": time.time()})
+        logger.warning(f"[BREAKER] {self.name}: {old_state.value} -> {new_state.value}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "state": self.state.value,
+            "recent_failures": len(self._failures),
+            "rejected": self.rejected,
+            "transitions": list(self.transitions)
+        }
+
+
+class RetryBudget:
+    """
+    Token bucket limiting retries to a fraction of recent request volume.
+
+    Each first attempt deposits `ratio` tokens and each retry spends one, with a
+    small time-based refill so low-traffic periods can still retry. During an
+    outage the bucket drains and retries stop instead of multiplying load.
+    """
+
+    def __init__(
+        self,
+        ratio: float = 0.2,
+        refill_per_second: float = 1.0,
+        max_tokens: float = 10.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.ratio = ratio
+        self.refill_per_second = refill_per_second
+        self.max_tokens = max_tokens
+        self._clock = clock
+        self._tokens = max_tokens
+        self._last_refill = clock()
+        self.retries = 0
+        self.exhausted = 0
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.max_tokens, self._tokens + (now - self._last_refill) * self.refill_per_second)
+        self._last_refill = now
+
+    def record_request(self):
+        self._refill()
+        self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        """Take one retry token; False means the retry should be skipped."""
+        self._refill()
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            self.retries += 1
+            return True
+        self.exhausted += 1
+        return False
+
+    def snapshot(self) -> Dict[str, Any]:
+        self._refill()
+        return {
+            "tokens": round(self._tokens, 2),
+            "retries": self.retries,
+            "exhausted": self.exhausted
+        }
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request's end-to-end time budget has been used up."""
+    pass
+
+
+class Deadline:
+    """
+    Absolute point in time by which a request must finish.
+
+    Created once at the endpoint and passed down the pipeline; each stage asks
+    for remaining() and bounds its own work by it, so the total latency of a
+    request never exceeds the budget it started with.
+    """
+
+    def __init__(self, seconds: float, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self.expires_at = clock() + seconds
+
+    @classmethod
+    def within(cls, seconds: float, parent: Optional["Deadline"] = None) -> "Deadline":
+        """A deadline `seconds` from now, capped by an optional parent deadline."""
+        deadline = cls(seconds, clock=parent._clock if parent else time.monotonic)
+        if parent and parent.expires_at < deadline.expires_at:
+            deadline.expires_at = parent.expires_at
+        return deadline
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - self._clock())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self, stage: str):
+        """Raise DeadlineExceeded if no time is left for the given stage."""
+        if self.expired:
+            raise DeadlineExceeded(f"Deadline exceeded before {stage}")
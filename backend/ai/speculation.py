@@ -0,0 +1,336 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from ai.generation import GenerationHandler, generation_handler
+from ai.resilience import Deadline
+from ai.tokens import count_tokens
+from models import CompressedContext, SuggestedButton
+from sessions import SESSION_MAX_BLOCKS
+
+logger = logging.getLogger(__name__)
+
+SPECULATION_ENABLED = os.getenv("SPECULATION_ENABLED", "false").lower() == "true"
+SPECULATION_MAX_CONCURRENCY = int(os.getenv("SPECULATION_MAX_CONCURRENCY", "2"))
+# Speculations queued or running at once; further suggestions are not speculated
+SPECULATION_MAX_PENDING = int(os.getenv("SPECULATION_MAX_PENDING", "6"))
+SPECULATION_TTL_SECONDS = float(os.getenv("SPECULATION_TTL_SECONDS", "300"))
+SPECULATION_MAX_SESSIONS = int(os.getenv("SPECULATION_MAX_SESSIONS", "100"))
+SPECULATION_DEADLINE_SECONDS = float(os.getenv("SPECULATION_DEADLINE_SECONDS", "60"))
+# Estimated LLM tokens speculation may spend per minute across all sessions
+SPECULATION_TOKEN_BUDGET_PER_MINUTE = int(os.getenv("SPECULATION_TOKEN_BUDGET_PER_MINUTE", "40000"))
+# Estimate for a block before it is generated (RAG prompt + HTML + summary)
+SPECULATION_EST_TOKENS_PER_BLOCK = 2500
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+
+def _session_key(visitor_summary: str, session_id: Optional[str] = None) -> str:
+    # Legacy clients without a server-side session are identified by their visitor summary
+    return session_id or hashlib.sha256(visitor_summary.encode()).hexdigest()[:16]
+
+
+def _context_key(context: Optional[CompressedContext]) -> str:
+    data = context.model_dump() if context else CompressedContext().model_dump()
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def next_context(
+    context: Optional[CompressedContext],
+    block_summary: str,
+    experience_ids: List[str]
+) -> CompressedContext:
+    """The context the next request is served with after a block (mirrors Session.record_block)."""
+    context = context or CompressedContext()
+    counts = dict(context.shown_experience_counts)
+    for exp_id in experience_ids:
+        counts[exp_id] = counts.get(exp_id, 0) + 1
+    return CompressedContext(
+        block_summaries=[*context.block_summaries, block_summary][-SESSION_MAX_BLOCKS:],
+        shown_experience_counts=counts
+    )
+
+
+class _Speculation:
+    """One pre-generated (or in-flight) block for a suggested prompt."""
+
+    def __init__(self, prompt: str, created_at: float):
+        self.prompt = prompt
+        self.created_at = created_at
+        self.task: Optional[asyncio.Task] = None
+        self.served = False
+
+
+class SpeculationEngine:
+    """
+    Pre-generates blocks for suggested button prompts in the background.
+
+    After buttons are shown, the next request is very likely one of their
+    prompts. Each suggestion is generated with bounded concurrency and a token
+    budget and kept in a per-session cache keyed by the prompt and the context
+    the frontend will send with it. A matching request is served from the cache,
+    waiting on the speculation if it is still running.
+    """
+
+    def __init__(
+        self,
+        handler: GenerationHandler,
+        enabled: bool = SPECULATION_ENABLED,
+        max_concurrency: int = SPECULATION_MAX_CONCURRENCY,
+        ttl_seconds: float = SPECULATION_TTL_SECONDS,
+        max_sessions: int = SPECULATION_MAX_SESSIONS,
+        token_budget_per_minute: int = SPECULATION_TOKEN_BUDGET_PER_MINUTE,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.handler = handler
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.token_budget = token_budget_per_minute
+        self._clock = clock
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # session key -> {(context key, prompt): speculation}
+        self._sessions: "OrderedDict[str, Dict[tuple, _Speculation]]" = OrderedDict()
+        self._tokens = float(token_budget_per_minute)
+        self._last_refill = clock()
+        self.scheduled = 0
+        self.completed = 0
+        self.failed = 0
+        self.skipped_budget = 0
+        self.skipped_capacity = 0
+        self.hits = 0
+        self.inflight_hits = 0
+        self.misses = 0
+        self.wasted = 0
+        self.cancelled = 0
+        self.tokens_spent = 0
+        self.tokens_wasted = 0
+
+    def _pending(self) -> int:
+        return sum(
+            1 for entries in self._sessions.values() for s in entries.values()
+            if s.task and not s.task.done()
+        )
+
+    def _try_reserve_tokens(self) -> bool:
+        now = self._clock()
+        self._tokens = min(
+            self.token_budget,
+            self._tokens + (now - self._last_refill) * self.token_budget / 60
+        )
+        self._last_refill = now
+        if self._tokens < SPECULATION_EST_TOKENS_PER_BLOCK:
+            return False
+        self._tokens -= SPECULATION_EST_TOKENS_PER_BLOCK
+        return True
+
+    def _discard(self, spec: _Speculation):
+        """Drop a speculation, counting it as wasted if it was never served."""
+        if spec.served:
+            return
+        if spec.task and not spec.task.done():
+            spec.task.cancel()
+            self.cancelled += 1
+        elif spec.task and not spec.task.cancelled() and spec.task.exception() is None:
+            self.wasted += 1
+            self.tokens_wasted += spec.task.result()["estimated_tokens"]
+
+    def _expire(self):
+        now = self._clock()
+        for session in list(self._sessions):
+            entries = self._sessions[session]
+            for key, spec in list(entries.items()):
+                if now - spec.created_at > self.ttl_seconds:
+                    self._discard(spec)
+                    del entries[key]
+            if not entries:
+                del self._sessions[session]
+
+    def schedule(
+        self,
+        visitor_summary: str,
+        context: Optional[CompressedContext],
+        buttons: List[Any],
+        session_id: Optional[str] = None
+    ) -> int:
+        """
+        Start speculative generation for each suggested button prompt.
+
+        Args:
+            visitor_summary: The visitor the buttons were generated for
+            context: The context the next request will be served with when a button is clicked
+            buttons: SuggestedButton objects or their dicts
+            session_id: Server-side session the buttons were shown in, if any
+
+        Returns:
+            Number of speculations started
+        """
+        if not self.enabled or not visitor_summary:
+            return 0
+
+        self._expire()
+        session = _session_key(visitor_summary, session_id)
+        context_key = _context_key(context)
+
+        # A new context means the visitor moved on; older speculations can't match any more
+        entries = self._sessions.pop(session, {})
+        for key, spec in list(entries.items()):
+            if key[0] != context_key:
+                self._discard(spec)
+                del entries[key]
+        self._sessions[session] = entries
+        while len(self._sessions) > self.max_sessions:
+            _, evicted = self._sessions.popitem(last=False)
+            for spec in evicted.values():
+                self._discard(spec)
+
+        started = 0
+        for button in buttons:
+            prompt = button.prompt if isinstance(button, SuggestedButton) else button["prompt"]
+            key = (context_key, _normalize(prompt))
+            if key in entries:
+                continue
+            if self._pending() >= SPECULATION_MAX_PENDING:
+                self.skipped_capacity += 1
+                continue
+            if not self._try_reserve_tokens():
+                self.skipped_budget += 1
+                continue
+
+            spec = _Speculation(prompt, self._clock())
+            spec.task = asyncio.get_running_loop().create_task(self._run(spec, visitor_summary, context))
+            # Failures are logged in _run; mark them retrieved for speculations nobody claims
+            spec.task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            entries[key] = spec
+            self.scheduled += 1
+            started += 1
+
+        if started:
+            logger.info(f"[SPECULATE] Started {started} speculative blocks for session {session}")
+        return started
+
+    async def _run(self, spec: _Speculation, visitor_summary: str, context: Optional[CompressedContext]) -> Dict[str, Any]:
+        async with self._semaphore:
+            deadline = Deadline(SPECULATION_DEADLINE_SECONDS)
+            try:
+                experiences = await self.handler.retrieve_experiences(spec.prompt, context, deadline)
+                block = await self.handler.generate_block(
+                    visitor_summary=visitor_summary,
+                    action_type="user_question",
+                    action_value=spec.prompt,
+                    context=context,
+                    deadline=deadline,
+                    experiences=experiences
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.warning(f"[SPECULATE] Speculative block failed: {e}")
+                raise
+
+        # Usage isn't reported through llm_call, so cost is estimated from the texts
+        estimated_tokens = sum(count_tokens(exp.get("content", "")) for exp in experiences) + \
+            count_tokens(block["html"]) + count_tokens(block["block_summary"])
+        self._tokens += SPECULATION_EST_TOKENS_PER_BLOCK - estimated_tokens
+        self.tokens_spent += estimated_tokens
+        self.completed += 1
+        return {**block, "experiences": experiences, "estimated_tokens": estimated_tokens}
+
+    def schedule_after_block(
+        self,
+        visitor_summary: str,
+        context: Optional[CompressedContext],
+        block_summary: Optional[str],
+        experience_ids: List[str],
+        buttons: List[Any],
+        session_id: Optional[str] = None
+    ) -> int:
+        """Speculate on buttons shown alongside a block, using the context that follows it."""
+        if not self.enabled or block_summary is None:
+            return 0
+        return self.schedule(visitor_summary, next_context(context, block_summary, experience_ids), buttons, session_id)
+
+    async def take(
+        self,
+        visitor_summary: str,
+        action_value: Optional[str],
+        context: Optional[CompressedContext],
+        deadline: Optional[Deadline] = None,
+        session_id: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Claim a speculated block for this request.
+
+        Waits for an in-flight speculation (bounded by the deadline).
+
+        Returns:
+            Dict with 'html', 'block_summary', 'experience_ids' and 'experiences',
+            or None if nothing usable was speculated
+        """
+        if not self.enabled or not visitor_summary or not action_value:
+            return None
+
+        self._expire()
+        entries = self._sessions.get(_session_key(visitor_summary, session_id), {})
+        spec = entries.pop((_context_key(context), _normalize(action_value)), None)
+        if spec is None:
+            self.misses += 1
+            return None
+
+        in_flight = not spec.task.done()
+        try:
+            waiter = asyncio.shield(spec.task)
+            block = await (asyncio.wait_for(waiter, deadline.remaining()) if deadline else waiter)
+        except Exception as e:
+            logger.info(f"[SPECULATE] Speculation unusable, generating normally: {e!r}")
+            self.misses += 1
+            return None
+
+        spec.served = True
+        self.hits += 1
+        if in_flight:
+            self.inflight_hits += 1
+        logger.info(f"[SPECULATE] Served speculative block for '{action_value}' (in flight: {in_flight})")
+        return block
+
+    def clear(self):
+        """Drop every speculation, cancelling in-flight ones, e.g. after the corpus changed under them."""
+        dropped = sum(len(entries) for entries in self._sessions.values())
+        for entries in self._sessions.values():
+            for spec in entries.values():
+                self._discard(spec)
+        self._sessions.clear()
+        if dropped:
+            logger.info(f"[SPECULATE] Cleared {dropped} speculations")
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "scheduled": self.scheduled,
+            "completed": self.completed,
+            "failed": self.failed,
+            "pending": self._pending(),
+            "skipped_budget": self.skipped_budget,
+            "skipped_capacity": self.skipped_capacity,
+            "hits": self.hits,
+            "inflight_hits": self.inflight_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "wasted": self.wasted,
+            "cancelled": self.cancelled,
+            "estimated_tokens_spent": self.tokens_spent,
+            "estimated_tokens_wasted": self.tokens_wasted
+        }
+
+
+# Global speculation engine instance
+speculation_engine = SpeculationEngine(generation_handler)
@@ -0,0 +1,106 @@
+import json
+from typing import Any
+
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+FENCE = "```"
+FENCE_LANG = "html"
+
+
+class StreamCleaner:
+    """
+    Incrementally applies the same cleanup as the non-streaming path.
+
+    Removes <think>...</think> blocks, strips ``` / ```html fences and trims
+    leading/trailing whitespace, while holding back only as many characters
+    as are needed to recognize a marker split across chunk boundaries.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._in_think = False
+        self._started = False
+        self._pending_ws = ""
+
+    def feed(self, chunk: str) -> str:
+        """Add a chunk of raw model output and return the text that is safe to emit."""
+        self._buffer += chunk
+        return self._drain(final=False)
+
+    def flush(self) -> str:
+        """Emit whatever is left once the stream has ended."""
+        out = self._drain(final=True)
+        # Trailing whitespace is dropped, matching .strip() on the full response
+        self._pending_ws = ""
+        return out
+
+    def _drain(self, final: bool) -> str:
+        out = []
+        while self._buffer:
+            if self._in_think:
+                end = self._buffer.find(THINK_CLOSE)
+                if end == -1:
+                    # Keep a possible partial closing tag, discard the rest
+                    keep = _partial_suffix(self._buffer, THINK_CLOSE)
+                    self._buffer = self._buffer[len(self._buffer) - keep:] if keep else ""
+                    break
+                self._buffer = self._buffer[end + len(THINK_CLOSE):]
+                self._in_think = False
+                continue
+
+            think = self._buffer.find(THINK_OPEN)
+            fence = self._buffer.find(FENCE)
+            candidates = [i for i in (think, fence) if i != -1]
+            if candidates:
+                idx = min(candidates)
+                out.append(self._buffer[:idx])
+                if idx == think:
+                    self._buffer = self._buffer[idx + len(THINK_OPEN):]
+                    self._in_think = True
+                    continue
+                rest = self._buffer[idx + len(FENCE):]
+                if len(rest) < len(FENCE_LANG) and FENCE_LANG.startswith(rest) and not final:
+                    # Can't tell yet whether this is ``` or ```html
+                    self._buffer = self._buffer[idx:]
+                    break
+                if rest.startswith(FENCE_LANG):
+                    rest = rest[len(FENCE_LANG):]
+                self._buffer = rest
+                continue
+
+            keep = 0 if final else max(
+                _partial_suffix(self._buffer, THINK_OPEN),
+                _partial_suffix(self._buffer, FENCE)
+            )
+            out.append(self._buffer[:len(self._buffer) - keep])
+            self._buffer = self._buffer[len(self._buffer) - keep:] if keep else ""
+            break
+
+        return self._trim("".join(out))
+
+    def _trim(self, text: str) -> str:
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return ""
+            self._started = True
+
+        # Hold trailing whitespace back until we know more content follows
+        text = self._pending_ws + text
+        stripped = text.rstrip()
+        self._pending_ws = text[len(stripped):]
+        return stripped
+
+
+def _partial_suffix(text: str, marker: str) -> int:
+    """Length of the longest suffix of text that is a proper prefix of marker."""
+    for size in range(min(len(text), len(marker) - 1), 0, -1):
+        if marker.startswith(text[-size:]):
+            return size
+    return 0
+
+
+def format_sse(event: str, data: Any) -> str:
+    """Format a single Server-Sent Events message with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
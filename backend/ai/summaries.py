@@ -0,0 +1,145 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from ai.summarizer import LLM_BLOCK_SUMMARIES
+from models import CompressedContext
+
+logger = logging.getLogger(__name__)
+
+# Return blocks before their summary is ready; the summary is computed in the background.
+# Only LLM summaries are worth deferring, so this is off unless LLM_BLOCK_SUMMARIES is set;
+# local summaries are cheap and always returned with the block
+DEFER_BLOCK_SUMMARIES = LLM_BLOCK_SUMMARIES and os.getenv("DEFER_BLOCK_SUMMARIES", "true").lower() == "true"
+SUMMARY_STORE_MAX_ENTRIES = int(os.getenv("SUMMARY_STORE_MAX_ENTRIES", "2000"))
+SUMMARY_STORE_TTL_SECONDS = float(os.getenv("SUMMARY_STORE_TTL_SECONDS", "3600"))
+# How long a follow-up request waits for a summary that is still being generated
+SUMMARY_WAIT_SECONDS = float(os.getenv("SUMMARY_WAIT_SECONDS", "3"))
+
+
+class BlockSummaryStore:
+    """
+    Server-side store for block summaries computed off the critical path.
+
+    A block is returned with an ID while its summary is generated in the
+    background. The client sends that ID back in
+    CompressedContext.pending_block_ids and the next request swaps it for the
+    summary, waiting briefly if it isn't ready yet.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = SUMMARY_STORE_MAX_ENTRIES,
+        ttl_seconds: float = SUMMARY_STORE_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[str, tuple[asyncio.Task, float]]" = OrderedDict()
+        self.deferred = 0
+        self.resolved = 0
+        self.missing = 0
+
+    def defer(self, summary: Awaitable[str]) -> str:
+        """
+        Start computing a summary in the background.
+
+        Returns:
+            Block ID the summary can be fetched by
+        """
+        block_id = uuid.uuid4().hex
+        task = asyncio.ensure_future(summary)
+        # Errors surface on resolve(); don't let unclaimed ones warn at shutdown
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._entries[block_id] = (task, self._clock())
+        while len(self._entries) > self.max_entries:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            evicted.cancel()
+        self.deferred += 1
+        return block_id
+
+    async def resolve(self, block_id: str, timeout: float = SUMMARY_WAIT_SECONDS) -> Optional[str]:
+        """
+        Get a deferred summary, waiting up to timeout seconds if it is still running.
+
+        Returns:
+            The summary, or None if unknown, expired, failed or not ready in time
+        """
+        entry = self._entries.get(block_id)
+        if entry is None or self._clock() - entry[1] > self.ttl_seconds:
+            self._entries.pop(block_id, None)
+            self.missing += 1
+            return None
+
+        try:
+            summary = await asyncio.wait_for(asyncio.shield(entry[0]), timeout)
+        except Exception as e:
+            logger.warning(f"[SUMMARY] Deferred summary {block_id} unavailable: {e!r}")
+            self.missing += 1
+            return None
+
+        self.resolved += 1
+        return summary
+
+    async def resolve_context(
+        self,
+        context: Optional[CompressedContext],
+        timeout: float = SUMMARY_WAIT_SECONDS
+    ) -> Optional[CompressedContext]:
+        """
+        Fold summaries for context.pending_block_ids into block_summaries.
+
+        Each summary is inserted at its block's pending_block_positions entry,
+        so block_summaries stays in the order the blocks were shown. Summaries
+        still being generated after timeout seconds stay pending.
+        """
+        if not context or not context.pending_block_ids:
+            return context
+
+        ids = context.pending_block_ids
+        existing = context.block_summaries
+        positions = [*context.pending_block_positions, *[len(existing)] * len(ids)]
+        summaries = await asyncio.gather(*(self.resolve(block_id, timeout) for block_id in ids))
+
+        inserts: Dict[int, List[tuple]] = {}
+        for block_id, position, summary in zip(ids, positions, summaries):
+            inserts.setdefault(min(position, len(existing)), []).append((block_id, summary))
+
+        block_summaries, pending_ids, pending_positions = [], [], []
+        for i in range(len(existing) + 1):
+            for block_id, summary in inserts.get(i, []):
+                if summary:
+                    block_summaries.append(summary)
+                elif self._running(block_id):
+                    pending_ids.append(block_id)
+                    pending_positions.append(len(block_summaries))
+            if i < len(existing):
+                block_summaries.append(existing[i])
+
+        return CompressedContext(
+            block_summaries=block_summaries,
+            shown_experience_counts=context.shown_experience_counts,
+            pending_block_ids=pending_ids,
+            pending_block_positions=pending_positions
+        )
+
+    def _running(self, block_id: str) -> bool:
+        entry = self._entries.get(block_id)
+        return entry is not None and not entry[0].done()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "deferred": self.deferred,
+            "resolved": self.resolved,
+            "missing": self.missing
+        }
+
+
+# Global block summary store instance
+summary_store = BlockSummaryStore()
@@ -0,0 +1,116 @@
+import os
+import re
+from html.parser import HTMLParser
+from typing import List
+
+# Summarize blocks with the SMALL model instead of locally (one extra provider call per block)
+LLM_BLOCK_SUMMARIES = os.getenv("LLM_BLOCK_SUMMARIES", "false").lower() == "true"
+
+FALLBACK_SUMMARY = "Displayed relevant experience block"
+MAX_TITLES = 3
+MAX_HEADINGS = 2
+MAX_PART_CHARS = 80
+
+_HEADING_TAGS = {"h1", "h2", "h3"}
+_SKIPPED_TAGS = {"script", "style"}
+
+
+class _BlockTextParser(HTMLParser):
+    """Collects heading text and the first stretch of body text from block HTML."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.headings: List[str] = []
+        self.text: List[str] = []
+        self._heading: List[str] = []
+        self._in_heading = 0
+        self._skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIPPED_TAGS:
+            self._skipping += 1
+        elif tag in _HEADING_TAGS:
+            self._in_heading += 1
+
+    def handle_endtag(self, tag):
+        if tag in _SKIPPED_TAGS:
+            self._skipping = max(0, self._skipping - 1)
+        elif tag in _HEADING_TAGS and self._in_heading:
+            self._in_heading -= 1
+            if not self._in_heading:
+                heading = _clean("".join(self._heading))
+                if heading:
+                    self.headings.append(heading)
+                self._heading = []
+
+    def handle_data(self, data):
+        if self._skipping:
+            return
+        if self._in_heading:
+            self._heading.append(data)
+        elif sum(len(t) for t in self.text) < MAX_PART_CHARS * 2:
+            self.text.append(data)
+
+
+def _clean(text: str) -> str:
+    text = re.sub(r"\s+", " ", text).strip()
+    if len(text) > MAX_PART_CHARS:
+        text = text[:MAX_PART_CHARS].rsplit(" ", 1)[0] + "…"
+    return text
+
+
+def _join(items: List[str]) -> str:
+    if len(items) <= 2:
+        return " and ".join(items)
+    return ", ".join(items[:-1]) + f", and {items[-1]}"
+
+
+def _unique(items: List[str], limit: int) -> List[str]:
+    seen = set()
+    result = []
+    for item in items:
+        key = item.lower()
+        if item and key not in seen:
+            seen.add(key)
+            result.append(item)
+        if len(result) == limit:
+            break
+    return result
+
+
+def summarize_block(html: str, experience_titles: List[str]) -> str:
+    """
+    Build a one-sentence block summary without a provider call.
+
+    Uses the titles of the experiences the block was generated from plus the
+    block's own headings, falling back to its opening text.
+
+    Args:
+        html: The generated block HTML
+        experience_titles: Titles of the experiences passed to the block prompt
+
+    Returns:
+        One-sentence summary
+    """
+    parser = _BlockTextParser()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception:
+        # html.parser is lenient, but never let a summary fail a block
+        pass
+
+    titles = _unique([_clean(t) for t in experience_titles], MAX_TITLES)
+    headings = _unique(parser.headings, MAX_HEADINGS)
+
+    if titles and headings:
+        return f"Highlighted {_join(titles)}, focusing on {_join(headings)}."
+    if titles:
+        return f"Highlighted {_join(titles)}."
+    if headings:
+        return f"Covered {_join(headings)}."
+
+    opening = _clean("".join(parser.text))
+    if opening:
+        return f"Covered {opening.rstrip('.')}."
+    return FALLBACK_SUMMARY
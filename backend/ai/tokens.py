@@ -0,0 +1,51 @@
+import re
+
+# Word pieces, digits and individual punctuation marks, roughly how BPE
+# tokenizers split English prose, markdown and code
+_PIECE_RE = re.compile(r"[A-Za-z]+|\d|[^\sA-Za-z\d]")
+# Letters per token for long words; common short words are a single token
+_CHARS_PER_TOKEN = 5
+
+
+def _piece_tokens(piece: str) -> int:
+    return 1 + (len(piece) - 1) // _CHARS_PER_TOKEN if piece[0].isalpha() else 1
+
+
+def count_tokens(text: str) -> int:
+    """
+    Approximate the token count of text without a provider tokenizer.
+
+    Errs slightly high for plain English so budgets computed from it hold
+    for the Llama/Qwen and Gemini tokenizers.
+
+    Args:
+        text: Any prompt text
+
+    Returns:
+        Estimated number of tokens
+    """
+    if not text:
+        return 0
+    return sum(_piece_tokens(piece) for piece in _PIECE_RE.findall(text))
+
+
+def truncate_tokens(text: str, budget: int) -> str:
+    """
+    Cut text to the longest prefix that fits a token budget, at a piece boundary.
+
+    Args:
+        text: Any prompt text
+        budget: Maximum tokens (as counted by count_tokens) of the result
+
+    Returns:
+        text unchanged if it fits, otherwise its truncated prefix
+    """
+    if not text:
+        return text
+    tokens, end = 0, 0
+    for match in _PIECE_RE.finditer(text):
+        tokens += _piece_tokens(match.group())
+        if tokens > budget:
+            return text[:end].rstrip()
+        end = match.end()
+    return text
@@ -0,0 +1,161 @@
+"""
+Benchmark: thread-offloaded sync SDK calls vs. native async pooled client.
+
+Starts a local fake OpenAI-compatible provider that answers every
+/v1/chat/completions request after a fixed latency, then fires N concurrent
+requests through:
+
+  * threads - the previous design: sync Cerebras client via asyncio.to_thread,
+              bounded by the default executor size
+  * async   - LLMHandler._cerebras_call on AsyncCerebras + the shared httpx pool
+
+Usage (from backend/):
+    python -m benchmarks.bench_llm_concurrency [--latency 0.2] [--concurrency 8 32 128 256]
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cerebras.cloud.sdk import AsyncCerebras, Cerebras
+
+from ai.llm import LLMHandler, build_http_client
+
+MODEL = "fake-model"
+
+COMPLETION = json.dumps({
+    "id": "chatcmpl-bench",
+    "object": "chat.completion",
+    "created": 0,
+    "model": MODEL,
+    "choices": [{
+        "index": 0,
+        "finish_reason": "stop",
+        "message": {"role": "assistant", "content": "<think>x</think>ok"}
+    }],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+}).encode()
+
+
+class FakeProvider:
+    """Minimal HTTP/1.1 keep-alive server returning a canned chat completion."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.connections = 0
+        self.server = None
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0, backlog=1024)
+        port = self.server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                header = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in header.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                if length:
+                    await reader.readexactly(length)
+
+                await asyncio.sleep(self.latency)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\n"
+                    b"Content-Type: application/json\r\n"
+                    b"Connection: keep-alive\r\n"
+                    b"Content-Length: " + str(len(COMPLETION)).encode() + b"\r\n\r\n" + COMPLETION
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+
+async def run_threads(base_url: str, concurrency: int, workers: int) -> float:
+    client = Cerebras(api_key="bench", base_url=base_url, max_retries=0, warm_tcp_connection=False)
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=workers))
+
+    def _call():
+        return client.chat.completions.create(
+            model=MODEL,
+            messages=[{"role": "user", "content": "hi"}]
+        )
+
+    start = time.perf_counter()
+    await asyncio.gather(*(asyncio.to_thread(_call) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    client.close()
+    return elapsed
+
+
+class BenchHandler(LLMHandler):
+    """LLMHandler (breakers, retry budgets and all) pointed at the fake provider."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        super().__init__()
+
+    def _init_clients(self):
+        self.http_client = build_http_client()
+        self.cerebras_client = AsyncCerebras(
+            api_key="bench",
+            base_url=self.base_url,
+            http_client=self.http_client,
+            max_retries=0,
+            warm_tcp_connection=False
+        )
+
+
+async def run_async(base_url: str, concurrency: int) -> float:
+    handler = BenchHandler(base_url)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(handler._cerebras_call("hi", "system", MODEL) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    await handler.aclose()
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake provider latency in seconds")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8, 32, 64, 128, 256])
+    args = parser.parse_args()
+
+    # Size of asyncio's default executor (what asyncio.to_thread runs on)
+    workers = min(32, (os.cpu_count() or 1) + 4)
+
+    print(f"Fake provider latency: {args.latency * 1000:.0f} ms, default executor threads: {workers}")
+    print(f"{'concurrency':>11} | {'threads (s)':>11} {'req/s':>8} | {'async (s)':>9} {'req/s':>8} {'conns':>6}")
+
+    for n in args.concurrency:
+        provider = FakeProvider(args.latency)
+        base_url = await provider.start()
+        t_threads = await run_threads(base_url, n, workers)
+        await provider.stop()
+
+        provider = FakeProvider(args.latency)
+        base_url = await provider.start()
+        t_async = await run_async(base_url, n)
+        await provider.stop()
+
+        print(
+            f"{n:>11} | {t_threads:>11.2f} {n / t_threads:>8.0f} | "
+            f"{t_async:>9.2f} {n / t_async:>8.0f} {provider.connections:>6}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
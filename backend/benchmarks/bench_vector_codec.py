@@ -0,0 +1,143 @@
+"""
+Benchmark: text vs. binary pgvector round trips.
+
+For each of N queries, sends a 768-dim embedding to Postgres and reads one
+back through:
+
+  * text   - the previous design: the embedding is formatted as a '[...]'
+             literal, parsed by Postgres, and returned as embedding::text
+             for json.loads
+  * binary - db.encode_vector / db.decode_vector registered as the vector
+             codec, with the statement prepared once per connection
+
+Two workloads are timed: an echo (SELECT $1::vector) isolating wire/codec
+cost, and the RAG kNN query against the experiences table (skipped when it
+is empty). Client-side encode/decode cost alone is also reported, and that
+part needs no database.
+
+Usage (from backend/, with DATABASE_URL set):
+    python -m benchmarks.bench_vector_codec [--queries 2000] [--dim 768]
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import asyncpg
+import numpy as np
+from dotenv import load_dotenv
+
+from db import encode_vector, decode_vector
+from rag import SEARCH_SQL
+
+ECHO_SQL = "SELECT $1::vector AS embedding"
+TEXT_ECHO_SQL = "SELECT $1::vector::text AS embedding"
+
+
+def to_text(embedding) -> str:
+    return f"[{','.join(map(str, embedding))}]"
+
+
+def per_query_us(elapsed: float, n: int) -> float:
+    return elapsed / n * 1e6
+
+
+def bench_client_codec(vectors) -> tuple[float, float]:
+    start = time.perf_counter()
+    for v in vectors:
+        json.loads(to_text(v))
+    t_text = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for v in vectors:
+        decode_vector(encode_vector(v))
+    t_binary = time.perf_counter() - start
+    return t_text, t_binary
+
+
+async def bench_text(dsn: str, vectors, search: bool) -> tuple[float, float]:
+    conn = await asyncpg.connect(dsn)
+    try:
+        start = time.perf_counter()
+        for v in vectors:
+            json.loads(await conn.fetchval(TEXT_ECHO_SQL, to_text(v)))
+        t_echo = time.perf_counter() - start
+
+        t_search = 0.0
+        if search:
+            start = time.perf_counter()
+            for v in vectors:
+                await conn.fetch(SEARCH_SQL, to_text(v), 5)
+            t_search = time.perf_counter() - start
+        return t_echo, t_search
+    finally:
+        await conn.close()
+
+
+async def bench_binary(dsn: str, vectors, search: bool) -> tuple[float, float]:
+    conn = await asyncpg.connect(dsn)
+    try:
+        await conn.set_type_codec("vector", schema="public", encoder=encode_vector, decoder=decode_vector, format="binary")
+        echo = await conn.prepare(ECHO_SQL)
+        start = time.perf_counter()
+        for v in vectors:
+            await echo.fetchval(v)
+        t_echo = time.perf_counter() - start
+
+        t_search = 0.0
+        if search:
+            statement = await conn.prepare(SEARCH_SQL)
+            start = time.perf_counter()
+            for v in vectors:
+                await statement.fetch(v, 5)
+            t_search = time.perf_counter() - start
+        return t_echo, t_search
+    finally:
+        await conn.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=768)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    matrix = rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+    # The text path starts from the Python float lists the embedding API returns
+    lists = matrix.tolist()
+
+    t_text, t_binary = bench_client_codec(lists)
+    print(f"{args.queries} queries, dim {args.dim} (microseconds per query)")
+    print(f"{'workload':>14} | {'text':>9} | {'binary':>9} | {'speedup':>7}")
+    print(f"{'client codec':>14} | {per_query_us(t_text, args.queries):>9.1f} | "
+          f"{per_query_us(t_binary, args.queries):>9.1f} | {t_text / t_binary:>6.1f}x")
+
+    load_dotenv()
+    dsn = os.getenv("DATABASE_URL")
+    if not dsn:
+        print("DATABASE_URL not set; skipping database round trips")
+        return
+
+    conn = await asyncpg.connect(dsn)
+    try:
+        search = args.dim == 768 \
+            and await conn.fetchval("SELECT to_regclass('experiences') IS NOT NULL") \
+            and await conn.fetchval("SELECT EXISTS (SELECT 1 FROM experiences)")
+    finally:
+        await conn.close()
+
+    text_echo, text_search = await bench_text(dsn, lists, search)
+    binary_echo, binary_search = await bench_binary(dsn, matrix, search)
+    print(f"{'echo':>14} | {per_query_us(text_echo, args.queries):>9.1f} | "
+          f"{per_query_us(binary_echo, args.queries):>9.1f} | {text_echo / binary_echo:>6.1f}x")
+    if search:
+        print(f"{'rag search':>14} | {per_query_us(text_search, args.queries):>9.1f} | "
+              f"{per_query_us(binary_search, args.queries):>9.1f} | {text_search / binary_search:>6.1f}x")
+    else:
+        print("experiences is empty (or --dim isn't 768); skipping the kNN workload")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
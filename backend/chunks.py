@@ -0,0 +1,133 @@
+import os
+import re
+from typing import Any, Dict, List
+
+from ai.tokens import count_tokens
+
+# Section-level passages: seeding splits each experience into chunks with their
+# own embeddings, and prompts carry only the best ones instead of whole files
+CHUNKS_ENABLED = os.getenv("CHUNKS_ENABLED", "true").lower() == "true"
+# Chunks above this size are split further at line boundaries
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "300"))
+# Total passage tokens across all retrieved experiences in one prompt
+RAG_PASSAGE_TOKEN_BUDGET = int(os.getenv("RAG_PASSAGE_TOKEN_BUDGET", "1500"))
+
+# "**Operational Excellence:**" labels a bullet group; Dates/Skills are metadata
+_LABEL_RE = re.compile(r"^\*\*(.+?):\*\*\s*(.*)$")
+_METADATA_LABELS = {"dates", "skills"}
+
+
+def _split_oversized(text: str) -> List[str]:
+    """Pack lines into parts of at most CHUNK_MAX_TOKENS (a single longer line stays whole)."""
+    if count_tokens(text) <= CHUNK_MAX_TOKENS:
+        return [text]
+    parts, current, size = [], [], 0
+    for line in text.split("\n"):
+        tokens = count_tokens(line)
+        if current and size + tokens > CHUNK_MAX_TOKENS:
+            parts.append("\n".join(current).strip())
+            current, size = [], 0
+        current.append(line)
+        size += tokens
+    parts.append("\n".join(current).strip())
+    return [part for part in parts if part]
+
+
+def chunk_markdown(item: Dict[str, Any]) -> List[Dict[str, str]]:
+    """
+    Split a parsed experience into passages on headings and bold-labelled
+    bullet groups. Headings inside fenced code blocks are ignored.
+
+    Args:
+        item: Parsed experience with 'content' (markdown body without the title)
+
+    Returns:
+        [{"heading": "Key Responsibilities / Food Safety", "content": ...}] in
+        document order; text before the first heading is the "Overview"
+    """
+    chunks = []
+    section, label = None, None
+    lines: List[str] = []
+    in_code = False
+
+    def flush():
+        text = "\n".join(lines).strip()
+        lines.clear()
+        if not text:
+            return
+        heading = " / ".join(part for part in (section, label) if part) or "Overview"
+        for part in _split_oversized(text):
+            chunks.append({"heading": heading, "content": part})
+
+    for line in item["content"].split("\n"):
+        stripped = line.strip()
+        if stripped.startswith("```"):
+            in_code = not in_code
+        elif not in_code:
+            if stripped.startswith("#"):
+                flush()
+                section, label = stripped.lstrip("#").strip(), None
+                continue
+            match = _LABEL_RE.match(stripped)
+            if match and match.group(1).lower() not in _METADATA_LABELS:
+                flush()
+                label = match.group(1)
+                if match.group(2):
+                    lines.append(match.group(2))
+                continue
+        lines.append(line)
+    flush()
+    return chunks
+
+
+def chunk_embedding_text(item: Dict[str, Any], chunk: Dict[str, str]) -> str:
+    """The text a chunk embedding is computed from; the title keeps passages attributable."""
+    return f"{item['title']}: {chunk['heading']}\n{chunk['content']}"
+
+
+def select_passages(
+    experience_ids: List[str],
+    chunks: List[Dict[str, Any]],
+    token_budget: int = RAG_PASSAGE_TOKEN_BUDGET
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Pick the passages most similar to the query under a token budget.
+
+    Each experience (in retrieval order) first gets its best passage, then the
+    remaining passages are added by similarity while they fit.
+
+    Args:
+        experience_ids: Retrieved experiences, best first
+        chunks: Chunk rows with experience_id, position, heading, content and similarity
+        token_budget: Maximum total tokens of the selected passages
+
+    Returns:
+        {experience_id: passages in document order} for every experience that
+        has chunks; the list is empty when none of its passages fit
+    """
+    by_experience: Dict[str, List[Dict[str, Any]]] = {}
+    for chunk in chunks:
+        by_experience.setdefault(chunk["experience_id"], []).append(chunk)
+    for candidates in by_experience.values():
+        candidates.sort(key=lambda c: c["similarity"], reverse=True)
+
+    selected = {experience_id: [] for experience_id in experience_ids if experience_id in by_experience}
+    used = 0
+
+    def take(chunk: Dict[str, Any]):
+        nonlocal used
+        cost = count_tokens(chunk["heading"]) + count_tokens(chunk["content"])
+        if used + cost <= token_budget:
+            used += cost
+            selected[chunk["experience_id"]].append(chunk)
+
+    for experience_id in selected:
+        take(by_experience[experience_id][0])
+    rest = [chunk for experience_id in selected for chunk in by_experience[experience_id][1:]]
+    for chunk in sorted(rest, key=lambda c: c["similarity"], reverse=True):
+        take(chunk)
+
+    return {
+        experience_id: sorted(passages, key=lambda c: c["position"])
+        for experience_id, passages in selected.items()
+    }
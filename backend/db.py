@@ -1,16 +1,58 @@
 import os
+import struct
+import logging
 import asyncpg
-from typing import Optional
+import numpy as np
+from typing import Dict, Optional, Sequence
+from asyncpg.prepared_stmt import PreparedStatement
+
+logger = logging.getLogger(__name__)
 
 POOL: Optional[asyncpg.Pool] = None
 
+# pgvector's binary wire format: uint16 dim, uint16 unused, dim big-endian float32
+_VECTOR_HEADER = struct.Struct(">HH")
+
+def encode_vector(value: Sequence[float]) -> bytes:
+    """Binary pgvector encoding of a float list or NumPy array."""
+    array = np.asarray(value, dtype=">f4")
+    return _VECTOR_HEADER.pack(len(array), 0) + array.tobytes()
+
+def decode_vector(data: bytes) -> np.ndarray:
+    """Decode a binary pgvector value into a native float32 NumPy array."""
+    dim, _ = _VECTOR_HEADER.unpack_from(data)
+    return np.frombuffer(data, dtype=">f4", count=dim, offset=_VECTOR_HEADER.size).astype(np.float32)
+
+class Connection(asyncpg.Connection):
+    """asyncpg connection that keeps explicitly prepared hot statements for its lifetime."""
+
+    async def prepared(self, query: str) -> PreparedStatement:
+        """Prepare query once per connection and reuse it on every later call."""
+        statements: Dict[str, PreparedStatement] = self.__dict__.setdefault("_hot_statements", {})
+        statement = statements.get(query)
+        if statement is None:
+            statement = statements[query] = await self.prepare(query)
+        return statement
+
+async def _init_connection(conn: asyncpg.Connection):
+    """Send and receive vector columns as binary float32 instead of text literals."""
+    try:
+        await conn.set_type_codec(
+            "vector", schema="public", encoder=encode_vector, decoder=decode_vector, format="binary"
+        )
+    except ValueError:
+        # The extension doesn't exist yet; init_db creates it and recycles connections
+        logger.info("[DB] vector type not found, connection opened without the binary vector codec")
+
 async def get_db_pool():
     global POOL
     if POOL is None:
         POOL = await asyncpg.create_pool(
             dsn=os.getenv("DATABASE_URL"),
             min_size=1,
-            max_size=10
+            max_size=10,
+            init=_init_connection,
+            connection_class=Connection
         )
     return POOL
 
@@ -24,6 +66,8 @@ async def init_db():
     async with pool.acquire() as conn:
         # Enable pgvector extension
         await conn.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+        # Connections opened before the extension existed lack the vector codec
+        await pool.expire_connections()
         
         # Create experiences table
         await conn.execute("""
@@ -66,3 +110,114 @@ async def init_db():
             ON experiences(content_hash);
         """)
 
+        # Section-level passages of each experience, embedded individually
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS experience_chunks (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                experience_id UUID NOT NULL REFERENCES experiences(id) ON DELETE CASCADE,
+                position INTEGER NOT NULL,
+                heading TEXT NOT NULL,
+                content TEXT NOT NULL,
+                embedding vector(768) NOT NULL,
+                embedding_key TEXT NOT NULL
+            );
+        """)
+
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_experience_chunks_experience_id
+            ON experience_chunks(experience_id);
+        """)
+
+        # Weighted full-text document for hybrid retrieval: title and skills
+        # outrank body text. Wrapped in an IMMUTABLE function because
+        # array_to_string isn't, and generated columns require it.
+        await conn.execute("""
+            CREATE OR REPLACE FUNCTION experience_search_document(title TEXT, content TEXT, skills TEXT[])
+            RETURNS tsvector LANGUAGE sql IMMUTABLE AS $$
+                SELECT setweight(to_tsvector('english', coalesce(title, '')), 'A')
+                    || setweight(to_tsvector('english', coalesce(array_to_string(skills, ' '), '')), 'A')
+                    || setweight(to_tsvector('english', coalesce(content, '')), 'B')
+            $$;
+        """)
+
+        await conn.execute("""
+            ALTER TABLE experiences ADD COLUMN IF NOT EXISTS search_tsv tsvector
+            GENERATED ALWAYS AS (experience_search_document(title, content, skills)) STORED;
+        """)
+
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_experiences_search_tsv
+            ON experiences USING gin(search_tsv);
+        """)
+
+        # Hash of the embedded text, referencing document_embeddings
+        await conn.execute("""
+            ALTER TABLE experiences ADD COLUMN IF NOT EXISTS embedding_key TEXT;
+        """)
+
+        # Document embeddings keyed by content, kept across reseeds and rebuilds
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS document_embeddings (
+                embedding_key TEXT NOT NULL,
+                model TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                embedding vector(768) NOT NULL,
+                created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+                last_used TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+                PRIMARY KEY (embedding_key, model, dim)
+            );
+        """)
+
+        # Persistent tier of the query embedding cache, shared by all workers
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS query_embedding_cache (
+                cache_key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                task_type TEXT NOT NULL,
+                embedding vector(768) NOT NULL,
+                created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+                last_used TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+            );
+        """)
+
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_query_embedding_cache_last_used
+            ON query_embedding_cache(last_used);
+        """)
+
+        # Version of the prebuilt corpus snapshot the experiences rows were last synced from
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS corpus_snapshot (
+                id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+                version TEXT NOT NULL,
+                applied_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+            );
+        """)
+
+        # Pre-generated initial_load blocks for common visitor archetypes
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS archetype_blocks (
+                archetype TEXT PRIMARY KEY,
+                corpus_version TEXT NOT NULL,
+                embedding vector(768) NOT NULL,
+                html TEXT NOT NULL,
+                block_summary TEXT NOT NULL,
+                experience_ids TEXT[] NOT NULL,
+                buttons JSONB NOT NULL,
+                created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+            );
+        """)
+
+        # Persistent tier of the visitor session store (SESSION_PERSISTENT, on by default)
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS visitor_sessions (
+                session_id TEXT PRIMARY KEY,
+                state JSONB NOT NULL,
+                updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+            );
+        """)
+
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_visitor_sessions_updated_at
+            ON visitor_sessions(updated_at);
+        """)
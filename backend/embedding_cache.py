@@ -0,0 +1,202 @@
+import os
+import re
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from db import get_db_pool
+from ai.llm import EMBEDDING_MODEL
+from ai.embeddings import embedding_batcher
+from ai.resilience import Deadline
+from vector_index import EMBEDDING_DIM
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "1024"))
+EMBEDDING_CACHE_TTL_SECONDS = float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+EMBEDDING_CACHE_PERSISTENT = os.getenv("EMBEDDING_CACHE_PERSISTENT", "true").lower() == "true"
+# Row cap for the Postgres tier; least recently used rows beyond it are pruned
+EMBEDDING_CACHE_DB_MAX_ROWS = int(os.getenv("EMBEDDING_CACHE_DB_MAX_ROWS", "50000"))
+# A lookup slower than this isn't worth waiting for, the API call is about as fast
+EMBEDDING_CACHE_DB_TIMEOUT_SECONDS = float(os.getenv("EMBEDDING_CACHE_DB_TIMEOUT_SECONDS", "0.5"))
+EMBEDDING_CACHE_PRUNE_EVERY = 100
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace and case so trivially different queries share an entry."""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def cache_key(text: str, task_type: str) -> str:
+    """Key on everything that changes the embedding: model, task type, dimensionality and text."""
+    raw = f"{EMBEDDING_MODEL}|{task_type}|{EMBEDDING_DIM}|{normalize_text(text)}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache for query embeddings.
+
+    The first tier is a bounded in-process LRU. The second is a Postgres table
+    that survives restarts and is shared by every worker; hits there are
+    promoted into the LRU. Both tiers expire entries after ttl_seconds.
+    Postgres errors are logged and treated as misses so the cache can never
+    fail a request.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = EMBEDDING_CACHE_TTL_SECONDS,
+        persistent: bool = EMBEDDING_CACHE_PERSISTENT,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persistent = persistent
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[List[float], float]]" = OrderedDict()
+        self._writes: Set[asyncio.Task] = set()
+        self._puts_since_prune = 0
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.db_errors = 0
+
+    def clear(self):
+        self._entries.clear()
+
+    def _get_memory(self, key: str) -> Optional[List[float]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        embedding, stored_at = entry
+        if self._clock() - stored_at > self.ttl_seconds:
+            del self._entries[key]
+            self.evictions += 1
+            return None
+        self._entries.move_to_end(key)
+        return embedding
+
+    def _put_memory(self, key: str, embedding: List[float]):
+        self._entries[key] = (embedding, self._clock())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def _get_db(self, key: str, deadline: Optional[Deadline]) -> Optional[List[float]]:
+        timeout = EMBEDDING_CACHE_DB_TIMEOUT_SECONDS
+        if deadline:
+            timeout = min(timeout, deadline.remaining())
+        try:
+            pool = await get_db_pool()
+            async with pool.acquire(timeout=timeout) as conn:
+                # Touch last_used in the same round trip so LRU pruning sees the hit
+                row = await conn.fetchval("""
+                    UPDATE query_embedding_cache
+                    SET last_used = NOW()
+                    WHERE cache_key = $1
+                    AND created_at > NOW() - make_interval(secs => $2)
+                    RETURNING embedding
+                """, key, self.ttl_seconds, timeout=timeout)
+            return row.tolist() if row is not None else None
+        except Exception as e:
+            self.db_errors += 1
+            logger.warning(f"[EMBED CACHE] Postgres lookup failed: {e}")
+            return None
+
+    async def _put_db(self, key: str, task_type: str, embedding: List[float]):
+        try:
+            pool = await get_db_pool()
+            async with pool.acquire() as conn:
+                await conn.execute("""
+                    INSERT INTO query_embedding_cache (cache_key, model, task_type, embedding)
+                    VALUES ($1, $2, $3, $4)
+                    ON CONFLICT (cache_key) DO UPDATE
+                    SET embedding = EXCLUDED.embedding, created_at = NOW(), last_used = NOW()
+                """, key, EMBEDDING_MODEL, task_type, embedding)
+
+                self._puts_since_prune += 1
+                if self._puts_since_prune >= EMBEDDING_CACHE_PRUNE_EVERY:
+                    self._puts_since_prune = 0
+                    await self._prune(conn)
+        except Exception as e:
+            self.db_errors += 1
+            logger.warning(f"[EMBED CACHE] Postgres write failed: {e}")
+
+    async def _prune(self, conn):
+        """Drop expired rows and the least recently used rows beyond the row cap."""
+        await conn.execute("""
+            DELETE FROM query_embedding_cache
+            WHERE created_at <= NOW() - make_interval(secs => $1)
+        """, self.ttl_seconds)
+        await conn.execute("""
+            DELETE FROM query_embedding_cache
+            WHERE cache_key IN (
+                SELECT cache_key FROM query_embedding_cache
+                ORDER BY last_used DESC
+                OFFSET $1
+            )
+        """, EMBEDDING_CACHE_DB_MAX_ROWS)
+
+    async def get(self, text: str, task_type: str, deadline: Optional[Deadline] = None) -> Optional[List[float]]:
+        """
+        Look up an embedding, checking memory first and then Postgres.
+
+        Returns:
+            The cached embedding, or None on a miss
+        """
+        key = cache_key(text, task_type)
+        embedding = self._get_memory(key)
+        if embedding is not None:
+            self.memory_hits += 1
+            return embedding
+
+        if self.persistent:
+            embedding = await self._get_db(key, deadline)
+            if embedding is not None:
+                self.db_hits += 1
+                self._put_memory(key, embedding)
+                return embedding
+
+        self.misses += 1
+        return None
+
+    def put(self, text: str, task_type: str, embedding: List[float]):
+        """Store an embedding; the Postgres write happens in the background, off the request path."""
+        key = cache_key(text, task_type)
+        self._put_memory(key, embedding)
+        if self.persistent:
+            task = asyncio.get_running_loop().create_task(self._put_db(key, task_type, embedding))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.db_hits) / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "db_errors": self.db_errors
+        }
+
+
+# Global query embedding cache instance
+embedding_cache = EmbeddingCache()
+
+
+async def get_or_embed(text: str, task_type: str = "retrieval_query", deadline: Optional[Deadline] = None) -> List[float]:
+    """Embed a query through the cache, sharing provider calls via the micro-batcher on a miss."""
+    embedding = await embedding_cache.get(text, task_type, deadline)
+    if embedding is None:
+        embedding = await embedding_batcher.embed(text, task_type=task_type, deadline=deadline)
+        embedding_cache.put(text, task_type, embedding)
+    return embedding
@@ -2,42 +2,95 @@ import os
 import json
 import logging
 import re
+from typing import Optional
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, StreamingResponse
 from pydantic import ValidationError
 
 from contextlib import asynccontextmanager
 
 from db import init_db, close_db_pool
-from ai.generation import generation_handler
-from models import ChatRequest, ChatResponse, GenerateBlockRequest, GenerateBlockResponse, GenerateButtonsRequest, GenerateButtonsResponse, SuggestedButton, CompressedContext
+from ai.generation import generation_handler, DEFAULT_BUTTONS
+from ai.llm import llm_handler
+from ai.embeddings import embedding_batcher
+from ai.speculation import speculation_engine
+from ai.summaries import summary_store, DEFER_BLOCK_SUMMARIES, SUMMARY_WAIT_SECONDS
+from ai.block_cache import block_cache
+from ai.archetypes import archetype_cache, is_initial_load
+from ai.context import context_packer
+from ai.prompt_assembly import prompt_assembler
+from ai.resilience import Deadline, DeadlineExceeded
+from vector_index import vector_index
+from embedding_cache import embedding_cache
+from sessions import Session, session_store
+from watcher import DataWatcher, DATA_WATCHER_ENABLED
+from startup import StartupPhase, startup_supervisor
+from ai.streaming import format_sse
+from models import ChatRequest, ChatResponse, GenerateBlockRequest, GenerateBlockAndButtonsRequest, GenerateBlockResponse, GenerateButtonsRequest, GenerateButtonsResponse, SuggestedButton, CompressedContext
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# End-to-end latency budgets per endpoint (seconds)
+CHAT_DEADLINE_SECONDS = float(os.getenv("CHAT_DEADLINE_SECONDS", "35"))
+BLOCK_DEADLINE_SECONDS = float(os.getenv("BLOCK_DEADLINE_SECONDS", "40"))
+BUTTONS_DEADLINE_SECONDS = float(os.getenv("BUTTONS_DEADLINE_SECONDS", "15"))
+
+# Hot re-indexing of data/ while the app runs; created at startup
+data_watcher: Optional[DataWatcher] = None
+
+async def _load_snapshot():
+    from snapshot import boot_from_snapshot
+    return await boot_from_snapshot()
+
+async def _load_vector_index():
+    if not vector_index.loaded:
+        await vector_index.refresh()
+
+async def _seed():
+    from seed import seed_data
+    snapshot = startup_supervisor.results.get("snapshot")
+    if snapshot and snapshot["current"]:
+        # Postgres and the index already match the baked-in snapshot of data/
+        return {"skipped": "snapshot current"}
+    return await seed_data()
+
+async def _start_background_services():
+    global data_watcher
+    # Pre-generate initial blocks for common visitor archetypes in the background
+    archetype_cache.start()
+
+    if DATA_WATCHER_ENABLED:
+        from seed import resolve_data_dir, seed_paths
+        data_watcher = DataWatcher(resolve_data_dir(), seed_paths)
+        data_watcher.start()
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup
-    logger.info("Initializing database...")
-    await init_db()
-
-    logger.info("Running automatic incremental seed...")
-    try:
-        from seed import seed_data
-        await seed_data()
-        logger.info("Seed completed successfully")
-    except Exception as e:
-        logger.error(f"Seed failed: {e}", exc_info=True)
-        # Don't crash the app - allow it to start with existing data
-        logger.warning("App starting with existing data (seed failed)")
+    # Startup runs in the background so health checks and the frontend are
+    # served immediately; /api/ready reports progress. Retrieval serves existing
+    # rows (indexed before seeding) while the seed catches up. A prebuilt corpus
+    # snapshot, when present, is memory-mapped and replaces seeding entirely.
+    startup_supervisor.start([
+        StartupPhase("init_db", init_db, required=True, marks_ready=True),
+        StartupPhase("snapshot", _load_snapshot),
+        StartupPhase("vector_index", _load_vector_index),
+        StartupPhase("seed", _seed),
+        StartupPhase("services", _start_background_services),
+    ])
 
     yield
 
     # Shutdown
+    await startup_supervisor.stop()
+    if data_watcher:
+        await data_watcher.stop()
+    await archetype_cache.stop()
     logger.info("Closing database pool...")
     await close_db_pool()
+    await llm_handler.aclose()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -52,11 +105,82 @@ async def read_root():
 async def health_check():
     return {"status": "ok"}
 
+@app.get("/api/ready")
+async def readiness_check():
+    """Readiness probe: 200 once the database is usable, 503 before; includes startup progress."""
+    status = startup_supervisor.get_status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+@app.get("/api/metrics")
+async def metrics():
+    return {
+        "hedging": llm_handler.get_hedge_stats(),
+        "embedding_batches": embedding_batcher.get_stats(),
+        "embedding_cache": embedding_cache.get_stats(),
+        "speculation": speculation_engine.get_stats(),
+        "deferred_summaries": summary_store.get_stats(),
+        "block_cache": block_cache.get_stats(),
+        "archetypes": archetype_cache.get_stats(),
+        "context": context_packer.get_stats(),
+        "prompt_cache": prompt_assembler.get_stats(),
+        "sessions": session_store.get_stats(),
+        "data_watcher": data_watcher.get_stats() if data_watcher else None,
+        **llm_handler.get_breaker_stats()
+    }
+
+async def _load_session(session_id: Optional[str]) -> Optional[Session]:
+    if not session_id:
+        return None
+    session = await session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    return session
+
+async def _attach_session(request, require_summary: bool = True) -> Optional[Session]:
+    """Fill in the state a delta request leaves out (visitor summary, context, chat history) from its session."""
+    session = await _load_session(request.session_id)
+    if session:
+        request.visitor_summary = request.visitor_summary or session.visitor_summary
+        request.context = session.context
+        if isinstance(request, GenerateBlockRequest) and request.action_type == "user_question" \
+                and request.action_value and not request.regenerate:
+            session.add_message("user", request.action_value)
+        if hasattr(request, "chat_history"):
+            request.chat_history = session.history
+    if require_summary and not request.visitor_summary:
+        raise HTTPException(status_code=422, detail="visitor_summary or session_id is required")
+    return session
+
+async def _resolve_context(request, session: Optional[Session], deadline: Deadline):
+    """Swap deferred summary IDs in the request context for the summaries themselves."""
+    context = request.context
+    request.context = await summary_store.resolve_context(
+        context, min(SUMMARY_WAIT_SECONDS, deadline.remaining())
+    )
+    # Drop the folded IDs from the session, unless another request recorded a block meanwhile
+    if session and session.context is context:
+        session.context = request.context
+
+def _record_block(session: Optional[Session], result: dict):
+    """Fold a served block into the session context, as the frontend's context tracker used to."""
+    if session:
+        session.record_block(result.get("experience_ids", []), result.get("block_summary"), result.get("block_id"))
+        session_store.save(session)
+
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
+    deadline = Deadline(CHAT_DEADLINE_SECONDS)
+    session = await _load_session(request.session_id)
     try:
         user_msg = request.message or ""
-        history = request.history or []
+        if session is None:
+            session = session_store.create()
+            # Legacy clients send the full history, already including this message
+            session.history = list(request.history or [])
+        elif user_msg:
+            session.add_message("user", user_msg)
+        # Same history the frontend used to re-send on every turn
+        history = session.history
 
         # Calculate user turns
         user_turns = sum(1 for msg in history if msg.get("role") == "user")
@@ -65,66 +189,223 @@ async def chat(request: ChatRequest):
 
         # Handle initial greeting
         if not history and not user_msg:
-            return ChatResponse(
-                ready=False,
-                message="Heya! I'm Astra, Bear's personal assistant. I'll be here to answer any questions you may have. To get started, could you tell me a bit about who you are (e.g., recruiter, engineer) and what you're looking for?"
-            )
+            greeting = "Heya! I'm Astra, Bear's personal assistant. I'll be here to answer any questions you may have. To get started, could you tell me a bit about who you are (e.g., recruiter, engineer) and what you're looking for?"
+            session.add_message("assistant", greeting)
+            session_store.save(session)
+            return ChatResponse(ready=False, message=greeting, session_id=session.session_id)
 
         # Generate response using GenerationHandler
         result = await generation_handler.generate_chat_response(
             message=user_msg,
             history=history,
-            user_turns=user_turns
+            user_turns=user_turns,
+            deadline=deadline
         )
 
+        if result.get("message"):
+            session.add_message("assistant", result["message"])
+        if result["ready"]:
+            session.visitor_summary = result.get("visitor_summary")
+        session_store.save(session)
+
         return ChatResponse(
             ready=result["ready"],
             visitor_summary=result.get("visitor_summary"),
-            message=result.get("message")
+            message=result.get("message"),
+            session_id=session.session_id
         )
 
+    except DeadlineExceeded as e:
+        logger.error(f"Chat deadline exceeded: {e}")
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Chat error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/generate-block", response_model=GenerateBlockResponse)
 async def generate_block(request: GenerateBlockRequest):
+    deadline = Deadline(BLOCK_DEADLINE_SECONDS)
+    session = await _attach_session(request)
     try:
-        # Generate block using GenerationHandler
-        result = await generation_handler.generate_block(
-            visitor_summary=request.visitor_summary,
-            action_type=request.action_type or "initial_load",
-            action_value=request.action_value or request.visitor_summary,
-            context=request.context
-        )
+        await _resolve_context(request, session, deadline)
+
+        # Serve a speculatively pre-generated block when the request matches a suggestion
+        result = None
+        if is_initial_load(request.action_type, request.context, request.regenerate):
+            result = await archetype_cache.match(request.visitor_summary, deadline)
+        elif not request.regenerate:
+            result = await speculation_engine.take(
+                request.visitor_summary, request.action_value, request.context, deadline, request.session_id
+            )
+
+        if result is None:
+            # Generate block using GenerationHandler
+            result = await generation_handler.generate_block(
+                visitor_summary=request.visitor_summary,
+                action_type=request.action_type or "initial_load",
+                action_value=request.action_value or request.visitor_summary,
+                context=request.context,
+                deadline=deadline,
+                defer_summary=DEFER_BLOCK_SUMMARIES,
+                use_cache=not request.regenerate
+            )
+        _record_block(session, result)
 
         return GenerateBlockResponse(
             html=result["html"],
             block_summary=result["block_summary"],
-            experience_ids=result["experience_ids"]
+            experience_ids=result["experience_ids"],
+            block_id=result.get("block_id")
         )
 
+    except DeadlineExceeded as e:
+        logger.error(f"Block generation deadline exceeded: {e}")
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Block generation error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/generate-block/stream")
+async def generate_block_stream(request: GenerateBlockRequest):
+    """
+    Server-Sent Events variant of /api/generate-block.
+
+    Emits 'html' events with HTML fragments as the model produces them, then
+    'experience_ids' and 'block_summary', and finally 'done' (or 'error').
+    """
+    deadline = Deadline(BLOCK_DEADLINE_SECONDS)
+    session = await _attach_session(request)
+
+    async def event_stream():
+        try:
+            await _resolve_context(request, session, deadline)
+
+            prepared = None
+            if is_initial_load(request.action_type, request.context, request.regenerate):
+                prepared = await archetype_cache.match(request.visitor_summary, deadline)
+            elif not request.regenerate:
+                prepared = await speculation_engine.take(
+                    request.visitor_summary, request.action_value, request.context, deadline, request.session_id
+                )
+
+            results = {}
+            if prepared:
+                for event in ("html", "experience_ids", "block_summary"):
+                    results[event] = prepared[event]
+                    yield format_sse(event, prepared[event])
+            else:
+                async for event, data in generation_handler.stream_block(
+                    visitor_summary=request.visitor_summary,
+                    action_type=request.action_type or "initial_load",
+                    action_value=request.action_value or request.visitor_summary,
+                    context=request.context,
+                    deadline=deadline,
+                    use_cache=not request.regenerate
+                ):
+                    if event != "html":
+                        results[event] = data
+                    yield format_sse(event, data)
+            _record_block(session, results)
+            yield format_sse("done", {})
+        except Exception as e:
+            logger.error(f"Block stream error: {e}")
+            yield format_sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/generate-block-and-buttons/stream")
+async def generate_block_and_buttons_stream(request: GenerateBlockAndButtonsRequest):
+    """
+    Combined block + buttons stream sharing a single retrieval.
+
+    Emits the same events as /api/generate-block/stream plus one 'buttons'
+    event, sent as soon as button generation (which runs concurrently with the
+    block) completes.
+    """
+    deadline = Deadline(BLOCK_DEADLINE_SECONDS)
+    buttons_deadline = Deadline.within(BUTTONS_DEADLINE_SECONDS, deadline)
+    session = await _attach_session(request)
+
+    async def event_stream():
+        try:
+            await _resolve_context(request, session, deadline)
+
+            prepared = None
+            if is_initial_load(request.action_type, request.context, request.regenerate):
+                prepared = await archetype_cache.match(request.visitor_summary, deadline)
+            elif not request.regenerate:
+                prepared = await speculation_engine.take(
+                    request.visitor_summary, request.action_value, request.context, deadline, request.session_id
+                )
+
+            if prepared:
+                events = generation_handler.replay_block_and_buttons(
+                    prepared, request.visitor_summary, request.context, request.chat_history, buttons_deadline
+                )
+            else:
+                events = generation_handler.stream_block_and_buttons(
+                    visitor_summary=request.visitor_summary,
+                    action_type=request.action_type or "initial_load",
+                    action_value=request.action_value or request.visitor_summary,
+                    context=request.context,
+                    chat_history=request.chat_history,
+                    deadline=deadline,
+                    buttons_deadline=buttons_deadline,
+                    use_cache=not request.regenerate
+                )
+
+            results = {}
+            async for event, data in events:
+                if event != "html":
+                    results[event] = data
+                yield format_sse(event, data)
+            _record_block(session, results)
+            yield format_sse("done", {})
+
+            # Pre-generate the blocks behind the buttons just shown
+            speculation_engine.schedule_after_block(
+                request.visitor_summary,
+                request.context,
+                results.get("block_summary"),
+                results.get("experience_ids", []),
+                results.get("buttons", []),
+                request.session_id
+            )
+        except Exception as e:
+            logger.error(f"Block and buttons stream error: {e}")
+            yield format_sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/api/generate-buttons", response_model=GenerateButtonsResponse)
 async def generate_buttons(request: GenerateButtonsRequest):
+    deadline = Deadline(BUTTONS_DEADLINE_SECONDS)
+    session = await _attach_session(request, require_summary=False)
     try:
+        await _resolve_context(request, session, deadline)
+
         # Generate buttons using GenerationHandler
         buttons = await generation_handler.generate_buttons(
             visitor_summary=request.visitor_summary,
             chat_history=request.chat_history,
-            context=request.context
+            context=request.context,
+            deadline=deadline
         )
 
+        # The latest block is already folded into this context
+        speculation_engine.schedule(request.visitor_summary, request.context, buttons, request.session_id)
+
         return GenerateButtonsResponse(buttons=buttons)
 
     except Exception as e:
         logger.error(f"Button generation error: {e}")
         # Fallback buttons on any error
-        return GenerateButtonsResponse(buttons=[
-            SuggestedButton(label="Experience", prompt="Tell me about your professional experience"),
-            SuggestedButton(label="Skills", prompt="What are your key technical skills?"),
-            SuggestedButton(label="Projects", prompt="Show me some of your notable projects")
-        ])
\ No newline at end of file
+        return GenerateButtonsResponse(buttons=DEFAULT_BUTTONS)
\ No newline at end of file
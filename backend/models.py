@@ -12,19 +12,28 @@ class Experience(BaseModel):
 class ChatRequest(BaseModel):
     message: Optional[str] = None 
     visitor_context: Optional[Dict[str, Any]] = None
+    # Server-side session issued by a previous /api/chat response; replaces history
+    session_id: Optional[str] = None
     history: List[Dict[str, str]] = [] 
 
 class ChatResponse(BaseModel):
     ready: bool
     visitor_summary: Optional[str] = None
     message: Optional[str] = None
+    session_id: Optional[str] = None
 
 class CompressedContext(BaseModel):
     block_summaries: List[str] = []
     shown_experience_counts: Dict[str, int] = {}
+    # Blocks returned before their summary was ready; resolved server-side by ID
+    pending_block_ids: List[str] = []
+    # Index in block_summaries each pending block was shown at (the end when omitted)
+    pending_block_positions: List[int] = []
 
 class GenerateBlockRequest(BaseModel):
-    visitor_summary: str
+    # With a session_id, visitor_summary and context are taken from the session
+    session_id: Optional[str] = None
+    visitor_summary: Optional[str] = None
     context: Optional[CompressedContext] = None 
     action_type: Optional[str] = None
     action_value: Optional[str] = None
@@ -33,10 +42,15 @@ class GenerateBlockRequest(BaseModel):
     # Keep for backward compatibility 
     previous_block_summary: Optional[str] = None
 
+class GenerateBlockAndButtonsRequest(GenerateBlockRequest):
+    chat_history: List[Dict[str, str]] = []
+
 class GenerateBlockResponse(BaseModel):
     html: str
-    block_summary: str
+    block_summary: Optional[str] = None
     experience_ids: List[str] = []
+    # Set instead of block_summary when the summary is deferred
+    block_id: Optional[str] = None
 
 class SuggestedButton(BaseModel):
     label: str
@@ -51,6 +65,7 @@ class ButtonList(BaseModel):
     buttons: List[SuggestedButton]
 
 class GenerateButtonsRequest(BaseModel):
+    session_id: Optional[str] = None
     visitor_summary: Optional[str] = None
     chat_history: List[Dict[str, str]] = []
     context: Optional[CompressedContext] = None
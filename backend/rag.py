@@ -1,16 +1,109 @@
+import os
 import json
 import logging
+import numpy as np
 from db import get_db_pool
-from ai.llm import llm_handler
+from embedding_cache import get_or_embed
+from ai.resilience import Deadline
+from vector_index import vector_index
+from chunks import CHUNKS_ENABLED, RAG_PASSAGE_TOKEN_BUDGET, select_passages
 from typing import List, Dict, Any, Optional
 
 logger = logging.getLogger(__name__)
 
+# "hybrid" fuses full-text and vector rankings; "vector" is cosine only. Both
+# take the cosine ranking from the in-process index when it's loaded
+RAG_RETRIEVAL_MODE = os.getenv("RAG_RETRIEVAL_MODE", "hybrid").lower()
+# Candidates each ranker contributes before fusion
+RAG_HYBRID_CANDIDATES = int(os.getenv("RAG_HYBRID_CANDIDATES", "20"))
+# Experiences retrieved into each generation prompt; hybrid ranking puts exact
+# skill matches on top, so fewer results are needed than with cosine alone
+RAG_RESULT_LIMIT = int(os.getenv("RAG_RESULT_LIMIT", "4" if RAG_RETRIEVAL_MODE == "hybrid" else "5"))
+# Reciprocal-rank fusion constant: score = sum(1 / (k + rank)) over rankers
+RAG_RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+
+# Hot kNN query, prepared once per pooled connection
+SEARCH_SQL = """
+    SELECT id, title, content, skills, metadata,
+           1 - (embedding <=> $1) as similarity
+    FROM experiences
+    ORDER BY embedding <=> $1
+    LIMIT $2
+"""
+
+# Passages of the retrieved experiences, scored against the query
+PASSAGES_SQL = """
+    SELECT experience_id, position, heading, content,
+           1 - (embedding <=> $1) as similarity
+    FROM experience_chunks
+    WHERE experience_id = ANY($2::uuid[])
+"""
+
+# Lexical and vector candidates fused with reciprocal-rank fusion in one round
+# trip. plainto_tsquery ANDs every term; rewriting it to OR lets a single exact
+# skill name in a longer question match. ts_rank_cd with length normalization
+# stands in for BM25, which Postgres doesn't ship.
+HYBRID_SEARCH_SQL = """
+    WITH semantic AS (
+        SELECT id, ROW_NUMBER() OVER (ORDER BY embedding <=> $1) AS rank
+        FROM experiences
+        ORDER BY embedding <=> $1
+        LIMIT $3
+    ),
+    lexical AS (
+        SELECT id, ROW_NUMBER() OVER (ORDER BY ts_rank_cd(search_tsv, query, 1) DESC) AS rank
+        FROM experiences,
+             replace(plainto_tsquery('english', $2)::text, '&', '|')::tsquery AS query
+        WHERE search_tsv @@ query
+        ORDER BY ts_rank_cd(search_tsv, query, 1) DESC
+        LIMIT $3
+    ),
+    fused AS (
+        SELECT COALESCE(s.id, l.id) AS id,
+               COALESCE(1.0 / ($4 + s.rank), 0) + COALESCE(1.0 / ($4 + l.rank), 0) AS score
+        FROM semantic s
+        FULL OUTER JOIN lexical l ON s.id = l.id
+    )
+    SELECT e.id, e.title, e.content, e.skills, e.metadata,
+           1 - (e.embedding <=> $1) AS similarity, f.score
+    FROM fused f
+    JOIN experiences e ON e.id = f.id
+    ORDER BY f.score DESC
+    LIMIT $5
+"""
+
+# Lexical leg of hybrid search when the cosine ranking comes from the in-process index
+LEXICAL_SEARCH_SQL = """
+    SELECT id
+    FROM experiences,
+         replace(plainto_tsquery('english', $1)::text, '&', '|')::tsquery AS query
+    WHERE search_tsv @@ query
+    ORDER BY ts_rank_cd(search_tsv, query, 1) DESC
+    LIMIT $2
+"""
+
+def rrf_fuse(rankings: List[List[str]], k: int = RAG_RRF_K) -> Dict[str, float]:
+    """
+    Reciprocal-rank fusion, as in HYBRID_SEARCH_SQL.
+
+    Args:
+        rankings: Experience IDs per ranker, best first
+
+    Returns:
+        {experience_id: sum of 1 / (k + rank) over the rankers that returned it}
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, experience_id in enumerate(ranking, start=1):
+            scores[experience_id] = scores.get(experience_id, 0.0) + 1.0 / (k + rank)
+    return scores
+
 def apply_diversity_scoring(
     results: List[Dict[str, Any]],
     shown_counts: Dict[str, int],
     penalty_per_showing: float = 0.4,
-    max_penalty: float = 0.9
+    max_penalty: float = 0.9,
+    score_key: str = "similarity"
 ) -> List[Dict[str, Any]]:
     """
     Apply cumulative diversity penalty to previously shown experiences.
@@ -20,6 +113,7 @@ def apply_diversity_scoring(
         shown_counts: Dict of experience IDs to show counts
         penalty_per_showing: Penalty factor per showing (0.4 = 40% per showing)
         max_penalty: Maximum penalty cap (0.9 = 90% max reduction)
+        score_key: Result field to penalize and rank by ('score' for hybrid results)
 
     Returns:
         Re-ranked results
@@ -29,64 +123,197 @@ def apply_diversity_scoring(
         if exp_id in shown_counts:
             count = shown_counts[exp_id]
             penalty = min(penalty_per_showing * count, max_penalty)
-            original_score = result['similarity']
-            result['similarity'] *= (1 - penalty)
-            logger.info(f"[DIVERSITY] Penalized '{result['title']}' (shown {count}x): {original_score:.3f} -> {result['similarity']:.3f}")
+            original_score = result[score_key]
+            result[score_key] *= (1 - penalty)
+            logger.info(f"[DIVERSITY] Penalized '{result['title']}' (shown {count}x): {original_score:.3f} -> {result[score_key]:.3f}")
 
-    # Re-sort by adjusted similarity
-    results.sort(key=lambda x: x['similarity'], reverse=True)
+    # Re-sort by adjusted score
+    results.sort(key=lambda x: x[score_key], reverse=True)
     return results
 
 async def search_similar_experiences(
     query: str,
     limit: int = 5,
-    shown_counts: Optional[Dict[str, int]] = None
+    shown_counts: Optional[Dict[str, int]] = None,
+    deadline: Optional[Deadline] = None
 ) -> List[Dict[str, Any]]:
-    """Search with optional diversity scoring"""
-    pool = await get_db_pool()
-
+    """Search with optional diversity scoring, bounded by an optional deadline"""
     shown_count = sum(shown_counts.values()) if shown_counts else 0
     logger.info(f"[RAG Search] Query: '{query}', Shown counts: {shown_count}")
-    query_embedding = await llm_handler.generate_embedding(query, task_type="retrieval_query")
-
-    # Format embedding for pgvector
-    embedding_str = f"[{','.join(map(str, query_embedding))}]"
-
-    async with pool.acquire() as conn:
-        # Fetch more results than needed for better diversity (fetch 2x limit)
-        fetch_limit = limit * 2 if shown_counts else limit
-
-        rows = await conn.fetch("""
-            SELECT id, title, content, skills, metadata, 
-                   1 - (embedding <=> $1) as similarity
-            FROM experiences
-            ORDER BY embedding <=> $1
-            LIMIT $2
-        """, embedding_str, fetch_limit)
-        
-        results = []
-        for row in rows:
-            results.append({
-                "id": str(row["id"]),
-                "title": row["title"],
-                "content": row["content"],
-                "skills": row["skills"],
-                "metadata": json.loads(row["metadata"]) if isinstance(row["metadata"], str) else row["metadata"],
-                "similarity": row["similarity"]
-            })
-            
-        # Apply diversity scoring if shown_counts provided
-        if shown_counts:
-            results = apply_diversity_scoring(results, shown_counts)
-
-        # Return requested limit after re-ranking
-        return results[:limit]
+    query_embedding = await get_or_embed(query, "retrieval_query", deadline)
+
+    # Fetch more results than needed for better diversity (fetch 2x limit)
+    fetch_limit = limit * 2 if shown_counts else limit
+
+    if RAG_RETRIEVAL_MODE == "hybrid":
+        # Cosine leg from the in-process index when loaded; otherwise both legs in Postgres
+        results = await _search_hybrid_indexed(query, query_embedding, fetch_limit, deadline)
+        if results is None:
+            results = await _search_hybrid(query, query_embedding, fetch_limit, deadline)
+        score_key = "score"
+    else:
+        # Serve from the in-process index when loaded, otherwise query pgvector
+        results = vector_index.search(query_embedding, fetch_limit)
+        if results is None:
+            results = await _search_pgvector(query_embedding, fetch_limit, deadline)
+        score_key = "similarity"
+
+    # Apply diversity scoring if shown_counts provided
+    if shown_counts:
+        results = apply_diversity_scoring(results, shown_counts, score_key=score_key)
+
+    # Return requested limit after re-ranking
+    results = results[:limit]
+    if CHUNKS_ENABLED and results:
+        results = await _attach_passages(results, query_embedding, deadline)
+    return results
+
+async def _search_pgvector(
+    query_embedding: List[float],
+    fetch_limit: int,
+    deadline: Optional[Deadline] = None
+) -> List[Dict[str, Any]]:
+    """Run the cosine kNN query in Postgres."""
+    pool = await get_db_pool()
+
+    if deadline:
+        deadline.check("retrieval query")
+    timeout = deadline.remaining() if deadline else None
+
+    async with pool.acquire(timeout=timeout) as conn:
+        # The query vector goes over the wire as binary float32 (see db.encode_vector)
+        statement = await conn.prepared(SEARCH_SQL)
+        rows = await statement.fetch(
+            np.asarray(query_embedding, dtype=np.float32), fetch_limit,
+            timeout=deadline.remaining() if deadline else None
+        )
+
+    return [_row_to_result(row) for row in rows]
+
+async def _search_hybrid(
+    query: str,
+    query_embedding: List[float],
+    fetch_limit: int,
+    deadline: Optional[Deadline] = None
+) -> List[Dict[str, Any]]:
+    """Run full-text and cosine kNN search in Postgres and fuse them with RRF."""
+    pool = await get_db_pool()
+
+    if deadline:
+        deadline.check("retrieval query")
+    timeout = deadline.remaining() if deadline else None
+
+    async with pool.acquire(timeout=timeout) as conn:
+        statement = await conn.prepared(HYBRID_SEARCH_SQL)
+        rows = await statement.fetch(
+            np.asarray(query_embedding, dtype=np.float32), query,
+            max(RAG_HYBRID_CANDIDATES, fetch_limit), RAG_RRF_K, fetch_limit,
+            timeout=deadline.remaining() if deadline else None
+        )
+
+    return [
+        {**_row_to_result(row), "score": float(row["score"])}
+        for row in rows
+    ]
+
+async def _search_hybrid_indexed(
+    query: str,
+    query_embedding: List[float],
+    fetch_limit: int,
+    deadline: Optional[Deadline] = None
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Hybrid search with only the full-text leg in Postgres: cosine candidates
+    come from the in-process index and the rankings are fused here.
+
+    Returns:
+        Fused results, or None if the index isn't loaded
+    """
+    if not vector_index.loaded:
+        return None
+    candidates = max(RAG_HYBRID_CANDIDATES, fetch_limit)
+    pool = await get_db_pool()
+
+    if deadline:
+        deadline.check("retrieval query")
+    timeout = deadline.remaining() if deadline else None
+
+    async with pool.acquire(timeout=timeout) as conn:
+        statement = await conn.prepared(LEXICAL_SEARCH_SQL)
+        rows = await statement.fetch(query, candidates, timeout=deadline.remaining() if deadline else None)
+    lexical = [str(row["id"]) for row in rows]
+
+    # Lexical-only matches are appended so they carry their cosine similarity too
+    ranked = vector_index.search(query_embedding, candidates, include_ids=lexical)
+    if ranked is None:
+        return None
+    semantic = [result["id"] for result in ranked[:candidates]]
+    scores = rrf_fuse([semantic, lexical])
+    results = [{**result, "score": scores[result["id"]]} for result in ranked]
+    results.sort(key=lambda r: r["score"], reverse=True)
+    return results[:fetch_limit]
+
+async def _attach_passages(
+    results: List[Dict[str, Any]],
+    query_embedding: List[float],
+    deadline: Optional[Deadline] = None
+) -> List[Dict[str, Any]]:
+    """
+    Give each result its best passages under RAG_PASSAGE_TOKEN_BUDGET as 'passages'.
+
+    Returns:
+        The results, minus experiences none of whose passages fit the budget
+        (they would reach the prompt with no content)
+    """
+    # Scored in memory alongside the vector index when loaded, otherwise in Postgres
+    chunks = vector_index.passages(query_embedding, [r["id"] for r in results])
+    if chunks is None:
+        pool = await get_db_pool()
+
+        if deadline:
+            deadline.check("passage query")
+        timeout = deadline.remaining() if deadline else None
+
+        async with pool.acquire(timeout=timeout) as conn:
+            statement = await conn.prepared(PASSAGES_SQL)
+            rows = await statement.fetch(
+                np.asarray(query_embedding, dtype=np.float32), [r["id"] for r in results],
+                timeout=deadline.remaining() if deadline else None
+            )
+        chunks = [{**dict(row), "experience_id": str(row["experience_id"])} for row in rows]
+
+    passages = select_passages([r["id"] for r in results], chunks, RAG_PASSAGE_TOKEN_BUDGET)
+    # Experiences without chunks (not chunked yet) keep their full content
+    kept = []
+    for result in results:
+        if result["id"] not in passages:
+            kept.append(result)
+        elif passages[result["id"]]:
+            result["passages"] = passages[result["id"]]
+            kept.append(result)
+    logger.info(f"[RAG Search] Selected {sum(len(p) for p in passages.values())} of {len(chunks)} passages "
+                f"for {len(kept)} of {len(results)} experiences")
+    return kept
+
+def _row_to_result(row) -> Dict[str, Any]:
+    return {
+        "id": str(row["id"]),
+        "title": row["title"],
+        "content": row["content"],
+        "skills": row["skills"],
+        "metadata": json.loads(row["metadata"]) if isinstance(row["metadata"], str) else row["metadata"],
+        "similarity": row["similarity"]
+    }
 
 async def format_rag_results(results: List[Dict[str, Any]]) -> str:
     formatted = ""
     for r in results:
         formatted += f"Title: {r['title']}\n"
         formatted += f"Skills: {', '.join(r['skills']) if r['skills'] else 'N/A'}\n"
-        formatted += f"Content: {r['content']}\n"
+        if "passages" in r:
+            content = "\n".join(f"[{p['heading']}]\n{p['content']}" for p in r["passages"])
+        else:
+            content = r['content']
+        formatted += f"Content: {content}\n"
         formatted += "---\n"
     return formatted
\ No newline at end of file
@@ -1,9 +1,16 @@
 #!/bin/bash
-# Script to re-seed the database with fresh embeddings
-# This will clear existing experiences and re-import from markdown files
+# Script to re-seed the database from markdown files
+# This will clear existing experiences and re-import them. Document embeddings
+# are kept in the document_embeddings store, so unchanged content is not
+# re-embedded; pass --fresh-embeddings to clear that store as well.
 
 set -e
 
+FRESH_EMBEDDINGS=False
+if [ "$1" == "--fresh-embeddings" ]; then
+    FRESH_EMBEDDINGS=True
+fi
+
 echo "⚠️  This will DELETE all existing experiences and re-seed from markdown files"
 read -p "Are you sure you want to continue? (yes/no): " confirm
 
@@ -27,7 +34,11 @@ async def clear():
         count = await conn.fetchval('SELECT COUNT(*) FROM experiences')
         print(f'Found {count} existing experiences')
         await conn.execute('DELETE FROM experiences')
+        await conn.execute('DELETE FROM corpus_snapshot')
         print('✓ Cleared all experiences')
+        if $FRESH_EMBEDDINGS:
+            await conn.execute('DROP TABLE IF EXISTS document_embeddings')
+            print('✓ Cleared stored document embeddings')
     await close_db_pool()
 
 asyncio.run(clear())
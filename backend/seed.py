@@ -1,15 +1,27 @@
 import asyncio
 import os
 import re
+import time
 import hashlib
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Optional
 from db import init_db, get_db_pool, close_db_pool
-from ai.llm import llm_handler
+from ai.llm import llm_handler, EMBEDDING_BATCH_SIZE, EMBEDDING_MODEL
+from vector_index import vector_index, EMBEDDING_DIM
+from ai.block_cache import block_cache
+from ai.archetypes import archetype_cache
+from ai.speculation import speculation_engine
+from chunks import CHUNKS_ENABLED, chunk_markdown, chunk_embedding_text
 import json
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
+# Embedding batches in flight at once while seeding
+SEED_EMBED_CONCURRENCY = int(os.getenv("SEED_EMBED_CONCURRENCY", "4"))
+# Stored document embeddings no experience has used for this long are garbage-collected
+EMBEDDING_STORE_GC_GRACE_SECONDS = float(os.getenv("EMBEDDING_STORE_GC_GRACE_SECONDS", str(7 * 24 * 3600)))
+
 def parse_markdown_file(file_path: str) -> Dict[str, Any]:
     with open(file_path, 'r') as f:
         content = f.read()
@@ -58,6 +70,14 @@ def compute_file_hash(file_path: str) -> str:
         hasher.update(f.read())
     return hasher.hexdigest()
 
+def embedding_text(item: Dict[str, Any]) -> str:
+    """The text a document embedding is computed from."""
+    return f"{item['title']}\n{item['content']}"
+
+def embedding_key(text: str) -> str:
+    """Hash of the embedded text; with model and dimensionality it identifies an embedding."""
+    return hashlib.sha256(text.encode()).hexdigest()
+
 def discover_data_files(data_dir: str) -> Dict[str, tuple[str, str]]:
     """
     Discover all markdown files in data directory.
@@ -79,125 +99,410 @@ def discover_data_files(data_dir: str) -> Dict[str, tuple[str, str]]:
 
     return files
 
-async def check_needs_update(conn, source_file: str, content_hash: str) -> tuple[bool, Optional[str]]:
-    """
-    Check if file needs to be updated/inserted.
-    Returns: (needs_update: bool, existing_id: Optional[str])
-    """
-    row = await conn.fetchrow("""
-        SELECT id, content_hash FROM experiences WHERE source_file = $1
-    """, source_file)
+async def delete_orphaned_experiences(conn, current_files: set[str]) -> int:
+    """Delete DB entries for files that no longer exist."""
+    result = await conn.execute("""
+        DELETE FROM experiences
+        WHERE source_file IS NOT NULL
+        AND source_file NOT IN (SELECT unnest($1::text[]))
+    """, list(current_files))
 
-    if not row:
-        return (True, None)  # New file, needs insert
+    # Extract count from result string "DELETE N"
+    return int(result.split()[-1]) if result else 0
 
-    if row['content_hash'] != content_hash:
-        return (True, str(row['id']))  # Changed file, needs update
+async def fetch_existing_hashes(conn) -> Dict[str, tuple[str, str]]:
+    """
+    Fetch the stored hash of every seeded file in one query.
+    Returns: {source_file: (id, content_hash)}
+    """
+    rows = await conn.fetch("""
+        SELECT source_file, id, content_hash FROM experiences WHERE source_file IS NOT NULL
+    """)
+    return {row['source_file']: (str(row['id']), row['content_hash']) for row in rows}
 
-    return (False, str(row['id']))  # No change, skip
+async def write_experiences(conn, rows: List[tuple[str, str, Dict[str, Any], List[float], Optional[str]]]):
+    """
+    Insert or update many experiences with one executemany per statement.
 
-async def upsert_experience(conn, source_file: str, content_hash: str, item: Dict[str, Any], embedding: List[float], existing_id: Optional[str]):
-    """Insert new or update existing experience."""
-    embedding_str = f"[{','.join(map(str, embedding))}]"
+    Args:
+        rows: (source_file, content_hash, item, embedding, existing_id) tuples
+    """
+    updates, inserts = [], []
+    for source_file, content_hash, item, embedding, existing_id in rows:
+        values = (item['title'], item['content'], item['skills'], json.dumps(item['metadata']),
+                  embedding, embedding_key(embedding_text(item)))
+        if existing_id:
+            updates.append((*values, content_hash, existing_id))
+        else:
+            inserts.append((*values, source_file, content_hash))
 
-    if existing_id:
-        # Update existing
-        await conn.execute("""
+    if updates:
+        await conn.executemany("""
             UPDATE experiences
             SET title = $1, content = $2, skills = $3, metadata = $4,
-                embedding = $5, content_hash = $6, last_updated = NOW()
-            WHERE id = $7
-        """, item['title'], item['content'], item['skills'],
-            json.dumps(item['metadata']), embedding_str, content_hash, existing_id)
-    else:
-        # Insert new
+                embedding = $5, embedding_key = $6, content_hash = $7, last_updated = NOW()
+            WHERE id = $8
+        """, updates)
+        # Passages of rewritten experiences are rebuilt by sync_chunks
         await conn.execute("""
-            INSERT INTO experiences (title, content, skills, metadata, embedding, source_file, content_hash, created_at, last_updated)
-            VALUES ($1, $2, $3, $4, $5, $6, $7, NOW(), NOW())
-        """, item['title'], item['content'], item['skills'],
-            json.dumps(item['metadata']), embedding_str, source_file, content_hash)
+            DELETE FROM experience_chunks WHERE experience_id = ANY($1::uuid[])
+        """, [update[-1] for update in updates])
+    if inserts:
+        await conn.executemany("""
+            INSERT INTO experiences (title, content, skills, metadata, embedding, embedding_key, source_file, content_hash, created_at, last_updated)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, NOW(), NOW())
+        """, inserts)
 
-async def delete_orphaned_experiences(conn, current_files: set[str]) -> int:
-    """Delete DB entries for files that no longer exist."""
-    result = await conn.execute("""
-        DELETE FROM experiences
-        WHERE source_file IS NOT NULL
-        AND source_file NOT IN (SELECT unnest($1::text[]))
-    """, list(current_files))
+async def fetch_stored_embeddings(conn, keys: List[str]) -> Dict[str, np.ndarray]:
+    """
+    Look up previously computed document embeddings for the current model and dimensionality.
+    Returns: {embedding_key: embedding}
+    """
+    if not keys:
+        return {}
+    rows = await conn.fetch("""
+        UPDATE document_embeddings
+        SET last_used = NOW()
+        WHERE embedding_key = ANY($1::text[]) AND model = $2 AND dim = $3
+        RETURNING embedding_key, embedding
+    """, keys, EMBEDDING_MODEL, EMBEDDING_DIM)
+    return {row['embedding_key']: row['embedding'] for row in rows}
 
-    # Extract count from result string "DELETE N"
+async def store_embeddings(conn, embeddings: Dict[str, List[float]]):
+    """Keep freshly computed document embeddings so reseeds can reuse them."""
+    if not embeddings:
+        return
+    await conn.executemany("""
+        INSERT INTO document_embeddings (embedding_key, model, dim, embedding)
+        VALUES ($1, $2, $3, $4)
+        ON CONFLICT (embedding_key, model, dim) DO UPDATE SET last_used = NOW()
+    """, [(key, EMBEDDING_MODEL, EMBEDDING_DIM, embedding) for key, embedding in embeddings.items()])
+
+async def gc_embedding_store(conn) -> int:
+    """Delete stored embeddings no experience references that haven't been used within the grace period."""
+    result = await conn.execute("""
+        DELETE FROM document_embeddings d
+        WHERE d.last_used < NOW() - make_interval(secs => $1)
+        AND NOT EXISTS (SELECT 1 FROM experiences e WHERE e.embedding_key = d.embedding_key)
+        AND NOT EXISTS (SELECT 1 FROM experience_chunks c WHERE c.embedding_key = d.embedding_key)
+    """, EMBEDDING_STORE_GC_GRACE_SECONDS)
     return int(result.split()[-1]) if result else 0
 
-async def seed_data():
-    """Incremental seeding - only updates changed/new files."""
-    await init_db()
-    pool = await get_db_pool()
+async def embed_items(items: List[Dict[str, Any]]) -> List[Optional[List[float]]]:
+    """
+    Embed parsed items in EMBEDDING_BATCH_SIZE batches, at most SEED_EMBED_CONCURRENCY at a time.
+
+    Returns:
+        One embedding per item, or None for items whose batch failed
+    """
+    return await embed_texts([embedding_text(item) for item in items])
 
-    # Determine data directory path
+async def embed_texts(texts: List[str]) -> List[Optional[List[float]]]:
+    """
+    Embed document texts in EMBEDDING_BATCH_SIZE batches, at most SEED_EMBED_CONCURRENCY at a time.
+
+    Returns:
+        One embedding per text, or None for texts whose batch failed
+    """
+    semaphore = asyncio.Semaphore(SEED_EMBED_CONCURRENCY)
+    batches = [texts[i:i + EMBEDDING_BATCH_SIZE] for i in range(0, len(texts), EMBEDDING_BATCH_SIZE)]
+
+    async def _embed(batch: List[str]) -> List[Optional[List[float]]]:
+        async with semaphore:
+            try:
+                return await llm_handler.generate_embeddings(batch)
+            except Exception as e:
+                logger.error(f"Failed to generate embeddings for {len(batch)} documents: {e}", exc_info=True)
+                return [None] * len(batch)
+
+    results = await asyncio.gather(*(_embed(batch) for batch in batches))
+    return [embedding for batch in results for embedding in batch]
+
+def resolve_data_dir() -> str:
+    """Locate the data directory (next to the backend in the image, one level up in a checkout)."""
     current_dir = os.path.dirname(os.path.abspath(__file__))
     data_dir = os.path.join(current_dir, 'data')
     if not os.path.exists(data_dir):
         data_dir = os.path.join(os.path.dirname(current_dir), 'data')
+    return data_dir
 
-    logger.info(f"Starting incremental seed from {data_dir}")
+async def sync_chunks(pool) -> int:
+    """
+    Chunk and embed every experience that has no passages yet: new and
+    rewritten rows (write_experiences drops their chunks) and rows written
+    before chunking existed. Callers hold seed_lock.
+
+    Embeddings come from the document embedding store when the same text was
+    embedded before. Experiences whose chunk embeddings fail are left
+    unchunked, so retrieval falls back to their full content, and retried on
+    the next sync.
 
+    Returns:
+        Number of chunks written
+    """
     async with pool.acquire() as conn:
-        # Discover all markdown files with hashes
-        files = discover_data_files(data_dir)
-        logger.info(f"Discovered {len(files)} markdown files")
+        rows = await conn.fetch("""
+            SELECT e.id, e.title, e.content FROM experiences e
+            WHERE NOT EXISTS (SELECT 1 FROM experience_chunks c WHERE c.experience_id = e.id)
+        """)
+    if not rows:
+        return 0
 
-        if not files:
-            logger.warning("No markdown files found in data directory")
-            return
+    # (experience_id, position, heading, content, embedding_key, embedding text)
+    pending = []
+    for row in rows:
+        item = {"title": row['title'], "content": row['content']}
+        for position, chunk in enumerate(chunk_markdown(item)):
+            text = chunk_embedding_text(item, chunk)
+            pending.append((row['id'], position, chunk['heading'], chunk['content'], embedding_key(text), text))
 
-        # Track statistics
-        stats = {"new": 0, "updated": 0, "skipped": 0, "failed": 0, "deleted": 0}
+    texts = {key: text for _, _, _, _, key, text in pending}
+    async with pool.acquire() as conn:
+        stored = await fetch_stored_embeddings(conn, sorted(texts))
+    missing = [key for key in texts if key not in stored]
+    computed = await embed_texts([texts[key] for key in missing])
+    fresh = {key: embedding for key, embedding in zip(missing, computed) if embedding is not None}
+    embeddings = {**stored, **fresh}
+
+    failed = {experience_id for experience_id, _, _, _, key, _ in pending if key not in embeddings}
+    records = [
+        (experience_id, position, heading, content, embeddings[key], key)
+        for experience_id, position, heading, content, key, _ in pending
+        if experience_id not in failed
+    ]
+    async with pool.acquire() as conn:
+        await store_embeddings(conn, fresh)
+        await conn.executemany("""
+            INSERT INTO experience_chunks (experience_id, position, heading, content, embedding, embedding_key)
+            VALUES ($1, $2, $3, $4, $5, $6)
+        """, records)
+    if failed:
+        logger.warning(f"Failed to embed passages of {len(failed)} experiences; they stay unchunked until the next sync")
+    logger.info(f"Chunked {len(rows) - len(failed)} experiences into {len(records)} passages ({len(stored)} embeddings reused)")
+    return len(records)
+
+async def delete_experiences(conn, source_files: List[str]) -> int:
+    """Delete DB entries for specific files that were removed."""
+    result = await conn.execute("""
+        DELETE FROM experiences WHERE source_file = ANY($1::text[])
+    """, source_files)
+    return int(result.split()[-1]) if result else 0
+
+async def invalidate_caches():
+    """Make in-process retrieval and generation caches reflect the rows that just changed."""
+    # Rebuild the in-process retrieval index if rows changed under it; the new
+    # snapshot replaces the old one in a single assignment
+    if vector_index.loaded:
+        await vector_index.refresh()
+    # Cached and speculated blocks may describe content that just changed
+    block_cache.clear()
+    speculation_engine.clear()
+    archetype_cache.refresh()
+
+# Full seeds and watcher re-indexing must not interleave their diff and write phases
+seed_lock = asyncio.Lock()
+
+async def seed_data() -> Dict[str, Any]:
+    """
+    Incremental seeding - only updates changed/new files.
+
+    Runs as a pipeline: one query for all stored hashes, parallel parsing of
+    changed files, reuse of document embeddings already computed for the same
+    text, bounded concurrent batched embedding of the rest, and all writes in
+    a single transaction.
+
+    Returns:
+        Counts of new, updated, skipped, failed and deleted entries and of
+        embeddings_reused, plus per-stage 'timings' in seconds
+    """
+    await init_db()
+    start = time.perf_counter()
+    data_dir = resolve_data_dir()
+    logger.info(f"Starting incremental seed from {data_dir}")
+
+    # Discover all markdown files with hashes
+    files = await asyncio.to_thread(discover_data_files, data_dir)
+    logger.info(f"Discovered {len(files)} markdown files")
+
+    if not files:
+        logger.warning("No markdown files found in data directory")
+        return {**_empty_stats(), "timings": {"discover": round(time.perf_counter() - start, 4)}}
+
+    return await sync_files(files, removed=None, start=start)
 
-        # Process each file
-        for source_file, (full_path, content_hash) in files.items():
+async def seed_paths(source_files: Iterable[str]) -> Dict[str, Any]:
+    """
+    Incrementally re-index only the given files (e.g. "jobs/writer.md").
+
+    Files that still exist go through the same diff → parse → embed → write
+    pipeline as seed_data; files that no longer exist are deleted. No other
+    file in the data directory is read.
+
+    Returns:
+        The same stats as seed_data
+    """
+    start = time.perf_counter()
+    data_dir = resolve_data_dir()
+
+    def _hash_touched():
+        files, removed = {}, []
+        for source_file in sorted(set(source_files)):
+            full_path = os.path.join(data_dir, source_file)
             try:
-                # Check if update needed
-                needs_update, existing_id = await check_needs_update(conn, source_file, content_hash)
-
-                if not needs_update:
-                    logger.info(f"Skipped (no changes): {source_file}")
-                    stats["skipped"] += 1
-                    continue
-
-                # Parse markdown
-                item = parse_markdown_file(full_path)
-                if not item:
-                    logger.warning(f"Failed to parse: {source_file}")
-                    stats["failed"] += 1
-                    continue
-
-                # Generate embedding
-                logger.info(f"Processing: {source_file} (hash: {content_hash[:8]}...)")
-                embedding = await llm_handler.generate_embedding(f"{item['title']}\n{item['content']}")
-
-                # Upsert to database
-                await upsert_experience(conn, source_file, content_hash, item, embedding, existing_id)
-
-                if existing_id:
-                    logger.info(f"  → Updated existing entry")
-                    stats["updated"] += 1
-                else:
-                    logger.info(f"  → Inserted new entry")
-                    stats["new"] += 1
+                files[source_file] = (full_path, compute_file_hash(full_path))
+            except FileNotFoundError:
+                removed.append(source_file)
+        return files, removed
 
-            except Exception as e:
-                logger.error(f"Failed to process {source_file}: {e}", exc_info=True)
-                stats["failed"] += 1
-                # Continue with other files
-
-        # Delete orphaned entries
-        deleted = await delete_orphaned_experiences(conn, set(files.keys()))
-        stats["deleted"] = deleted
-        if deleted > 0:
-            logger.info(f"Deleted {deleted} orphaned entries")
-
-        # Log summary
-        logger.info(f"Seed complete - New: {stats['new']}, Updated: {stats['updated']}, Skipped: {stats['skipped']}, Failed: {stats['failed']}, Deleted: {stats['deleted']}")
+    files, removed = await asyncio.to_thread(_hash_touched)
+    logger.info(f"Re-indexing {len(files)} changed and {len(removed)} removed files")
+    return await sync_files(files, removed=removed, start=start)
+
+def _empty_stats() -> Dict[str, Any]:
+    return {"new": 0, "updated": 0, "skipped": 0, "failed": 0, "deleted": 0, "embeddings_reused": 0, "chunks": 0}
+
+async def sync_files(
+    files: Dict[str, tuple[str, str]],
+    removed: Optional[List[str]],
+    start: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Bring the experiences table in line with a set of discovered files.
+
+    Args:
+        files: {source_file: (full_path, content_hash)} to insert or update
+        removed: Source files to delete, or None to delete every row whose
+            file is not in files (a full scan)
+        start: perf_counter() value the first stage's timing is measured from
+    """
+    async with seed_lock:
+        return await _sync_files(files, removed, start or time.perf_counter())
+
+async def _sync_files(files: Dict[str, tuple[str, str]], removed: Optional[List[str]], start: float) -> Dict[str, Any]:
+    pool = await get_db_pool()
+    timings = {}
+
+    def _lap(stage: str, since: float) -> float:
+        now = time.perf_counter()
+        timings[stage] = round(now - since, 4)
+        return now
+
+    # Track statistics
+    stats = _empty_stats()
+    lap = _lap("discover", start)
+
+    # Diff against every stored hash in one round trip
+    async with pool.acquire() as conn:
+        existing = await fetch_existing_hashes(conn)
+
+    changed = []
+    for source_file, (full_path, content_hash) in files.items():
+        existing_id, stored_hash = existing.get(source_file, (None, None))
+        if stored_hash == content_hash:
+            logger.info(f"Skipped (no changes): {source_file}")
+            stats["skipped"] += 1
+            continue
+        changed.append((source_file, full_path, content_hash, existing_id))
+    lap = _lap("diff", lap)
+
+    # Parse changed files in parallel
+    parsed = await asyncio.gather(
+        *(asyncio.to_thread(parse_markdown_file, full_path) for _, full_path, _, _ in changed),
+        return_exceptions=True
+    )
+    pending = []
+    for (source_file, _, content_hash, existing_id), item in zip(changed, parsed):
+        if isinstance(item, Exception):
+            logger.error(f"Failed to process {source_file}: {item}")
+            stats["failed"] += 1
+        elif not item:
+            logger.warning(f"Failed to parse: {source_file}")
+            stats["failed"] += 1
+        else:
+            logger.info(f"Processing: {source_file} (hash: {content_hash[:8]}...)")
+            pending.append((source_file, content_hash, item, existing_id))
+    lap = _lap("parse", lap)
+
+    # Reuse stored embeddings for text embedded before (e.g. after a full reseed)
+    keys = [embedding_key(embedding_text(item)) for _, _, item, _ in pending]
+    async with pool.acquire() as conn:
+        stored = await fetch_stored_embeddings(conn, sorted(set(keys)))
+    stats["embeddings_reused"] = sum(1 for key in keys if key in stored)
+
+    # Generate the rest in as few API calls as possible
+    missing = [i for i, key in enumerate(keys) if key not in stored]
+    computed = await embed_items([pending[i][2] for i in missing])
+    fresh = {keys[i]: embedding for i, embedding in zip(missing, computed) if embedding is not None}
+    # Stored outside the write transaction so paid-for embeddings survive a failed write
+    try:
+        async with pool.acquire() as conn:
+            await store_embeddings(conn, fresh)
+    except Exception as e:
+        logger.warning(f"Failed to store {len(fresh)} document embeddings: {e}")
+
+    rows = []
+    for (source_file, content_hash, item, existing_id), key in zip(pending, keys):
+        embedding = stored[key] if key in stored else fresh.get(key)
+        if embedding is None:
+            stats["failed"] += 1
+        else:
+            rows.append((source_file, content_hash, item, embedding, existing_id))
+    lap = _lap("embed", lap)
+
+    # Write every change and delete orphaned entries atomically
+    async with pool.acquire() as conn:
+        try:
+            async with conn.transaction():
+                await write_experiences(conn, rows)
+                if removed is None:
+                    stats["deleted"] = await delete_orphaned_experiences(conn, set(files.keys()))
+                elif removed:
+                    stats["deleted"] = await delete_experiences(conn, removed)
+                if rows or stats["deleted"]:
+                    # Postgres no longer matches any prebuilt corpus snapshot
+                    await conn.execute("DELETE FROM corpus_snapshot")
+                collected = await gc_embedding_store(conn)
+        except Exception as e:
+            logger.error(f"Failed to write {len(rows)} experiences: {e}", exc_info=True)
+            stats["failed"] += len(rows)
+            rows = []
+            collected = 0
+
+    for source_file, _, _, _, existing_id in rows:
+        if existing_id:
+            logger.info(f"  → Updated existing entry: {source_file}")
+            stats["updated"] += 1
+        else:
+            logger.info(f"  → Inserted new entry: {source_file}")
+            stats["new"] += 1
+    if stats["deleted"] > 0:
+        logger.info(f"Deleted {stats['deleted']} orphaned entries")
+    if collected > 0:
+        logger.info(f"Garbage-collected {collected} unreferenced stored embeddings")
+    lap = _lap("write", lap)
+
+    # Passages for new and rewritten rows (and any row never chunked)
+    if CHUNKS_ENABLED:
+        try:
+            stats["chunks"] = await sync_chunks(pool)
+        except Exception as e:
+            logger.error(f"Failed to chunk experiences: {e}", exc_info=True)
+        lap = _lap("chunk", lap)
+
+    # Log summary
+    logger.info(f"Seed complete - New: {stats['new']}, Updated: {stats['updated']}, Skipped: {stats['skipped']}, Failed: {stats['failed']}, Deleted: {stats['deleted']}, Embeddings reused: {stats['embeddings_reused']}")
+
+    if stats["new"] or stats["updated"] or stats["deleted"]:
+        await invalidate_caches()
+    elif stats["chunks"] and vector_index.loaded:
+        # Only passages changed (e.g. rows chunked for the first time)
+        await vector_index.refresh_chunks()
+    _lap("invalidate", lap)
+
+    timings["total"] = round(time.perf_counter() - start, 4)
+    logger.info("Seed stage timings: " + ", ".join(f"{stage} {seconds * 1000:.0f}ms" for stage, seconds in timings.items()))
+    stats["timings"] = timings
+    return stats
 
 if __name__ == "__main__":
     from dotenv import load_dotenv
@@ -0,0 +1,240 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from db import get_db_pool
+from models import CompressedContext
+
+logger = logging.getLogger(__name__)
+
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "5000"))
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", str(24 * 3600)))
+# Back sessions with Postgres so they survive restarts/redeploys and are shared by workers
+SESSION_PERSISTENT = os.getenv("SESSION_PERSISTENT", "true").lower() == "true"
+SESSION_DB_TIMEOUT_SECONDS = float(os.getenv("SESSION_DB_TIMEOUT_SECONDS", "0.5"))
+# Only the latest messages are ever used for prompts
+SESSION_MAX_HISTORY = int(os.getenv("SESSION_MAX_HISTORY", "100"))
+SESSION_MAX_BLOCKS = int(os.getenv("SESSION_MAX_BLOCKS", "50"))
+SESSION_PRUNE_EVERY = 100
+
+
+class Session:
+    """Everything the frontend used to re-send on every request."""
+
+    def __init__(
+        self,
+        session_id: str,
+        history: Optional[List[Dict[str, str]]] = None,
+        visitor_summary: Optional[str] = None,
+        context: Optional[CompressedContext] = None
+    ):
+        self.session_id = session_id
+        self.history = history or []
+        self.visitor_summary = visitor_summary
+        self.context = context or CompressedContext()
+        self.last_used = 0.0
+
+    def add_message(self, role: str, content: str):
+        self.history.append({"role": role, "content": content})
+        del self.history[:-SESSION_MAX_HISTORY]
+
+    def record_block(
+        self,
+        experience_ids: List[str],
+        block_summary: Optional[str] = None,
+        block_id: Optional[str] = None
+    ):
+        """Fold a rendered block into the context, like the frontend's contextTracker did."""
+        counts = dict(self.context.shown_experience_counts)
+        for exp_id in experience_ids:
+            counts[exp_id] = counts.get(exp_id, 0) + 1
+        summaries = [*self.context.block_summaries, *([block_summary] if block_summary else [])]
+        pending = list(zip(self.context.pending_block_ids, self.context.pending_block_positions))
+        if block_id:
+            pending.append((block_id, len(self.context.block_summaries)))
+        # Keep the stored state bounded; the prompt only ever uses the latest summaries
+        trimmed = max(0, len(summaries) - SESSION_MAX_BLOCKS)
+        del summaries[:trimmed]
+        del pending[:-SESSION_MAX_BLOCKS]
+        self.context = CompressedContext(
+            block_summaries=summaries,
+            shown_experience_counts=counts,
+            pending_block_ids=[pending_id for pending_id, _ in pending],
+            pending_block_positions=[max(0, position - trimmed) for _, position in pending]
+        )
+
+    def to_state(self) -> Dict[str, Any]:
+        return {
+            "history": self.history,
+            "visitor_summary": self.visitor_summary,
+            "context": self.context.model_dump()
+        }
+
+    @classmethod
+    def from_state(cls, session_id: str, state: Dict[str, Any]) -> "Session":
+        return cls(
+            session_id,
+            history=state.get("history", []),
+            visitor_summary=state.get("visitor_summary"),
+            context=CompressedContext(**state.get("context", {}))
+        )
+
+
+class SessionStore:
+    """
+    Server-side visitor sessions, so requests only carry what changed.
+
+    /api/chat issues a session ID; later requests send just that ID plus the
+    new message or action, and the server keeps the chat history, visitor
+    summary and block context. Sessions live in an in-process LRU with a TTL,
+    optionally written through to Postgres in the background. Postgres errors
+    are logged and treated as misses.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = SESSION_MAX_ENTRIES,
+        ttl_seconds: float = SESSION_TTL_SECONDS,
+        persistent: bool = SESSION_PERSISTENT,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persistent = persistent
+        self._clock = clock
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._writes: Set[asyncio.Task] = set()
+        # Latest unwritten state per session; one writer task per session drains it
+        self._unwritten: Dict[str, str] = {}
+        self._writers: Dict[str, asyncio.Task] = {}
+        self._saves_since_prune = 0
+        self.created = 0
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.db_errors = 0
+
+    def _put_memory(self, session: Session):
+        session.last_used = self._clock()
+        self._sessions[session.session_id] = session
+        self._sessions.move_to_end(session.session_id)
+        while len(self._sessions) > self.max_entries:
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+
+    def create(self) -> Session:
+        session = Session(uuid.uuid4().hex)
+        self._put_memory(session)
+        self.created += 1
+        return session
+
+    async def get(self, session_id: str) -> Optional[Session]:
+        """
+        Look up a session, checking memory first and then Postgres.
+
+        Returns:
+            The session, or None if unknown or expired
+        """
+        session = self._sessions.get(session_id)
+        if session is not None:
+            if self._clock() - session.last_used <= self.ttl_seconds:
+                self._put_memory(session)
+                self.memory_hits += 1
+                return session
+            del self._sessions[session_id]
+            self.evictions += 1
+
+        if self.persistent:
+            session = await self._get_db(session_id)
+            if session is not None:
+                self._put_memory(session)
+                self.db_hits += 1
+                return session
+
+        self.misses += 1
+        return None
+
+    def save(self, session: Session):
+        """
+        Mark a session as used after changing it; the Postgres write happens in the background.
+
+        Writes for one session run one at a time, and saves made while a write
+        is in flight are coalesced into a single write of the latest state, so
+        an older state can never commit after a newer one.
+        """
+        self._put_memory(session)
+        if self.persistent:
+            self._unwritten[session.session_id] = json.dumps(session.to_state())
+            if session.session_id not in self._writers:
+                task = asyncio.get_running_loop().create_task(self._write_behind(session.session_id))
+                self._writers[session.session_id] = task
+                self._writes.add(task)
+                task.add_done_callback(self._writes.discard)
+
+    async def _write_behind(self, session_id: str):
+        try:
+            while session_id in self._unwritten:
+                await self._put_db(session_id, self._unwritten.pop(session_id))
+        finally:
+            del self._writers[session_id]
+
+    async def _get_db(self, session_id: str) -> Optional[Session]:
+        try:
+            pool = await get_db_pool()
+            async with pool.acquire(timeout=SESSION_DB_TIMEOUT_SECONDS) as conn:
+                state = await conn.fetchval("""
+                    SELECT state::text FROM visitor_sessions
+                    WHERE session_id = $1
+                    AND updated_at > NOW() - make_interval(secs => $2)
+                """, session_id, self.ttl_seconds, timeout=SESSION_DB_TIMEOUT_SECONDS)
+        except Exception as e:
+            self.db_errors += 1
+            logger.warning(f"[SESSION] Postgres lookup failed: {e}")
+            return None
+        return Session.from_state(session_id, json.loads(state)) if state else None
+
+    async def _put_db(self, session_id: str, state: str):
+        try:
+            pool = await get_db_pool()
+            async with pool.acquire() as conn:
+                await conn.execute("""
+                    INSERT INTO visitor_sessions (session_id, state)
+                    VALUES ($1, $2)
+                    ON CONFLICT (session_id) DO UPDATE
+                    SET state = EXCLUDED.state, updated_at = NOW()
+                """, session_id, state)
+
+                self._saves_since_prune += 1
+                if self._saves_since_prune >= SESSION_PRUNE_EVERY:
+                    self._saves_since_prune = 0
+                    await conn.execute("""
+                        DELETE FROM visitor_sessions
+                        WHERE updated_at <= NOW() - make_interval(secs => $1)
+                    """, self.ttl_seconds)
+        except Exception as e:
+            self.db_errors += 1
+            logger.warning(f"[SESSION] Postgres write failed: {e}")
+
+    def clear(self):
+        self._sessions.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._sessions),
+            "created": self.created,
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "db_errors": self.db_errors
+        }
+
+
+# Global session store instance
+session_store = SessionStore()
@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from db import get_db_pool
+from ai.llm import EMBEDDING_MODEL
+from vector_index import vector_index, EMBEDDING_DIM, VECTOR_INDEX_ENABLED, VECTOR_INDEX_MAX_ROWS
+from seed import (
+    discover_data_files, parse_markdown_file, embed_items, resolve_data_dir, seed_lock,
+    fetch_existing_hashes, write_experiences, delete_orphaned_experiences, store_embeddings, embedding_key, embedding_text,
+    invalidate_caches, sync_chunks
+)
+from chunks import CHUNKS_ENABLED
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_ENABLED = os.getenv("SNAPSHOT_ENABLED", "true").lower() == "true"
+# Defaults to data/snapshot so the Dockerfile's COPY of data/ bakes it into the image
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR") or os.path.join(resolve_data_dir(), "snapshot")
+# Re-hash data/ at boot and fall back to seeding if it has drifted from the snapshot
+SNAPSHOT_VERIFY = os.getenv("SNAPSHOT_VERIFY", "true").lower() == "true"
+SNAPSHOT_FORMAT = 1
+MANIFEST_FILE = "manifest.json"
+
+
+def corpus_version(hashes: Dict[str, str]) -> str:
+    """Version of a corpus: a digest of every (source_file, content_hash) pair."""
+    raw = "\n".join(f"{source_file}:{content_hash}" for source_file, content_hash in sorted(hashes.items()))
+    return hashlib.sha256(f"{EMBEDDING_MODEL}|{EMBEDDING_DIM}|{raw}".encode()).hexdigest()
+
+
+class CorpusSnapshot:
+    """
+    A prebuilt corpus: L2-normalized float32 embeddings memory-mapped from disk
+    plus one record (source file, content hash, parsed content) per row.
+    """
+
+    def __init__(self, version: str, records: List[Dict[str, Any]], matrix: np.ndarray):
+        self.version = version
+        self.records = records
+        self.matrix = matrix
+
+    @property
+    def hashes(self) -> Dict[str, str]:
+        return {record["source_file"]: record["content_hash"] for record in self.records}
+
+
+def load_snapshot(path: str = SNAPSHOT_DIR) -> Optional[CorpusSnapshot]:
+    """
+    Open a snapshot without reading its embeddings into memory.
+
+    Returns:
+        The snapshot, or None if it is missing or was built for another
+        format, embedding model or dimensionality
+    """
+    try:
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+
+    if (manifest.get("format"), manifest.get("model"), manifest.get("dim")) != (SNAPSHOT_FORMAT, EMBEDDING_MODEL, EMBEDDING_DIM):
+        logger.warning(f"[SNAPSHOT] Ignoring snapshot built for {manifest.get('model')}/{manifest.get('dim')}")
+        return None
+
+    records = manifest["records"]
+    if not records:
+        return CorpusSnapshot(manifest["version"], [], np.empty((0, EMBEDDING_DIM), dtype=np.float32))
+    matrix = np.memmap(
+        os.path.join(path, manifest["embeddings_file"]), dtype="<f4", mode="r", shape=(len(records), EMBEDDING_DIM)
+    )
+    return CorpusSnapshot(manifest["version"], records, matrix)
+
+
+async def build_snapshot(data_dir: Optional[str] = None, path: str = SNAPSHOT_DIR) -> Dict[str, Any]:
+    """
+    Turn data/ into a snapshot, re-embedding only files whose content hash
+    isn't already in the previous snapshot.
+
+    The versioned embeddings file is written before the manifest that points
+    to it, so a reader never sees a half-written snapshot.
+
+    Returns:
+        Dict with 'version', 'records', 'embedded' and 'reused' counts
+    """
+    data_dir = data_dir or resolve_data_dir()
+    files = await asyncio.to_thread(discover_data_files, data_dir)
+    previous = load_snapshot(path)
+    reusable = {}
+    if previous:
+        reusable = {record["content_hash"]: previous.matrix[i] for i, record in enumerate(previous.records)}
+
+    records, items = [], []
+    for source_file, (full_path, content_hash) in sorted(files.items()):
+        item = await asyncio.to_thread(parse_markdown_file, full_path)
+        if not item:
+            logger.warning(f"[SNAPSHOT] Failed to parse: {source_file}")
+            continue
+        records.append({"source_file": source_file, "content_hash": content_hash, **item})
+        items.append(item)
+
+    missing = [i for i, record in enumerate(records) if record["content_hash"] not in reusable]
+    computed = await embed_items([items[i] for i in missing])
+    if any(embedding is None for embedding in computed):
+        raise RuntimeError("Embedding failed for some files; snapshot not written")
+
+    matrix = np.empty((len(records), EMBEDDING_DIM), dtype="<f4")
+    fresh = dict(zip(missing, computed))
+    for i, record in enumerate(records):
+        matrix[i] = fresh[i] if i in fresh else reusable[record["content_hash"]]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+
+    version = corpus_version({r["source_file"]: r["content_hash"] for r in records})
+    embeddings_file = f"embeddings-{version[:16]}.f32"
+    os.makedirs(path, exist_ok=True)
+    matrix.tofile(os.path.join(path, embeddings_file))
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "version": version,
+        "model": EMBEDDING_MODEL,
+        "dim": EMBEDDING_DIM,
+        "embeddings_file": embeddings_file,
+        "records": records
+    }
+    tmp = os.path.join(path, MANIFEST_FILE + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, os.path.join(path, MANIFEST_FILE))
+
+    for name in os.listdir(path):
+        if name.startswith("embeddings-") and name != embeddings_file:
+            os.remove(os.path.join(path, name))
+
+    stats = {"version": version, "records": len(records), "embedded": len(missing), "reused": len(records) - len(missing)}
+    logger.info(f"[SNAPSHOT] Built {path}: {stats}")
+    return stats
+
+
+async def apply_snapshot(snapshot: CorpusSnapshot) -> Dict[str, Any]:
+    """
+    Sync Postgres to a snapshot (only if its version differs from the last
+    one applied) and serve retrieval straight from the memory-mapped matrix.
+
+    Returns:
+        Dict with 'synced' (whether Postgres was written), 'written',
+        'deleted', 'chunks' (passages built) and 'indexed' (whether the vector
+        index now uses the snapshot)
+    """
+    stats = {"synced": False, "written": 0, "deleted": 0, "chunks": 0, "indexed": False}
+    pool = await get_db_pool()
+
+    async with seed_lock:
+        async with pool.acquire() as conn:
+            applied = await conn.fetchval("SELECT version FROM corpus_snapshot WHERE id = 1")
+            if applied != snapshot.version:
+                existing = await fetch_existing_hashes(conn)
+                rows, embeddings = [], {}
+                for i, record in enumerate(snapshot.records):
+                    existing_id, stored_hash = existing.get(record["source_file"], (None, None))
+                    if stored_hash == record["content_hash"]:
+                        continue
+                    embedding = snapshot.matrix[i]
+                    rows.append((record["source_file"], record["content_hash"], record, embedding, existing_id))
+                    embeddings[embedding_key(embedding_text(record))] = embedding
+
+                async with conn.transaction():
+                    await store_embeddings(conn, embeddings)
+                    await write_experiences(conn, rows)
+                    stats["deleted"] = await delete_orphaned_experiences(conn, set(snapshot.hashes))
+                    await conn.execute("""
+                        INSERT INTO corpus_snapshot (id, version) VALUES (1, $1)
+                        ON CONFLICT (id) DO UPDATE SET version = EXCLUDED.version, applied_at = NOW()
+                    """, snapshot.version)
+                stats["synced"] = True
+                stats["written"] = len(rows)
+
+            ids = {
+                row["source_file"]: str(row["id"])
+                for row in await conn.fetch("SELECT id, source_file FROM experiences WHERE source_file IS NOT NULL")
+            }
+
+    if stats["written"] or stats["deleted"]:
+        await invalidate_caches()
+
+    if VECTOR_INDEX_ENABLED and len(snapshot.records) <= VECTOR_INDEX_MAX_ROWS \
+            and all(record["source_file"] in ids for record in snapshot.records):
+        vector_index.load(snapshot.matrix, [
+            {
+                "id": ids[record["source_file"]],
+                "title": record["title"],
+                "content": record["content"],
+                "skills": record["skills"],
+                "metadata": record["metadata"]
+            }
+            for record in snapshot.records
+        ])
+        stats["indexed"] = True
+
+    # Passages aren't part of the snapshot; build them for rows that lack them
+    # (may call the embedding API, so only after the index is serving)
+    if CHUNKS_ENABLED:
+        try:
+            async with seed_lock:
+                stats["chunks"] = await sync_chunks(pool)
+            if stats["indexed"]:
+                await vector_index.refresh_chunks()
+        except Exception as e:
+            logger.error(f"[SNAPSHOT] Failed to chunk experiences: {e}", exc_info=True)
+    return stats
+
+
+async def boot_from_snapshot(path: str = SNAPSHOT_DIR) -> Optional[Dict[str, Any]]:
+    """
+    Startup entry point: apply the baked-in snapshot if there is one.
+
+    Returns:
+        apply_snapshot stats plus 'current' (True when data/ still matches the
+        snapshot, so startup seeding can be skipped) and 'applied'. A snapshot
+        that no longer matches data/ is not applied at all. None without a snapshot
+    """
+    if not SNAPSHOT_ENABLED:
+        return None
+    start = time.perf_counter()
+    snapshot = load_snapshot(path)
+    if snapshot is None:
+        return None
+
+    if SNAPSHOT_VERIFY:
+        files = await asyncio.to_thread(discover_data_files, resolve_data_dir())
+        if {source_file: content_hash for source_file, (_, content_hash) in files.items()} != snapshot.hashes:
+            # Applying a stale snapshot would roll back rows the last seed made
+            # newer and delete experiences added since the build
+            logger.warning("[SNAPSHOT] data/ has changed since the snapshot was built; leaving Postgres to seeding")
+            return {"current": False, "applied": False}
+
+    stats = await apply_snapshot(snapshot)
+    stats["applied"] = True
+    stats["current"] = True
+    logger.info(f"[SNAPSHOT] Applied snapshot {snapshot.version[:12]} in {(time.perf_counter() - start) * 1000:.1f}ms: {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(build_snapshot())
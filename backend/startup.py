@@ -0,0 +1,125 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Backoff between attempts of a required startup phase (e.g. the database isn't up yet)
+STARTUP_RETRY_BASE_SECONDS = float(os.getenv("STARTUP_RETRY_BASE_SECONDS", "1"))
+STARTUP_RETRY_MAX_SECONDS = float(os.getenv("STARTUP_RETRY_MAX_SECONDS", "30"))
+
+
+class StartupPhase:
+    """One named step of background startup."""
+
+    def __init__(
+        self,
+        name: str,
+        run: Callable[[], Awaitable[Any]],
+        required: bool = False,
+        marks_ready: bool = False
+    ):
+        self.name = name
+        self.run = run
+        # Required phases are retried until they succeed; optional ones are logged and skipped
+        self.required = required
+        # Once this phase completes the app can serve requests from existing data
+        self.marks_ready = marks_ready
+
+
+class StartupSupervisor:
+    """
+    Runs startup work (database init, seeding, index loading) in the background.
+
+    The app starts serving immediately; /api/ready reports whether the
+    database is usable yet and how far startup has progressed. Phase timings
+    are recorded and logged.
+    """
+
+    def __init__(
+        self,
+        retry_base_seconds: float = STARTUP_RETRY_BASE_SECONDS,
+        retry_max_seconds: float = STARTUP_RETRY_MAX_SECONDS
+    ):
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.phase: Optional[str] = None
+        self.ready = False
+        self.complete = False
+        self.timings: Dict[str, float] = {}
+        self.results: Dict[str, Any] = {}
+        self.errors: Dict[str, str] = {}
+        self._started_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, phases: List[StartupPhase]):
+        self._started_at = time.perf_counter()
+        self._task = asyncio.create_task(self._run(phases))
+
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def wait(self):
+        """Wait for every phase to finish (tests and CLI use)."""
+        if self._task:
+            await asyncio.shield(self._task)
+
+    async def _run(self, phases: List[StartupPhase]):
+        for phase in phases:
+            self.phase = phase.name
+            start = time.perf_counter()
+            attempt = 0
+            while True:
+                try:
+                    self.results[phase.name] = await phase.run()
+                    self.errors.pop(phase.name, None)
+                    break
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.errors[phase.name] = str(e)
+                    if not phase.required:
+                        logger.error(f"[STARTUP] Phase '{phase.name}' failed, continuing: {e}", exc_info=True)
+                        break
+                    delay = min(self.retry_max_seconds, self.retry_base_seconds * 2 ** attempt)
+                    attempt += 1
+                    logger.warning(f"[STARTUP] Phase '{phase.name}' failed (attempt {attempt}), retrying in {delay:.0f}s: {e}")
+                    await asyncio.sleep(delay)
+
+            self.timings[phase.name] = round(time.perf_counter() - start, 4)
+            logger.info(f"[STARTUP] Phase '{phase.name}' finished in {self.timings[phase.name] * 1000:.0f}ms")
+            if phase.marks_ready:
+                self.ready = True
+
+        self.ready = True
+        self.complete = True
+        self.phase = None
+        self.timings["total"] = round(time.perf_counter() - self._started_at, 4)
+        logger.info(
+            "[STARTUP] Background startup complete: "
+            + ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.timings.items())
+        )
+
+    def get_status(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self._started_at if self._started_at else 0.0
+        return {
+            "ready": self.ready,
+            "complete": self.complete,
+            "phase": self.phase,
+            "elapsed_seconds": round(elapsed, 3),
+            "timings": dict(self.timings),
+            "errors": dict(self.errors),
+            "snapshot": self.results.get("snapshot"),
+            "seed": self.results.get("seed")
+        }
+
+
+# Global startup supervisor instance
+startup_supervisor = StartupSupervisor()
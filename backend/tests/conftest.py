@@ -0,0 +1,38 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from embedding_cache import embedding_cache
+
+
+@pytest.fixture(autouse=True)
+def isolated_embedding_cache(monkeypatch):
+    """Keep cached query embeddings from leaking between tests and off the real database."""
+    embedding_cache.clear()
+    monkeypatch.setattr(embedding_cache, "persistent", False)
+    yield
+    embedding_cache.clear()
+
+
+@pytest.fixture
+def mock_db():
+    """
+    A mock asyncpg pool and the connection every pool.acquire() yields.
+
+    Query methods (including conn.prepared(...).fetch) are AsyncMocks that
+    return nothing; tests set return values, or side effects that dispatch on
+    the SQL, as they need.
+
+    Returns:
+        Tuple of (pool, conn)
+    """
+    pool = MagicMock()
+    conn = MagicMock()
+    conn.fetch = AsyncMock(return_value=[])
+    conn.fetchval = AsyncMock(return_value=None)
+    conn.fetchrow = AsyncMock(return_value=None)
+    conn.execute = AsyncMock(return_value="DELETE 0")
+    conn.executemany = AsyncMock()
+    conn.prepared = AsyncMock()
+    conn.prepared.return_value.fetch = AsyncMock(return_value=[])
+    pool.acquire.return_value.__aenter__.return_value = conn
+    return pool, conn
@@ -0,0 +1,114 @@
+"""Unit tests for the archetype warm cache."""
+
+import json
+import numpy as np
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from ai.archetypes import ArchetypeWarmCache, is_initial_load
+from models import CompressedContext, SuggestedButton
+
+
+def unit(*values):
+    v = np.zeros(8, dtype=np.float32)
+    v[:len(values)] = values
+    return v / np.linalg.norm(v)
+
+
+def mock_handler():
+    handler = MagicMock()
+    handler.retrieve_experiences = AsyncMock(return_value=[{"id": "1", "title": "T"}])
+    handler.generate_block = AsyncMock(return_value={
+        "html": "<div>Warm</div>", "block_summary": "Highlighted T.", "experience_ids": ["1"]
+    })
+    handler.generate_buttons = AsyncMock(return_value=[SuggestedButton(label="More", prompt="Tell me more")])
+    return handler
+
+
+def test_is_initial_load():
+    assert is_initial_load(None, None, False)
+    assert is_initial_load("initial_load", CompressedContext(), False)
+    assert not is_initial_load("initial_load", None, True)
+    assert not is_initial_load("button_click", None, False)
+    assert not is_initial_load("initial_load", CompressedContext(block_summaries=["Shown"]), False)
+
+
+@pytest.mark.asyncio
+async def test_warm_generates_missing_and_persists(mock_db):
+    handler = mock_handler()
+    cache = ArchetypeWarmCache(handler, archetypes=["Recruiter"], enabled=True)
+    pool, conn = mock_db
+
+    with patch("ai.archetypes.corpus_version", new_callable=AsyncMock, return_value="v1"), \
+         patch("ai.archetypes.get_db_pool", new_callable=AsyncMock, return_value=pool), \
+         patch.object(cache, "_embed", new_callable=AsyncMock, return_value=unit(1.0)):
+        await cache.warm()
+
+    handler.retrieve_experiences.assert_awaited_once()
+    assert handler.generate_block.await_args.kwargs["action_type"] == "initial_load"
+    insert_args = conn.execute.await_args_list[-1].args
+    assert "INSERT INTO archetype_blocks" in insert_args[0]
+    assert insert_args[1:3] == ("Recruiter", "v1")
+    assert cache.get_stats()["warm"] == 1
+    assert cache.get_stats()["generated"] == 1
+
+
+@pytest.mark.asyncio
+async def test_warm_reuses_rows_for_current_corpus(mock_db):
+    handler = mock_handler()
+    cache = ArchetypeWarmCache(handler, archetypes=["Recruiter"], enabled=True)
+    row = {
+        "archetype": "Recruiter",
+        "embedding": unit(1.0),
+        "html": "<div>Stored</div>",
+        "block_summary": "Stored summary",
+        "experience_ids": ["1"],
+        "buttons": json.dumps([{"label": "More", "prompt": "Tell me more"}])
+    }
+    pool, conn = mock_db
+    conn.fetch.return_value = [row]
+
+    with patch("ai.archetypes.corpus_version", new_callable=AsyncMock, return_value="v1"), \
+         patch("ai.archetypes.get_db_pool", new_callable=AsyncMock, return_value=pool):
+        await cache.warm()
+
+    handler.generate_block.assert_not_awaited()
+    assert cache.get_stats()["loaded"] == 1
+
+    with patch.object(cache, "_embed", new_callable=AsyncMock, return_value=unit(1.0, 0.1)):
+        match = await cache.match("Tech recruiter")
+
+    assert match["html"] == "<div>Stored</div>"
+    assert match["buttons"] == [{"label": "More", "prompt": "Tell me more"}]
+    assert match["archetype"] == "Recruiter"
+
+
+@pytest.mark.asyncio
+async def test_match_below_threshold_misses():
+    cache = ArchetypeWarmCache(mock_handler(), archetypes=["Recruiter"], threshold=0.85, enabled=True)
+    cache._entries = {"Recruiter": {
+        "embedding": unit(1.0), "html": "h", "block_summary": "s", "experience_ids": [], "buttons": []
+    }}
+
+    with patch.object(cache, "_embed", new_callable=AsyncMock, return_value=unit(0.0, 1.0)):
+        assert await cache.match("Game developer") is None
+
+    assert cache.get_stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_replay_uses_stored_buttons():
+    from ai.generation import generation_handler
+
+    block = {"html": "h", "experience_ids": ["1"], "block_summary": "s", "buttons": [{"label": "A", "prompt": "B"}]}
+    with patch.object(generation_handler, "generate_buttons", new_callable=AsyncMock) as mock_buttons:
+        events = [e async for e in generation_handler.replay_block_and_buttons(block, "Recruiter", None, [])]
+
+    mock_buttons.assert_not_awaited()
+    assert events == [("html", "h"), ("experience_ids", ["1"]), ("buttons", [{"label": "A", "prompt": "B"}]), ("block_summary", "s")]
+
+
+def test_refresh_is_noop_until_started():
+    cache = ArchetypeWarmCache(mock_handler(), archetypes=["Recruiter"], enabled=True)
+    cache.refresh()
+    assert cache._task is None
@@ -0,0 +1,99 @@
+"""Unit tests for the semantic block cache."""
+
+import numpy as np
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from ai.block_cache import SemanticBlockCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def unit(*values):
+    v = np.zeros(8, dtype=np.float32)
+    v[:len(values)] = values
+    return v / np.linalg.norm(v)
+
+
+BLOCK = {"html": "<p>cached</p>", "block_summary": "Summary", "experience_ids": ["a", "b"]}
+
+
+class TestSemanticBlockCache:
+    """Tests for SemanticBlockCache lookup and eviction."""
+
+    def test_similar_key_with_same_experiences_hits(self):
+        cache = SemanticBlockCache(enabled=True, threshold=0.95)
+        cache.store(unit(1.0, 0.1), ["a", "b"], BLOCK, generation_seconds=4.0, estimated_tokens=1000)
+
+        assert cache.lookup(unit(1.0, 0.12), ["b", "a"]) == BLOCK
+        stats = cache.get_stats()
+        assert stats["hits"] == 1
+        assert stats["latency_saved_seconds"] == 4.0
+        assert stats["estimated_tokens_saved"] == 1000
+
+    def test_dissimilar_key_misses(self):
+        cache = SemanticBlockCache(enabled=True, threshold=0.95)
+        cache.store(unit(1.0, 0.0), ["a", "b"], BLOCK, 4.0, 1000)
+        assert cache.lookup(unit(0.0, 1.0), ["a", "b"]) is None
+        assert cache.get_stats()["misses"] == 1
+
+    def test_different_experiences_miss(self):
+        cache = SemanticBlockCache(enabled=True, threshold=0.95)
+        cache.store(unit(1.0), ["a", "b"], BLOCK, 4.0, 1000)
+        assert cache.lookup(unit(1.0), ["a", "c"]) is None
+
+    def test_lru_eviction(self):
+        cache = SemanticBlockCache(enabled=True, max_entries=2)
+        cache.store(unit(1.0), ["a"], {"html": "a"}, 1.0, 1)
+        cache.store(unit(0.0, 1.0), ["b"], {"html": "b"}, 1.0, 1)
+        cache.lookup(unit(1.0), ["a"])
+        cache.store(unit(0.0, 0.0, 1.0), ["c"], {"html": "c"}, 1.0, 1)
+
+        assert cache.lookup(unit(0.0, 1.0), ["b"]) is None
+        assert cache.lookup(unit(1.0), ["a"]) == {"html": "a"}
+        assert cache.get_stats()["evictions"] == 1
+
+    def test_ttl_and_clear(self):
+        clock = FakeClock()
+        cache = SemanticBlockCache(enabled=True, ttl_seconds=10, clock=clock)
+        cache.store(unit(1.0), ["a"], BLOCK, 1.0, 1)
+        clock.now = 11
+        assert cache.lookup(unit(1.0), ["a"]) is None
+
+        cache.store(unit(1.0), ["a"], BLOCK, 1.0, 1)
+        cache.clear()
+        assert cache.get_stats()["entries"] == 0
+
+    def test_disabled_cache_never_stores(self):
+        cache = SemanticBlockCache(enabled=False)
+        cache.store(unit(1.0), ["a"], BLOCK, 1.0, 1)
+        assert cache.lookup(unit(1.0), ["a"]) is None
+
+
+@pytest.mark.asyncio
+async def test_generate_block_serves_second_request_from_cache():
+    from ai.generation import generation_handler
+
+    cache = SemanticBlockCache(enabled=True)
+    experiences = [{"id": "1", "title": "T", "skills": [], "content": "c"}]
+
+    with patch("ai.generation.block_cache", cache), \
+         patch.object(cache, "key_embedding", new_callable=AsyncMock, return_value=unit(1.0)), \
+         patch("ai.generation.search_similar_experiences", new_callable=AsyncMock, return_value=experiences), \
+         patch.object(generation_handler.llm, "llm_call", new_callable=AsyncMock, return_value="<div>Hi</div>") as mock_call:
+
+        kwargs = dict(visitor_summary="Recruiter", action_type="initial_load", action_value="Recruiter", context=None)
+        first = await generation_handler.generate_block(**kwargs, use_cache=True)
+        second = await generation_handler.generate_block(**kwargs, use_cache=True)
+        # regenerate bypasses the cache
+        await generation_handler.generate_block(**kwargs, use_cache=False)
+
+    assert second == first
+    assert mock_call.await_count == 2
+    assert cache.get_stats()["hits"] == 1
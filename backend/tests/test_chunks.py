@@ -0,0 +1,151 @@
+"""Unit tests for section-level chunking and token-budgeted passage retrieval."""
+
+import numpy as np
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import seed
+from chunks import chunk_markdown, select_passages, chunk_embedding_text
+from rag import search_similar_experiences, format_rag_results, _attach_passages
+from vector_index import VectorIndex
+from ai.tokens import count_tokens
+
+BODY = """**Dates:** 2020 - 2022
+**Skills:** Proxmox, Kubernetes
+
+Ran the homelab.
+
+## Key Achievements
+
+**Virtualization:**
+- Built a Proxmox cluster
+- Migrated VMs
+
+**Containers:** Ran Kubernetes at home
+- Wrote Helm charts
+
+## Setup
+
+```bash
+# not a heading
+make install
+```
+"""
+
+
+def test_chunks_split_on_headings_and_bullet_groups():
+    chunks = chunk_markdown({"title": "Homelab", "content": BODY})
+
+    assert [c["heading"] for c in chunks] == [
+        "Overview",
+        "Key Achievements / Virtualization",
+        "Key Achievements / Containers",
+        "Setup",
+    ]
+    assert chunks[0]["content"].startswith("**Dates:** 2020 - 2022")
+    assert chunks[2]["content"] == "Ran Kubernetes at home\n- Wrote Helm charts"
+    assert "# not a heading" in chunks[3]["content"]
+
+
+def test_oversized_chunk_is_split_under_the_limit():
+    body = "## Notes\n" + "\n".join(f"- bullet number {i} about infrastructure work" for i in range(200))
+    with patch("chunks.CHUNK_MAX_TOKENS", 100):
+        chunks = chunk_markdown({"title": "T", "content": body})
+
+    assert len(chunks) > 1
+    assert all(c["heading"] == "Notes" for c in chunks)
+    assert all(count_tokens(c["content"]) <= 100 for c in chunks)
+
+
+def passage(experience_id, position, similarity, words=10):
+    return {
+        "experience_id": experience_id, "position": position, "heading": "H",
+        "content": " ".join(["word"] * words), "similarity": similarity
+    }
+
+
+def test_select_passages_covers_each_experience_then_fills_by_similarity():
+    chunks = [
+        passage("a", 0, 0.9), passage("a", 1, 0.8), passage("a", 2, 0.2),
+        passage("b", 0, 0.3), passage("b", 1, 0.5),
+    ]
+    # Each passage costs 11 tokens: room for four
+    selected = select_passages(["a", "b", "c"], chunks, token_budget=44)
+
+    assert [p["position"] for p in selected["a"]] == [0, 1]
+    assert [p["position"] for p in selected["b"]] == [0, 1]
+    assert "c" not in selected
+
+    assert select_passages(["a", "b"], chunks, token_budget=11) == {"a": [chunks[0]], "b": []}
+
+
+@pytest.mark.asyncio
+async def test_sync_chunks_reuses_stored_embeddings(mock_db):
+    item = {"title": "Homelab", "content": BODY}
+    chunks = chunk_markdown(item)
+    stored_key = seed.embedding_key(chunk_embedding_text(item, chunks[0]))
+
+    pool, conn = mock_db
+    conn.fetch.side_effect = lambda sql, *args: (
+        [{"embedding_key": stored_key, "embedding": np.ones(3, dtype=np.float32)}]
+        if "document_embeddings" in sql else [{"id": "exp-1", "title": "Homelab", "content": BODY}]
+    )
+
+    with patch.object(seed.llm_handler, "generate_embeddings", new_callable=AsyncMock,
+                      side_effect=lambda texts: [[0.1] * 3 for _ in texts]) as mock_embed:
+        written = await seed.sync_chunks(pool)
+
+    assert written == len(chunks)
+    assert len(mock_embed.await_args.args[0]) == len(chunks) - 1
+    rows = next(c.args[1] for c in conn.executemany.await_args_list if "experience_chunks" in c.args[0])
+    assert [(r[0], r[1], r[2]) for r in rows] == [("exp-1", i, c["heading"]) for i, c in enumerate(chunks)]
+
+
+@pytest.mark.asyncio
+async def test_prompt_carries_selected_passages_instead_of_full_content(mock_db):
+    rows = [{"id": "a", "title": "Homelab", "content": BODY, "skills": ["Proxmox"], "metadata": "{}",
+             "similarity": 0.9, "score": 0.03}]
+    passages = [
+        {"experience_id": "a", "position": 1, "heading": "Key Achievements / Virtualization",
+         "content": "- Built a Proxmox cluster", "similarity": 0.8},
+        {"experience_id": "a", "position": 3, "heading": "Setup", "content": "make install", "similarity": 0.1},
+    ]
+
+    pool, conn = mock_db
+    conn.prepared.side_effect = lambda sql: MagicMock(fetch=AsyncMock(
+        return_value=passages if "experience_chunks" in sql else rows
+    ))
+
+    with patch("rag.get_db_pool", new_callable=AsyncMock, return_value=pool), \
+         patch("rag.RAG_RETRIEVAL_MODE", "hybrid"), \
+         patch("rag.RAG_PASSAGE_TOKEN_BUDGET", 15), \
+         patch("rag.vector_index", VectorIndex()), \
+         patch("ai.llm.llm_handler.generate_embedding", new_callable=AsyncMock, return_value=[0.1] * 768):
+        results = await search_similar_experiences("Proxmox", limit=1)
+
+    # The best passage uses the whole budget, so the weaker one is left out
+    assert [p["position"] for p in results[0]["passages"]] == [1]
+    formatted = await format_rag_results(results)
+    assert "[Key Achievements / Virtualization]\n- Built a Proxmox cluster" in formatted
+    assert "Ran the homelab." not in formatted
+
+
+@pytest.mark.asyncio
+async def test_experience_without_a_fitting_passage_is_dropped(mock_db):
+    results = [{"id": "a", "title": "A", "content": "c", "skills": []},
+               {"id": "b", "title": "B", "content": "c", "skills": []},
+               {"id": "c", "title": "Not chunked yet", "content": "c", "skills": []}]
+    chunks = [
+        {"experience_id": "a", "position": 0, "heading": "Overview", "content": "word " * 10, "similarity": 0.9},
+        {"experience_id": "b", "position": 0, "heading": "Overview", "content": "word " * 10, "similarity": 0.8},
+    ]
+    pool, conn = mock_db
+    conn.prepared.return_value.fetch.return_value = chunks
+
+    with patch("rag.get_db_pool", new_callable=AsyncMock, return_value=pool), \
+         patch("rag.RAG_PASSAGE_TOKEN_BUDGET", 15):
+        kept = await _attach_passages(results, [0.1] * 768)
+
+    # b's only passage doesn't fit after a's; c keeps its full content
+    assert [r["id"] for r in kept] == ["a", "c"]
+    assert "passages" not in kept[1]
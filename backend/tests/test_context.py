@@ -0,0 +1,73 @@
+"""Unit tests for token-budgeted context packing."""
+
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from ai.context import ContextPacker
+from ai.tokens import count_tokens, truncate_tokens
+from models import CompressedContext
+
+
+def packer(**budgets):
+    return ContextPacker({"visitor_summary": 250, "user_input": 200, "block_summaries": 400,
+                          "rag_results": 2500, "history": 1500, "html": 3000, **budgets})
+
+
+def test_truncate_tokens_fits_budget():
+    text = "Led a team of engineers building distributed systems at scale."
+    assert truncate_tokens(text, 100) == text
+    truncated = truncate_tokens(text, 5)
+    assert text.startswith(truncated)
+    assert count_tokens(truncated) <= 5 < count_tokens(text)
+
+
+class TestContextPacker:
+    """Tests for ContextPacker section budgets."""
+
+    def test_pack_text_truncates_and_counts(self):
+        p = packer(visitor_summary=5)
+        assert p.pack_text("visitor_summary", "A recruiter") == "A recruiter"
+        assert p.pack_text("visitor_summary", "A recruiter hiring backend engineers") == "A recruiter hiring"
+        assert p.get_stats()["truncated"] == {"visitor_summary": 1}
+
+    def test_unscored_items_keep_most_recent_run(self):
+        p = packer(history=7)
+        items = ["one two three", "four", "five six", "seven eight"]
+        assert p.pack_items("history", items) == [2, 3]
+        assert p.get_stats()["dropped"] == {"history": 2}
+
+    def test_scored_items_drop_lowest_scores(self):
+        p = packer(rag_results=6)
+        items = ["alpha beta", "gamma delta", "epsilon zeta"]
+        assert p.pack_items("rag_results", items, scores=[0.9, 0.1, 0.5], separator_tokens=0) == [0, 2]
+
+    def test_record_aggregates_per_template(self):
+        p = packer()
+        sizes = p.record("block", {"visitor_summary": "A recruiter", "rag_results": "Title: X"})
+        p.record("block", {"visitor_summary": "", "rag_results": ""})
+
+        assert sizes == {"visitor_summary": 3, "rag_results": 3, "total": 6}
+        assert p.get_stats()["templates"]["block"] == {"prompts": 2, "avg_tokens": 3.0, "max_tokens": 6}
+
+
+@pytest.mark.asyncio
+async def test_block_prompt_stays_within_budgets_as_session_grows():
+    from ai.generation import generation_handler
+
+    experiences = [
+        {"id": str(i), "title": f"Job {i}", "skills": [], "content": "word " * 400, "similarity": 1 - i / 10}
+        for i in range(5)
+    ]
+    context = CompressedContext(block_summaries=[f"Block {i} covered backend work" for i in range(200)])
+    p = packer(rag_results=1000)
+
+    with patch("ai.generation.context_packer", p), \
+         patch("ai.generation.search_similar_experiences", new_callable=AsyncMock, return_value=experiences):
+        prompt, experience_ids, titles = await generation_handler._prepare_block(
+            "Recruiter", "Tell me about backend work", context
+        )
+
+    assert experience_ids == ["0", "1"] and titles == ["Job 0", "Job 1"]
+    assert "Block 199 covered" in prompt and "Block 0 covered" not in prompt
+    block = p.get_stats()["templates"]["block"]
+    assert block["max_tokens"] <= 250 + 200 + 400 + 1000
@@ -0,0 +1,41 @@
+"""Unit tests for the binary pgvector codec and per-connection prepared statements."""
+
+import numpy as np
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+from db import Connection, encode_vector, decode_vector, _init_connection
+
+
+def test_vector_codec_round_trip():
+    vector = np.linspace(-1, 1, 768, dtype=np.float32)
+    data = encode_vector(vector.tolist())
+
+    # 4-byte header (dim, unused) followed by big-endian float32
+    assert len(data) == 4 + 4 * 768
+    assert data[:4] == (768).to_bytes(2, "big") + b"\0\0"
+    decoded = decode_vector(data)
+    assert decoded.dtype == np.float32
+    np.testing.assert_array_equal(decoded, vector)
+
+
+@pytest.mark.asyncio
+async def test_init_registers_binary_codec_and_tolerates_missing_extension():
+    conn = MagicMock()
+    conn.set_type_codec = AsyncMock()
+    await _init_connection(conn)
+    assert conn.set_type_codec.await_args.kwargs["format"] == "binary"
+
+    conn.set_type_codec = AsyncMock(side_effect=ValueError("unknown type: public.vector"))
+    await _init_connection(conn)
+
+
+@pytest.mark.asyncio
+async def test_prepared_statements_are_cached_per_connection():
+    first, second = (SimpleNamespace(prepare=AsyncMock(side_effect=lambda query: object())) for _ in range(2))
+
+    statement = await Connection.prepared(first, "SELECT 1")
+    assert await Connection.prepared(first, "SELECT 1") is statement
+    assert await Connection.prepared(second, "SELECT 1") is not statement
+    first.prepare.assert_awaited_once()
@@ -0,0 +1,125 @@
+"""Unit tests for the two-tier query embedding cache."""
+
+import numpy as np
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from embedding_cache import EmbeddingCache, cache_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_key_normalizes_whitespace_and_case():
+    assert cache_key("  Tell me   about\nyou ", "retrieval_query") == cache_key("tell me about you", "retrieval_query")
+    assert cache_key("q", "retrieval_query") != cache_key("q", "retrieval_document")
+
+
+class TestMemoryTier:
+    """Tests for the in-process LRU tier."""
+
+    @pytest.mark.asyncio
+    async def test_hit_after_put(self):
+        cache = EmbeddingCache(persistent=False)
+        assert await cache.get("q", "retrieval_query") is None
+        cache.put("q", "retrieval_query", [1.0])
+        assert await cache.get("Q ", "retrieval_query") == [1.0]
+        stats = cache.get_stats()
+        assert stats["memory_hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    @pytest.mark.asyncio
+    async def test_lru_eviction(self):
+        cache = EmbeddingCache(max_entries=2, persistent=False)
+        cache.put("a", "t", [1.0])
+        cache.put("b", "t", [2.0])
+        await cache.get("a", "t")
+        cache.put("c", "t", [3.0])
+
+        assert await cache.get("b", "t") is None
+        assert await cache.get("a", "t") == [1.0]
+        assert cache.get_stats()["evictions"] == 1
+
+    @pytest.mark.asyncio
+    async def test_ttl_expiry(self):
+        clock = FakeClock()
+        cache = EmbeddingCache(ttl_seconds=10, persistent=False, clock=clock)
+        cache.put("a", "t", [1.0])
+        clock.now = 11
+        assert await cache.get("a", "t") is None
+
+
+class TestPostgresTier:
+    """Tests for the persistent Postgres tier."""
+
+    @pytest.mark.asyncio
+    async def test_db_hit_is_promoted_to_memory(self, mock_db):
+        cache = EmbeddingCache(persistent=True)
+        pool, conn = mock_db
+        conn.fetchval.return_value = np.array([0.5, 0.25], dtype=np.float32)
+
+        with patch("embedding_cache.get_db_pool", new_callable=AsyncMock, return_value=pool):
+            assert await cache.get("q", "retrieval_query") == [0.5, 0.25]
+            assert await cache.get("q", "retrieval_query") == [0.5, 0.25]
+
+        conn.fetchval.assert_awaited_once()
+        stats = cache.get_stats()
+        assert stats["db_hits"] == 1
+        assert stats["memory_hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_db_error_is_a_miss(self):
+        cache = EmbeddingCache(persistent=True)
+        with patch("embedding_cache.get_db_pool", new_callable=AsyncMock, side_effect=OSError("down")):
+            assert await cache.get("q", "retrieval_query") is None
+        stats = cache.get_stats()
+        assert stats["misses"] == 1
+        assert stats["db_errors"] == 1
+
+    @pytest.mark.asyncio
+    async def test_unexpected_row_is_a_miss(self, mock_db):
+        cache = EmbeddingCache(persistent=True)
+        pool, conn = mock_db
+        conn.fetchval.return_value = "[0.5,0.25]"
+
+        with patch("embedding_cache.get_db_pool", new_callable=AsyncMock, return_value=pool):
+            assert await cache.get("q", "retrieval_query") is None
+        assert cache.get_stats()["db_errors"] == 1
+
+    @pytest.mark.asyncio
+    async def test_put_writes_through_in_background(self, mock_db):
+        cache = EmbeddingCache(persistent=True)
+        pool, conn = mock_db
+
+        with patch("embedding_cache.get_db_pool", new_callable=AsyncMock, return_value=pool):
+            cache.put("q", "retrieval_query", [1.0, 2.0])
+            await asyncio.gather(*cache._writes)
+
+        args = conn.execute.await_args.args
+        assert "INSERT INTO query_embedding_cache" in args[0]
+        assert args[1] == cache_key("q", "retrieval_query")
+        assert args[4] == [1.0, 2.0]
+
+
+@pytest.mark.asyncio
+async def test_rag_skips_embedding_call_on_cache_hit(mock_db):
+    from rag import search_similar_experiences
+    from vector_index import VectorIndex
+
+    index = VectorIndex()
+    with patch("rag.vector_index", index), \
+         patch("rag.get_db_pool", new_callable=AsyncMock, return_value=mock_db[0]), \
+         patch("ai.llm.llm_handler.generate_embedding", new_callable=AsyncMock) as mock_embed:
+        mock_embed.return_value = [0.1] * 768
+
+        await search_similar_experiences("Tell me about your professional experience")
+        await search_similar_experiences("tell me about your professional experience")
+
+    mock_embed.assert_awaited_once()
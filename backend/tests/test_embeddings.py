@@ -0,0 +1,130 @@
+"""Unit tests for batch embedding generation and the query micro-batcher."""
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from ai.embeddings import EmbeddingBatcher
+from ai.llm import LLMHandler
+from ai.resilience import Deadline, DeadlineExceeded
+
+
+def fake_llm():
+    llm = MagicMock()
+    llm.generate_embedding = AsyncMock(side_effect=lambda text, **kwargs: [float(len(text))])
+    llm.generate_embeddings = AsyncMock(side_effect=lambda texts, **kwargs: [[float(len(t))] for t in texts])
+    return llm
+
+
+class TestGenerateEmbeddings:
+    """Tests for LLMHandler.generate_embeddings."""
+
+    @pytest.mark.asyncio
+    async def test_one_call_per_batch_in_input_order(self):
+        with patch("ai.llm.CEREBRAS_API_KEY", None), patch("ai.llm.GEMINI_API_KEY", None):
+            handler = LLMHandler()
+        handler.gemini_configured = True
+
+        async def fake_embed(model, content, **kwargs):
+            return {"embedding": [[float(int(t))] for t in content]}
+
+        texts = [str(i) for i in range(5)]
+        with patch("ai.llm.EMBEDDING_BATCH_SIZE", 2), \
+             patch("ai.llm.genai.embed_content_async", side_effect=fake_embed) as mock_embed:
+            result = await handler.generate_embeddings(texts)
+
+        assert result == [[0.0], [1.0], [2.0], [3.0], [4.0]]
+        assert mock_embed.await_count == 3
+        assert [c.kwargs["content"] for c in mock_embed.await_args_list] == [["0", "1"], ["2", "3"], ["4"]]
+
+    @pytest.mark.asyncio
+    async def test_empty_input_makes_no_call(self):
+        with patch("ai.llm.CEREBRAS_API_KEY", None), patch("ai.llm.GEMINI_API_KEY", None):
+            handler = LLMHandler()
+        handler.gemini_configured = True
+
+        with patch("ai.llm.genai.embed_content_async", new_callable=AsyncMock) as mock_embed:
+            assert await handler.generate_embeddings([]) == []
+        mock_embed.assert_not_awaited()
+
+
+class TestEmbeddingBatcher:
+    """Tests for EmbeddingBatcher."""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_queries_share_one_call(self):
+        llm = fake_llm()
+        batcher = EmbeddingBatcher(llm, window_ms=20)
+
+        results = await asyncio.gather(*(batcher.embed(t) for t in ["a", "bb", "ccc"]))
+
+        assert results == [[1.0], [2.0], [3.0]]
+        llm.generate_embeddings.assert_awaited_once()
+        assert llm.generate_embeddings.await_args.args[0] == ["a", "bb", "ccc"]
+        stats = batcher.get_stats()
+        assert stats["batches"] == 1
+        assert stats["max_batch_size"] == 3
+        assert stats["avg_batch_size"] == 3.0
+        assert stats["max_queue_wait_ms"] > 0
+
+    @pytest.mark.asyncio
+    async def test_single_query_uses_single_endpoint(self):
+        llm = fake_llm()
+        batcher = EmbeddingBatcher(llm, window_ms=1)
+
+        assert await batcher.embed("abcd", task_type="retrieval_query") == [4.0]
+        llm.generate_embedding.assert_awaited_once_with("abcd", task_type="retrieval_query", deadline=None)
+        llm.generate_embeddings.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_full_batch_flushes_before_window(self):
+        llm = fake_llm()
+        batcher = EmbeddingBatcher(llm, window_ms=10_000, max_batch=2)
+
+        results = await asyncio.wait_for(asyncio.gather(batcher.embed("a"), batcher.embed("bb")), timeout=1)
+        assert results == [[1.0], [2.0]]
+
+    @pytest.mark.asyncio
+    async def test_zero_window_disables_batching(self):
+        llm = fake_llm()
+        batcher = EmbeddingBatcher(llm, window_ms=0)
+
+        await asyncio.gather(batcher.embed("a"), batcher.embed("b"))
+        assert llm.generate_embedding.await_count == 2
+        assert batcher.get_stats()["batches"] == 0
+
+    @pytest.mark.asyncio
+    async def test_error_reaches_every_caller(self):
+        llm = fake_llm()
+        llm.generate_embeddings.side_effect = Exception("quota")
+        batcher = EmbeddingBatcher(llm, window_ms=5)
+
+        results = await asyncio.gather(batcher.embed("a"), batcher.embed("b"), return_exceptions=True)
+        assert all(isinstance(r, Exception) and str(r) == "quota" for r in results)
+
+    @pytest.mark.asyncio
+    async def test_batch_uses_latest_caller_deadline(self):
+        llm = fake_llm()
+        batcher = EmbeddingBatcher(llm, window_ms=5)
+        short, long = Deadline(1), Deadline(5)
+
+        await asyncio.gather(batcher.embed("a", deadline=short), batcher.embed("b", deadline=long))
+        assert llm.generate_embeddings.await_args.kwargs["deadline"] is long
+
+    @pytest.mark.asyncio
+    async def test_caller_timeout_does_not_cancel_batch(self):
+        llm = fake_llm()
+
+        async def slow(texts, **kwargs):
+            await asyncio.sleep(0.1)
+            return [[1.0] for _ in texts]
+
+        llm.generate_embeddings.side_effect = slow
+        batcher = EmbeddingBatcher(llm, window_ms=5)
+
+        impatient = batcher.embed("a", deadline=Deadline(0.02))
+        patient = batcher.embed("b")
+        results = await asyncio.gather(impatient, patient, return_exceptions=True)
+
+        assert isinstance(results[0], DeadlineExceeded)
+        assert results[1] == [1.0]
@@ -0,0 +1,65 @@
+"""Unit tests for cache-friendly prompt assembly."""
+
+from types import SimpleNamespace
+
+from ai.llm import _record_cerebras_usage, _record_gemini_usage
+from ai.prompt_assembly import PromptAssembler, prompt_assembler
+
+
+VISITOR_A = {"visitor_summary": "A recruiter", "user_input": "AI work", "block_summaries": "No prior blocks",
+             "rag_results": "Title: X\n---\n", "html": "<div>Hi</div>"}
+VISITOR_B = {"visitor_summary": "A founder", "user_input": "Infra", "block_summaries": "- Covered AI work",
+             "rag_results": "Title: Y\n---\n", "html": "<section>Other</section>"}
+
+
+def test_static_prefix_is_identical_across_visitors():
+    for name, guidance in (("block", "HTML Instructions"), ("buttons", "Return ONLY the JSON object"),
+                           ("summary", "Examples:")):
+        template = prompt_assembler.templates[name]
+        first = template.render(**VISITOR_A)
+        second = template.render(**VISITOR_B)
+        assert first.startswith(template.prefix) and second.startswith(template.prefix)
+        # All static guidance sits ahead of the first variable section
+        assert guidance in template.prefix
+        assert first != second
+
+
+def test_fingerprint_changes_only_with_static_text():
+    a = PromptAssembler().register("t", "Static guidance.\n\nQUERY: {q}")
+    b = PromptAssembler().register("t", "Static guidance.\n\nQUERY: {q}\nMORE: {m}")
+    c = PromptAssembler().register("t", "Other guidance.\n\nQUERY: {q}")
+    assert a.fingerprint == b.fingerprint != c.fingerprint
+
+
+def test_usage_is_attributed_to_the_matching_template():
+    assembler = PromptAssembler()
+    assembler.register("block", "Block guidance.\n\nQUERY: {q}")
+    assembler.register("buttons", "Button guidance.\n\nQUERY: {q}")
+
+    assembler.record_usage(assembler.render("block", q="one"), 1000, 800)
+    assembler.record_usage(assembler.render("block", q="two"), 1000, 0)
+    assembler.record_usage("ad hoc system prompt", 50, None)
+    assembler.record_usage(assembler.render("buttons", q="x"), None, None)
+
+    stats = assembler.get_stats()
+    assert stats["block"]["calls"] == 2 and stats["block"]["cached_tokens"] == 800
+    assert stats["block"]["cached_ratio"] == 0.4
+    assert stats["buttons"]["calls"] == 0
+    assert stats["other"]["prompt_tokens"] == 50 and stats["other"]["fingerprint"] is None
+
+
+def test_provider_usage_shapes_are_recorded(monkeypatch):
+    assembler = PromptAssembler()
+    assembler.register("block", "Block guidance.\n\nQUERY: {q}")
+    monkeypatch.setattr("ai.llm.prompt_assembler", assembler)
+    system_prompt = assembler.render("block", q="x")
+
+    _record_cerebras_usage(system_prompt, SimpleNamespace(
+        prompt_tokens=900, prompt_tokens_details=SimpleNamespace(cached_tokens=768)))
+    _record_cerebras_usage(system_prompt, SimpleNamespace(prompt_tokens=900, prompt_tokens_details=None))
+    _record_gemini_usage(system_prompt, SimpleNamespace(prompt_token_count=1000, cached_content_token_count=512))
+    _record_cerebras_usage(system_prompt, None)
+
+    stats = assembler.get_stats()["block"]
+    assert stats["calls"] == 3
+    assert stats["prompt_tokens"] == 2800 and stats["cached_tokens"] == 1280
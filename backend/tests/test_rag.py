@@ -1,7 +1,9 @@
 import pytest
-from unittest.mock import MagicMock, AsyncMock, patch
+from unittest.mock import AsyncMock, patch
 import json
-from rag import search_similar_experiences, format_rag_results, apply_diversity_scoring
+import numpy as np
+from rag import search_similar_experiences, format_rag_results, apply_diversity_scoring, rrf_fuse
+from vector_index import VectorIndex, EMBEDDING_DIM
 
 @pytest.mark.asyncio
 async def test_apply_diversity_scoring():
@@ -26,7 +28,7 @@ async def test_apply_diversity_scoring():
     assert new_results[2]["similarity"] == 0.45
 
 @pytest.mark.asyncio
-async def test_search_similar_experiences():
+async def test_search_similar_experiences(mock_db):
     # Mock data
     query = "test query"
     mock_embedding = [0.1, 0.2, 0.3]
@@ -43,31 +45,34 @@ async def test_search_similar_experiences():
 
     # Mock dependencies
     with patch("rag.get_db_pool", new_callable=AsyncMock) as mock_get_pool, \
+         patch("rag.RAG_RETRIEVAL_MODE", "vector"), \
+         patch("rag.CHUNKS_ENABLED", False), \
          patch("ai.llm.llm_handler.generate_embedding", new_callable=AsyncMock) as mock_gen_embedding:
         
         mock_gen_embedding.return_value = mock_embedding
         
-        mock_pool = MagicMock()
-        mock_conn = AsyncMock()
-        mock_pool.acquire.return_value.__aenter__.return_value = mock_conn
+        mock_pool, mock_conn = mock_db
         mock_get_pool.return_value = mock_pool
         
-        mock_conn.fetch.return_value = mock_rows
+        mock_conn.prepared.return_value.fetch.return_value = mock_rows
 
         # Run function
         results = await search_similar_experiences(query)
 
         # Assertions
-        mock_gen_embedding.assert_awaited_once_with(query, task_type="retrieval_query")
+        mock_gen_embedding.assert_awaited_once_with(query, task_type="retrieval_query", deadline=None)
         mock_get_pool.assert_awaited_once()
-        mock_conn.fetch.assert_awaited_once()
+        mock_conn.prepared.assert_awaited_once()
+        search_args = mock_conn.prepared.return_value.fetch.await_args.args
+        # The query vector is passed as a float32 array for the binary codec
+        assert search_args[0].dtype == np.float32
         
         # Check results
         assert len(results) == 1
         assert results[0]["title"] == "Test Experience"
 
 @pytest.mark.asyncio
-async def test_search_similar_experiences_with_diversity():
+async def test_search_similar_experiences_with_diversity(mock_db):
     # Mock data
     query = "test query"
     mock_embedding = [0.1] * 768
@@ -77,14 +82,14 @@ async def test_search_similar_experiences_with_diversity():
     ]
 
     with patch("rag.get_db_pool", new_callable=AsyncMock) as mock_get_pool, \
+         patch("rag.RAG_RETRIEVAL_MODE", "vector"), \
+         patch("rag.CHUNKS_ENABLED", False), \
          patch("ai.llm.llm_handler.generate_embedding", new_callable=AsyncMock) as mock_gen_embedding:
         
         mock_gen_embedding.return_value = mock_embedding
-        mock_pool = MagicMock()
-        mock_conn = AsyncMock()
-        mock_pool.acquire.return_value.__aenter__.return_value = mock_conn
+        mock_pool, mock_conn = mock_db
         mock_get_pool.return_value = mock_pool
-        mock_conn.fetch.return_value = mock_rows
+        mock_conn.prepared.return_value.fetch.return_value = mock_rows
 
         # 1. Test without shown_ids (default)
         results = await search_similar_experiences(query, limit=2)
@@ -127,4 +132,72 @@ async def test_format_rag_results():
     assert "Title: Job B" in formatted
     assert "Skills: N/A" in formatted
     assert "Content: Did other work."
-    assert "---\n" in formatted
\ No newline at end of file
+    assert "---\n" in formatted
+
+
+@pytest.mark.asyncio
+async def test_hybrid_search_fuses_in_one_query_and_penalizes_fused_score(mock_db):
+    mock_rows = [
+        {"id": "proxmox", "title": "Homelab", "content": "c", "skills": ["Proxmox"], "metadata": "{}", "similarity": 0.41, "score": 0.0328},
+        {"id": "infra", "title": "Infra", "content": "c", "skills": [], "metadata": "{}", "similarity": 0.62, "score": 0.0161}
+    ]
+
+    with patch("rag.get_db_pool", new_callable=AsyncMock) as mock_get_pool, \
+         patch("rag.RAG_RETRIEVAL_MODE", "hybrid"), \
+         patch("rag.CHUNKS_ENABLED", False), \
+         patch("rag.vector_index", VectorIndex()), \
+         patch("ai.llm.llm_handler.generate_embedding", new_callable=AsyncMock, return_value=[0.1] * 768):
+        mock_pool, mock_conn = mock_db
+        mock_get_pool.return_value = mock_pool
+        mock_conn.prepared.return_value.fetch.return_value = mock_rows
+
+        results = await search_similar_experiences("Proxmox", limit=2)
+        assert [r["id"] for r in results] == ["proxmox", "infra"]
+
+        sql = mock_conn.prepared.await_args.args[0]
+        assert "search_tsv @@" in sql and "<=>" in sql and "FULL OUTER JOIN" in sql
+        args = mock_conn.prepared.return_value.fetch.await_args.args
+        assert args[1] == "Proxmox"
+
+        # A shown lexical match drops below the next candidate on the fused score
+        results = await search_similar_experiences("Proxmox", limit=2, shown_counts={"proxmox": 2})
+        assert [r["id"] for r in results] == ["infra", "proxmox"]
+        assert results[1]["similarity"] == 0.41
+
+
+def test_rrf_fuse_sums_reciprocal_ranks():
+    scores = rrf_fuse([["a", "b"], ["b", "c"]], k=60)
+    assert scores["b"] == 1 / 62 + 1 / 61
+    assert scores["a"] == 1 / 61 and scores["c"] == 1 / 62
+
+
+@pytest.mark.asyncio
+async def test_hybrid_search_takes_cosine_leg_from_loaded_index(mock_db):
+    def unit(i):
+        v = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+        v[i] = 1.0
+        return v
+
+    index = VectorIndex()
+    records = [{"id": name, "title": name, "content": "c", "skills": [], "metadata": {}}
+               for name in ("infra", "ml", "proxmox")]
+    index.load(np.stack([unit(0), unit(0) * 0.6 + unit(1) * 0.8, unit(2)]), records)
+
+    with patch("rag.get_db_pool", new_callable=AsyncMock) as mock_get_pool, \
+         patch("rag.RAG_RETRIEVAL_MODE", "hybrid"), \
+         patch("rag.RAG_HYBRID_CANDIDATES", 2), \
+         patch("rag.CHUNKS_ENABLED", False), \
+         patch("rag.vector_index", index), \
+         patch("ai.llm.llm_handler.generate_embedding", new_callable=AsyncMock, return_value=unit(0).tolist()):
+        mock_pool, mock_conn = mock_db
+        mock_get_pool.return_value = mock_pool
+        mock_conn.prepared.return_value.fetch.return_value = [{"id": "proxmox"}, {"id": "infra"}]
+
+        results = await search_similar_experiences("Proxmox", limit=3)
+
+    sql = mock_conn.prepared.await_args.args[0]
+    assert "search_tsv @@" in sql and "<=>" not in sql
+    # infra ranks in both legs; proxmox is a lexical-only match outside the cosine candidates
+    assert [r["id"] for r in results] == ["infra", "proxmox", "ml"]
+    assert results[1]["similarity"] == 0.0
+    assert results[0]["score"] == 1 / 61 + 1 / 62
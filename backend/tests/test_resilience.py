@@ -0,0 +1,341 @@
+"""Unit tests for hedged requests, circuit breakers, retry budgets and deadlines."""
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from ai.llm import LLMHandler
+from ai.resilience import CircuitBreaker, CircuitState, Deadline, DeadlineExceeded, LatencyTracker, RetryBudget
+
+
+@pytest.fixture
+def handler():
+    with patch("ai.llm.CEREBRAS_API_KEY", None), patch("ai.llm.GEMINI_API_KEY", None):
+        h = LLMHandler()
+    h.hedge_enabled = True
+    return h
+
+
+def delayed(value, delay, fail=False):
+    async def _call():
+        await asyncio.sleep(delay)
+        if fail:
+            raise Exception(value)
+        return value
+    return _call
+
+
+class TestLatencyTracker:
+    """Tests for LatencyTracker percentiles."""
+
+    def test_empty(self):
+        assert LatencyTracker().percentile(95) is None
+
+    def test_nearest_rank(self):
+        tracker = LatencyTracker()
+        for i in range(1, 101):
+            tracker.record(i / 100)
+        assert tracker.percentile(95) == 0.95
+        assert tracker.percentile(50) == 0.5
+
+    def test_window_is_bounded(self):
+        tracker = LatencyTracker(window=3)
+        for v in (10.0, 1.0, 2.0, 3.0):
+            tracker.record(v)
+        assert len(tracker) == 3
+        assert tracker.percentile(100) == 3.0
+
+
+class TestHedgedCall:
+    """Tests for LLMHandler hedging."""
+
+    @pytest.mark.asyncio
+    async def test_fast_primary_is_not_hedged(self, handler):
+        with patch("ai.llm.HEDGE_DEFAULT_DELAY_SECONDS", 0.2):
+            result = await handler.handle_fallback(
+                delayed("primary", 0.01), delayed("fallback", 0.01), model="m"
+            )
+        assert result == "primary"
+        stats = handler.get_hedge_stats()["m"]
+        assert stats["hedged"] == 0
+        assert stats["primary_wins"] == 1
+
+    @pytest.mark.asyncio
+    async def test_slow_primary_loses_to_fallback(self, handler):
+        cancelled = asyncio.Event()
+
+        async def slow_primary():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        with patch("ai.llm.HEDGE_DEFAULT_DELAY_SECONDS", 0.05):
+            result = await handler.handle_fallback(slow_primary, delayed("fallback", 0.01), model="m")
+            await asyncio.sleep(0)
+
+        assert result == "fallback"
+        assert cancelled.is_set()
+        stats = handler.get_hedge_stats()["m"]
+        assert stats["hedged"] == 1
+        assert stats["fallback_wins"] == 1
+        assert stats["hedge_rate"] == 1.0
+
+    @pytest.mark.asyncio
+    async def test_hedged_primary_can_still_win(self, handler):
+        with patch("ai.llm.HEDGE_DEFAULT_DELAY_SECONDS", 0.02):
+            result = await handler.handle_fallback(
+                delayed("primary", 0.05), delayed("fallback", 1.0), model="m"
+            )
+        assert result == "primary"
+        assert handler.get_hedge_stats()["m"]["primary_wins"] == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_racer_waits_for_other(self, handler):
+        with patch("ai.llm.HEDGE_DEFAULT_DELAY_SECONDS", 0.02):
+            result = await handler.handle_fallback(
+                delayed("primary", 0.1), delayed("boom", 0.0, fail=True), model="m"
+            )
+        assert result == "primary"
+
+    @pytest.mark.asyncio
+    async def test_both_fail_raises(self, handler):
+        with patch("ai.llm.HEDGE_DEFAULT_DELAY_SECONDS", 0.01):
+            with pytest.raises(Exception):
+                await handler.handle_fallback(
+                    delayed("p", 0.05, fail=True), delayed("f", 0.0, fail=True), model="m"
+                )
+
+    @pytest.mark.asyncio
+    async def test_primary_failure_before_hedge_falls_back(self, handler):
+        with patch("ai.llm.HEDGE_DEFAULT_DELAY_SECONDS", 1.0):
+            result = await handler.handle_fallback(
+                delayed("p", 0.0, fail=True), delayed("fallback", 0.0), model="m"
+            )
+        assert result == "fallback"
+        assert handler.get_hedge_stats()["m"]["hedged"] == 0
+
+    @pytest.mark.asyncio
+    async def test_delay_uses_percentile_after_min_samples(self, handler):
+        with patch("ai.llm.HEDGE_MIN_SAMPLES", 3), patch("ai.llm.HEDGE_PERCENTILE", 100):
+            for _ in range(3):
+                await handler.handle_fallback(delayed("p", 0.0), delayed("f", 0.0), model="m")
+            stats = handler.hedge_stats["m"]
+            stats.latency.record(0.9)
+            assert handler._hedge_delay(stats) == 0.9
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker:
+    """Tests for CircuitBreaker state transitions."""
+
+    def test_opens_after_threshold_within_window(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker("p:m", failure_threshold=3, window_seconds=10, clock=clock)
+        for _ in range(2):
+            breaker.record_failure()
+        assert breaker.state == CircuitState.CLOSED
+        breaker.record_failure()
+        assert breaker.state == CircuitState.OPEN
+        assert not breaker.allow_request()
+        assert breaker.rejected == 1
+
+    def test_old_failures_leave_the_window(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker("p:m", failure_threshold=2, window_seconds=10, clock=clock)
+        breaker.record_failure()
+        clock.now = 11
+        breaker.record_failure()
+        assert breaker.state == CircuitState.CLOSED
+
+    def test_half_open_allows_single_probe(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker("p:m", failure_threshold=1, reset_timeout=5, clock=clock)
+        breaker.record_failure()
+        clock.now = 5
+        assert breaker.state == CircuitState.HALF_OPEN
+        assert breaker.allow_request()
+        assert not breaker.allow_request()
+        breaker.record_success()
+        assert breaker.state == CircuitState.CLOSED
+        assert [t["to"] for t in breaker.transitions] == ["open", "half_open", "closed"]
+
+    def test_failed_probe_reopens(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker("p:m", failure_threshold=1, reset_timeout=5, clock=clock)
+        breaker.record_failure()
+        clock.now = 5
+        assert breaker.allow_request()
+        breaker.record_failure()
+        assert breaker.state == CircuitState.OPEN
+        clock.now = 9
+        assert not breaker.allow_request()
+
+
+class TestRetryBudget:
+    """Tests for RetryBudget."""
+
+    def test_budget_drains_and_refills(self):
+        clock = FakeClock()
+        budget = RetryBudget(ratio=0.5, refill_per_second=1.0, max_tokens=2, clock=clock)
+        assert budget.try_spend()
+        assert budget.try_spend()
+        assert not budget.try_spend()
+        budget.record_request()
+        budget.record_request()
+        assert budget.try_spend()
+        clock.now = 1
+        assert budget.try_spend()
+        assert budget.exhausted == 1
+
+
+class TestBreakerIntegration:
+    """Tests for breaker and budget use inside LLMHandler."""
+
+    @pytest.mark.asyncio
+    async def test_open_breaker_skips_straight_to_fallback(self, handler):
+        handler.hedge_enabled = False
+        calls = []
+
+        async def primary():
+            calls.append("primary")
+            raise Exception("down")
+
+        with patch("ai.llm.BASE_BACKOFF_SECONDS", 0), patch("ai.llm.BREAKER_FAILURE_THRESHOLD", 3):
+            handler.breakers.clear()
+
+            async def fallback():
+                return "fallback"
+
+            for _ in range(2):
+                result = await handler.handle_fallback(
+                    lambda: handler._call_with_retries("test", primary, "cerebras", "m", Deadline(10)),
+                    fallback
+                )
+                assert result == "fallback"
+
+        # First request used all 3 attempts and opened the breaker; the second made none
+        assert calls == ["primary"] * 3
+        assert handler.breakers["cerebras:m"].state == CircuitState.OPEN
+
+    @pytest.mark.asyncio
+    async def test_exhausted_budget_stops_retries(self, handler):
+        calls = []
+
+        async def primary():
+            calls.append("primary")
+            raise Exception("down")
+
+        handler.retry_budgets["cerebras"] = RetryBudget(ratio=0, refill_per_second=0, max_tokens=1)
+        with patch("ai.llm.BASE_BACKOFF_SECONDS", 0):
+            with pytest.raises(Exception):
+                await handler._call_with_retries("test", primary, "cerebras", "m2", Deadline(10))
+        assert calls == ["primary", "primary"]
+
+    def test_breakers_created_from_model_config(self, handler):
+        from ai.llm import MODEL_CONFIG
+        for config in MODEL_CONFIG.values():
+            assert f"cerebras:{config['main']}" in handler.breakers
+            assert f"gemini:{config['fallback']}" in handler.breakers
+
+
+    @pytest.mark.asyncio
+    async def test_gemini_fallback_uses_breaker_for_requested_size(self, handler):
+        from ai.llm import MODEL_CONFIG, ModelSize
+
+        handler.gemini_configured = True
+        large = MODEL_CONFIG[ModelSize.LARGE]["fallback"]
+        small = MODEL_CONFIG[ModelSize.SMALL]["fallback"]
+        with patch("ai.llm.BASE_BACKOFF_SECONDS", 0), \
+             patch("ai.llm.genai.GenerativeModel") as mock_model_class:
+            mock_model_class.return_value.generate_content_async = AsyncMock(side_effect=Exception("down"))
+            with pytest.raises(Exception, match="down"):
+                await handler._gemini_call("p", "s", ModelSize.LARGE, deadline=Deadline(10))
+
+        assert mock_model_class.call_args.kwargs["model_name"] == large
+        assert handler.breakers[f"gemini:{large}"].snapshot()["recent_failures"] > 0
+        assert handler.breakers[f"gemini:{small}"].snapshot()["recent_failures"] == 0
+
+class TestDeadline:
+    """Tests for Deadline and its enforcement in LLMHandler."""
+
+    def test_within_is_capped_by_parent(self):
+        clock = FakeClock()
+        parent = Deadline(5, clock=clock)
+        assert Deadline.within(30, parent).remaining() == 5
+        assert Deadline.within(2, parent).remaining() == 2
+        clock.now = 5
+        assert parent.expired
+        with pytest.raises(DeadlineExceeded):
+            parent.check("test")
+
+    @pytest.mark.asyncio
+    async def test_slow_attempt_is_bounded(self, handler):
+        async def hang():
+            await asyncio.sleep(10)
+
+        with pytest.raises(DeadlineExceeded):
+            await asyncio.wait_for(
+                handler._call_with_retries("test", hang, "cerebras", "slow", Deadline(0.05)),
+                timeout=1
+            )
+
+    @pytest.mark.asyncio
+    async def test_retry_skipped_when_backoff_exceeds_budget(self, handler):
+        calls = []
+
+        async def primary():
+            calls.append("primary")
+            raise Exception("down")
+
+        with patch("ai.llm.BASE_BACKOFF_SECONDS", 1.0):
+            with pytest.raises(Exception, match="down"):
+                await handler._call_with_retries("test", primary, "cerebras", "m3", Deadline(0.5))
+        assert calls == ["primary"]
+
+    @pytest.mark.asyncio
+    async def test_fallback_skipped_once_deadline_is_spent(self, handler):
+        handler.hedge_enabled = False
+        deadline = Deadline(0.05)
+        fallback = AsyncMock(return_value="fallback")
+
+        async def hang():
+            await asyncio.sleep(10)
+
+        with pytest.raises(DeadlineExceeded):
+            await handler.handle_fallback(
+                lambda: handler._call_with_retries("primary", hang, "cerebras", "m4", deadline),
+                lambda: handler._call_with_retries("fallback", fallback, "gemini", "m4", deadline)
+            )
+        fallback.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_caller_deadline_does_not_count_against_breaker(self, handler):
+        async def hang():
+            await asyncio.sleep(10)
+
+        with patch("ai.llm.BREAKER_FAILURE_THRESHOLD", 1):
+            handler.breakers.clear()
+            with pytest.raises(DeadlineExceeded):
+                await handler._call_with_retries("test", hang, "cerebras", "m5", Deadline(0.02))
+        assert handler.breakers["cerebras:m5"].state == CircuitState.CLOSED
+
+    @pytest.mark.asyncio
+    async def test_embedding_timeout_is_deadline_exceeded(self, handler):
+        async def hang(*args, **kwargs):
+            await asyncio.sleep(10)
+
+        handler.gemini_configured = True
+        with patch("ai.llm.genai.embed_content_async", side_effect=hang):
+            with pytest.raises(DeadlineExceeded):
+                await handler.generate_embedding("q", deadline=Deadline(0.02))
+            with pytest.raises(DeadlineExceeded):
+                await handler.generate_embeddings(["a", "b"], deadline=Deadline(0.02))
@@ -0,0 +1,105 @@
+"""Unit tests for the pipelined incremental seeder."""
+
+import pytest
+from unittest.mock import AsyncMock, patch
+
+import seed
+
+
+def write_md(tmp_path, name, title):
+    path = tmp_path / name
+    path.write_text(f"# {title}\n\n**Skills:** Python, SQL\n\nDid things.\n")
+    return str(path)
+
+
+def rows_by_table(existing_rows=(), stored_rows=()):
+    """conn.fetch side effect returning embedding-store rows or experience rows by table."""
+    return lambda sql, *args: list(stored_rows if "document_embeddings" in sql else existing_rows)
+
+
+@pytest.fixture
+def files(tmp_path):
+    return {
+        "jobs/a.md": (write_md(tmp_path, "a.md", "Job A"), "hash-a"),
+        "jobs/b.md": (write_md(tmp_path, "b.md", "Job B"), "hash-b2"),
+        "jobs/c.md": (write_md(tmp_path, "c.md", "Job C"), "hash-c"),
+    }
+
+
+@pytest.fixture
+def seeding(files, mock_db):
+    """Point seed_data() at the mock pool and files, with a fake embedding call."""
+    pool, conn = mock_db
+    with patch("seed.init_db", new_callable=AsyncMock), \
+         patch("seed.get_db_pool", new_callable=AsyncMock, return_value=pool), \
+         patch("seed.discover_data_files", return_value=files), \
+         patch.object(seed.llm_handler, "generate_embeddings", new_callable=AsyncMock,
+                      side_effect=lambda texts: [[0.1] * 3 for _ in texts]) as mock_embed:
+        yield conn, mock_embed
+
+
+@pytest.mark.asyncio
+async def test_seed_diffs_in_one_query_and_writes_in_one_transaction(seeding):
+    conn, mock_embed = seeding
+    conn.fetch.side_effect = rows_by_table([
+        {"source_file": "jobs/a.md", "id": "id-a", "content_hash": "hash-a"},
+        {"source_file": "jobs/b.md", "id": "id-b", "content_hash": "hash-b1"},
+    ])
+
+    with patch("seed.CHUNKS_ENABLED", False):
+        stats = await seed.seed_data()
+
+    assert (stats["new"], stats["updated"], stats["skipped"], stats["failed"]) == (1, 1, 1, 0)
+    hash_queries = [c for c in conn.fetch.await_args_list if "FROM experiences" in c.args[0]]
+    assert len(hash_queries) == 1
+    mock_embed.assert_awaited_once()
+    assert len(mock_embed.await_args.args[0]) == 2
+    conn.transaction.assert_called_once()
+
+    update_rows = next(c.args[1] for c in conn.executemany.await_args_list if "UPDATE experiences" in c.args[0])
+    insert_rows = next(c.args[1] for c in conn.executemany.await_args_list if "INSERT INTO experiences" in c.args[0])
+    assert update_rows[0][-1] == "id-b"
+    assert insert_rows[0][6] == "jobs/c.md"
+    assert set(stats["timings"]) >= {"discover", "diff", "parse", "embed", "write", "total"}
+
+
+@pytest.mark.asyncio
+async def test_failed_embedding_batch_only_fails_its_files(seeding):
+    _, mock_embed = seeding
+    calls = []
+
+    async def embed(texts):
+        calls.append(texts)
+        if len(calls) == 1:
+            raise Exception("quota")
+        return [[0.1] * 3 for _ in texts]
+
+    mock_embed.side_effect = embed
+    with patch("seed.EMBEDDING_BATCH_SIZE", 2):
+        stats = await seed.seed_data()
+
+    assert len(calls) == 2
+    assert stats["failed"] == 2
+    assert stats["new"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stored_embeddings_are_reused_after_reseed(files, seeding):
+    # Rows were wiped (e.g. reseed_db.sh), but the embedding store still has job A
+    conn, mock_embed = seeding
+    item = seed.parse_markdown_file(files["jobs/a.md"][0])
+    key = seed.embedding_key(seed.embedding_text(item))
+    conn.fetch.side_effect = rows_by_table(stored_rows=[{"embedding_key": key, "embedding": "[0.5,0.5,0.5]"}])
+
+    stats = await seed.seed_data()
+
+    assert stats["new"] == 3
+    assert stats["embeddings_reused"] == 1
+    assert len(mock_embed.await_args.args[0]) == 2
+
+    stored_rows = next(
+        c.args[1] for c in conn.executemany.await_args_list if "INSERT INTO document_embeddings" in c.args[0]
+    )
+    assert key not in {row[0] for row in stored_rows}
+    assert len(stored_rows) == 2
+    assert any("DELETE FROM document_embeddings" in c.args[0] for c in conn.execute.await_args_list)
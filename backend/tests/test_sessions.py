@@ -0,0 +1,193 @@
+"""Unit tests for the server-side visitor session store."""
+
+import json
+import asyncio
+from pathlib import Path
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from ai.speculation import next_context
+from models import CompressedContext
+from sessions import Session, SessionStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSession:
+    """Tests for session state updates."""
+
+    def test_record_block_matches_speculation_context(self):
+        session = Session("s")
+        session.record_block(["a", "b"], "First")
+        session.record_block(["a"], "Second")
+
+        expected = next_context(next_context(None, "First", ["a", "b"]), "Second", ["a"])
+        assert session.context == expected
+
+    def test_deferred_summary_is_tracked_by_id(self):
+        session = Session("s")
+        session.record_block(["a"], None, "block-1")
+        assert session.context.block_summaries == []
+        assert session.context.pending_block_ids == ["block-1"]
+        session.record_block(["b"], "Second")
+        assert session.context.pending_block_positions == [0]
+
+    def test_block_context_is_bounded(self):
+        session = Session("s")
+        with patch("sessions.SESSION_MAX_BLOCKS", 2):
+            session.record_block(["a"], None, "block-1")
+            for i in range(3):
+                session.record_block(["a"], str(i))
+            session.record_block(["a"], None, "block-2")
+            session.record_block(["a"], None, "block-3")
+
+        assert session.context.block_summaries == ["1", "2"]
+        assert session.context.pending_block_ids == ["block-2", "block-3"]
+        assert session.context.pending_block_positions == [2, 2]
+
+    def test_history_is_bounded(self):
+        session = Session("s")
+        with patch("sessions.SESSION_MAX_HISTORY", 3):
+            for i in range(5):
+                session.add_message("user", str(i))
+        assert [m["content"] for m in session.history] == ["2", "3", "4"]
+
+    def test_state_round_trip(self):
+        session = Session("s", visitor_summary="Recruiter")
+        session.add_message("user", "Hi")
+        session.record_block(["a"], "Shown")
+
+        restored = Session.from_state("s", json.loads(json.dumps(session.to_state())))
+        assert restored.history == session.history
+        assert restored.visitor_summary == "Recruiter"
+        assert restored.context == session.context
+
+
+class TestSessionStore:
+    """Tests for SessionStore lookup, expiry and persistence."""
+
+    @pytest.mark.asyncio
+    async def test_create_and_get(self):
+        store = SessionStore(persistent=False)
+        session = store.create()
+        assert await store.get(session.session_id) is session
+        assert await store.get("unknown") is None
+        assert store.get_stats()["misses"] == 1
+
+    @pytest.mark.asyncio
+    async def test_idle_sessions_expire(self):
+        clock = FakeClock()
+        store = SessionStore(ttl_seconds=10, persistent=False, clock=clock)
+        session = store.create()
+
+        clock.now = 8
+        assert await store.get(session.session_id) is session
+        # Each use extends the TTL
+        clock.now = 16
+        assert await store.get(session.session_id) is session
+        clock.now = 27
+        assert await store.get(session.session_id) is None
+
+    @pytest.mark.asyncio
+    async def test_lru_eviction(self):
+        store = SessionStore(max_entries=2, persistent=False)
+        first, second = store.create(), store.create()
+        await store.get(first.session_id)
+        store.create()
+
+        assert await store.get(second.session_id) is None
+        assert await store.get(first.session_id) is first
+
+    @pytest.mark.asyncio
+    async def test_save_writes_through_to_postgres(self, mock_db):
+        store = SessionStore(persistent=True)
+        pool, conn = mock_db
+
+        with patch("sessions.get_db_pool", new_callable=AsyncMock, return_value=pool):
+            session = store.create()
+            session.add_message("user", "Hi")
+            store.save(session)
+            await asyncio.gather(*store._writes)
+
+        args = conn.execute.await_args.args
+        assert "INSERT INTO visitor_sessions" in args[0]
+        assert args[1] == session.session_id
+        assert json.loads(args[2])["history"] == [{"role": "user", "content": "Hi"}]
+
+    @pytest.mark.asyncio
+    async def test_saves_during_a_slow_write_land_in_order(self, mock_db):
+        store = SessionStore(persistent=True)
+        pool, conn = mock_db
+        first_write = asyncio.Event()
+        written = []
+
+        async def execute(sql, session_id, state):
+            summary = json.loads(state)["visitor_summary"]
+            if summary == "first":
+                await first_write.wait()
+            written.append(summary)
+
+        conn.execute.side_effect = execute
+        with patch("sessions.get_db_pool", new_callable=AsyncMock, return_value=pool):
+            session = store.create()
+            session.visitor_summary = "first"
+            store.save(session)
+            await asyncio.sleep(0)
+            # Both later saves arrive while the first write is still in flight
+            for summary in ("second", "third"):
+                session.visitor_summary = summary
+                store.save(session)
+            first_write.set()
+            await asyncio.gather(*store._writes)
+
+        assert written == ["first", "third"]
+
+    @pytest.mark.asyncio
+    async def test_memory_miss_falls_back_to_postgres(self, mock_db):
+        store = SessionStore(persistent=True)
+        state = Session("s", visitor_summary="Founder", context=CompressedContext(block_summaries=["x"])).to_state()
+        pool, conn = mock_db
+        conn.fetchval.return_value = json.dumps(state)
+
+        with patch("sessions.get_db_pool", new_callable=AsyncMock, return_value=pool):
+            session = await store.get("s")
+
+        assert session.visitor_summary == "Founder"
+        assert session.context.block_summaries == ["x"]
+        assert store.get_stats()["db_hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_postgres_errors_are_misses(self):
+        store = SessionStore(persistent=True)
+        with patch("sessions.get_db_pool", new_callable=AsyncMock, side_effect=OSError("down")):
+            assert await store.get("s") is None
+        assert store.get_stats()["db_errors"] == 1
+
+
+@pytest.mark.asyncio
+async def test_expired_session_is_404_and_stateless_requests_still_work(monkeypatch):
+    from fastapi import HTTPException
+    # main mounts frontend/ relative to the working directory, as under uvicorn
+    monkeypatch.chdir(Path(__file__).resolve().parents[2])
+    import main
+
+    clock = FakeClock()
+    store = SessionStore(ttl_seconds=10, persistent=False, clock=clock)
+    session = store.create()
+    clock.now = 11
+
+    with patch("main.session_store", store):
+        with pytest.raises(HTTPException) as exc:
+            await main._load_session(session.session_id)
+        # The frontend retries without the session, sending the visitor summary itself
+        request = main.GenerateBlockRequest(visitor_summary="Recruiter", action_type="initial_load")
+        assert await main._attach_session(request) is None
+
+    assert exc.value.status_code == 404
+    assert request.visitor_summary == "Recruiter"
@@ -0,0 +1,122 @@
+"""Unit tests for the prebuilt, memory-mapped corpus snapshot."""
+
+import numpy as np
+import pytest
+from unittest.mock import AsyncMock, patch
+
+import seed
+import snapshot
+from vector_index import VectorIndex, EMBEDDING_DIM
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    (tmp_path / "jobs").mkdir()
+    (tmp_path / "jobs" / "a.md").write_text("# Job A\n\n**Skills:** Python\n\nDid things.\n")
+    (tmp_path / "jobs" / "b.md").write_text("# Job B\n\nDid other things.\n")
+    return tmp_path
+
+
+def fake_embeddings(texts):
+    return [[float(len(text))] + [1.0] * (EMBEDDING_DIM - 1) for text in texts]
+
+
+async def build(data_dir, out_dir):
+    with patch.object(seed.llm_handler, "generate_embeddings", new_callable=AsyncMock,
+                      side_effect=fake_embeddings) as mock_embed:
+        stats = await snapshot.build_snapshot(str(data_dir), str(out_dir))
+    return stats, mock_embed
+
+
+@pytest.mark.asyncio
+async def test_build_then_mmap_load(data_dir, tmp_path):
+    out_dir = tmp_path / "snapshot"
+    stats, _ = await build(data_dir, out_dir)
+
+    loaded = snapshot.load_snapshot(str(out_dir))
+    assert stats["records"] == 2 and stats["embedded"] == 2
+    assert isinstance(loaded.matrix, np.memmap)
+    assert loaded.matrix.shape == (2, EMBEDDING_DIM)
+    np.testing.assert_allclose(np.linalg.norm(loaded.matrix, axis=1), 1.0, rtol=1e-5)
+    assert [r["source_file"] for r in loaded.records] == ["jobs/a.md", "jobs/b.md"]
+    assert loaded.version == stats["version"]
+
+
+@pytest.mark.asyncio
+async def test_rebuild_only_embeds_changed_files(data_dir, tmp_path):
+    out_dir = tmp_path / "snapshot"
+    first, _ = await build(data_dir, out_dir)
+    (data_dir / "jobs" / "b.md").write_text("# Job B\n\nRewritten.\n")
+    second, mock_embed = await build(data_dir, out_dir)
+
+    assert second["embedded"] == 1 and second["reused"] == 1
+    assert len(mock_embed.await_args.args[0]) == 1
+    assert second["version"] != first["version"]
+    assert len(list(out_dir.glob("embeddings-*"))) == 1
+
+
+def test_incompatible_snapshot_is_ignored(tmp_path):
+    (tmp_path / "manifest.json").write_text('{"format": 1, "model": "other-model", "dim": 3, "records": []}')
+    assert snapshot.load_snapshot(str(tmp_path)) is None
+    assert snapshot.load_snapshot(str(tmp_path / "missing")) is None
+
+
+@pytest.mark.asyncio
+async def test_apply_syncs_postgres_and_indexes_without_copy(data_dir, tmp_path, mock_db):
+    out_dir = tmp_path / "snapshot"
+    await build(data_dir, out_dir)
+    loaded = snapshot.load_snapshot(str(out_dir))
+    pool, conn = mock_db
+    conn.fetch.return_value = [{"source_file": "jobs/a.md", "id": "id-a"}, {"source_file": "jobs/b.md", "id": "id-b"}]
+    index = VectorIndex()
+
+    with patch("snapshot.get_db_pool", new_callable=AsyncMock, return_value=pool), \
+         patch("snapshot.fetch_existing_hashes", new_callable=AsyncMock, return_value={}), \
+         patch("snapshot.invalidate_caches", new_callable=AsyncMock), \
+         patch("snapshot.sync_chunks", new_callable=AsyncMock, return_value=7), \
+         patch.object(index, "refresh_chunks", new_callable=AsyncMock) as mock_refresh_chunks, \
+         patch("snapshot.vector_index", index):
+        stats = await snapshot.apply_snapshot(loaded)
+
+    assert stats["synced"] and stats["written"] == 2 and stats["indexed"]
+    assert stats["chunks"] == 7
+    mock_refresh_chunks.assert_awaited_once()
+    version_call = next(c for c in conn.execute.await_args_list if "corpus_snapshot" in c.args[0])
+    assert version_call.args[1] == loaded.version
+    assert index._snapshot.matrix is loaded.matrix
+    assert index.search(loaded.matrix[1], 1)[0]["id"] == "id-b"
+
+
+@pytest.mark.asyncio
+async def test_apply_skips_writes_when_version_matches(data_dir, tmp_path, mock_db):
+    out_dir = tmp_path / "snapshot"
+    await build(data_dir, out_dir)
+    loaded = snapshot.load_snapshot(str(out_dir))
+    pool, conn = mock_db
+    conn.fetchval.return_value = loaded.version
+    conn.fetch.return_value = [{"source_file": "jobs/a.md", "id": "id-a"}]
+
+    with patch("snapshot.get_db_pool", new_callable=AsyncMock, return_value=pool), \
+         patch("snapshot.sync_chunks", new_callable=AsyncMock, return_value=0), \
+         patch("snapshot.vector_index", VectorIndex()):
+        stats = await snapshot.apply_snapshot(loaded)
+
+    assert not stats["synced"]
+    conn.executemany.assert_not_awaited()
+    conn.execute.assert_not_awaited()
+    # jobs/b.md has no row, so the index falls back to loading from Postgres
+    assert not stats["indexed"]
+
+
+@pytest.mark.asyncio
+async def test_boot_skips_stale_snapshot_when_data_drifted(data_dir, tmp_path):
+    out_dir = tmp_path / "snapshot"
+    await build(data_dir, out_dir)
+    (data_dir / "jobs" / "c.md").write_text("# Job C\n\nAdded after the build.\n")
+
+    with patch("snapshot.resolve_data_dir", return_value=str(data_dir)), \
+         patch("snapshot.apply_snapshot", new_callable=AsyncMock) as mock_apply:
+        stats = await snapshot.boot_from_snapshot(str(out_dir))
+
+    assert stats == {"current": False, "applied": False}
+    mock_apply.assert_not_awaited()
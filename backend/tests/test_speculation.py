@@ -0,0 +1,169 @@
+"""Unit tests for speculative block pre-generation."""
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from ai.speculation import SpeculationEngine, next_context
+from models import CompressedContext, SuggestedButton
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def fake_handler(delay=0.0):
+    handler = MagicMock()
+    handler.retrieve_experiences = AsyncMock(return_value=[{"id": "e1", "content": "x" * 400}])
+
+    async def generate_block(**kwargs):
+        await asyncio.sleep(delay)
+        return {
+            "html": f"<p>{kwargs['action_value']}</p>",
+            "block_summary": "Summary",
+            "experience_ids": ["e1"]
+        }
+
+    handler.generate_block = AsyncMock(side_effect=generate_block)
+    return handler
+
+
+BUTTONS = [
+    SuggestedButton(label="Skills", prompt="What are your key technical skills?"),
+    SuggestedButton(label="Projects", prompt="Show me some of your notable projects")
+]
+CONTEXT = CompressedContext(block_summaries=["First"], shown_experience_counts={"e1": 1})
+
+
+def test_next_context_mirrors_frontend_tracker():
+    ctx = next_context(CONTEXT, "Second", ["e1", "e2"])
+    assert ctx.block_summaries == ["First", "Second"]
+    assert ctx.shown_experience_counts == {"e1": 2, "e2": 1}
+
+
+@pytest.mark.asyncio
+async def test_disabled_engine_does_nothing():
+    engine = SpeculationEngine(fake_handler(), enabled=False)
+    assert engine.schedule("Recruiter", CONTEXT, BUTTONS) == 0
+    assert await engine.take("Recruiter", BUTTONS[0].prompt, CONTEXT) is None
+
+
+@pytest.mark.asyncio
+async def test_hit_serves_completed_speculation():
+    handler = fake_handler()
+    engine = SpeculationEngine(handler, enabled=True)
+
+    assert engine.schedule("Recruiter", CONTEXT, BUTTONS) == 2
+    await asyncio.sleep(0.01)
+
+    block = await engine.take("Recruiter", "  what are your KEY technical skills? ", CONTEXT)
+    assert block["html"] == "<p>What are your key technical skills?</p>"
+    assert block["experiences"] == [{"id": "e1", "content": "x" * 400}]
+    stats = engine.get_stats()
+    assert stats["hits"] == 1
+    assert stats["completed"] == 2
+    assert stats["estimated_tokens_spent"] > 0
+
+
+@pytest.mark.asyncio
+async def test_in_flight_speculation_is_awaited():
+    engine = SpeculationEngine(fake_handler(delay=0.05), enabled=True)
+    engine.schedule("Recruiter", CONTEXT, BUTTONS[:1])
+
+    block = await engine.take("Recruiter", BUTTONS[0].prompt, CONTEXT)
+    assert block is not None
+    assert engine.get_stats()["inflight_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_different_context_is_a_miss():
+    engine = SpeculationEngine(fake_handler(), enabled=True)
+    engine.schedule("Recruiter", CONTEXT, BUTTONS)
+    await asyncio.sleep(0.01)
+
+    assert await engine.take("Recruiter", BUTTONS[0].prompt, CompressedContext()) is None
+    assert await engine.take("Engineer", BUTTONS[0].prompt, CONTEXT) is None
+    assert engine.get_stats()["misses"] == 2
+
+
+@pytest.mark.asyncio
+async def test_new_context_discards_unused_speculations_as_waste():
+    engine = SpeculationEngine(fake_handler(), enabled=True)
+    engine.schedule("Recruiter", CONTEXT, BUTTONS)
+    await asyncio.sleep(0.01)
+
+    engine.schedule("Recruiter", next_context(CONTEXT, "Second", []), BUTTONS[:1])
+    stats = engine.get_stats()
+    assert stats["wasted"] == 2
+    assert stats["estimated_tokens_wasted"] > 0
+
+
+@pytest.mark.asyncio
+async def test_expired_speculation_is_not_served():
+    clock = FakeClock()
+    engine = SpeculationEngine(fake_handler(), enabled=True, ttl_seconds=10, clock=clock)
+    engine.schedule("Recruiter", CONTEXT, BUTTONS[:1])
+    await asyncio.sleep(0.01)
+
+    clock.now = 11
+    assert await engine.take("Recruiter", BUTTONS[0].prompt, CONTEXT) is None
+    assert engine.get_stats()["wasted"] == 1
+
+
+@pytest.mark.asyncio
+async def test_clear_cancels_in_flight_and_drops_completed():
+    engine = SpeculationEngine(fake_handler(delay=0.05), enabled=True)
+    engine.schedule("Recruiter", CONTEXT, BUTTONS)
+
+    engine.clear()
+    assert await engine.take("Recruiter", BUTTONS[0].prompt, CONTEXT) is None
+    assert engine.get_stats()["cancelled"] == 2
+    assert engine.get_stats()["pending"] == 0
+
+@pytest.mark.asyncio
+async def test_token_budget_limits_speculation():
+    clock = FakeClock()
+    engine = SpeculationEngine(fake_handler(), enabled=True, token_budget_per_minute=2500, clock=clock)
+    assert engine.schedule("Recruiter", CONTEXT, BUTTONS) == 1
+    assert engine.get_stats()["skipped_budget"] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_bounded():
+    running = 0
+    peak = 0
+
+    async def generate_block(**kwargs):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+        return {"html": "<p/>", "block_summary": "S", "experience_ids": []}
+
+    handler = fake_handler()
+    handler.generate_block = AsyncMock(side_effect=generate_block)
+    engine = SpeculationEngine(handler, enabled=True, max_concurrency=1)
+    buttons = [SuggestedButton(label=str(i), prompt=f"prompt {i}") for i in range(3)]
+
+    engine.schedule("Recruiter", CONTEXT, buttons)
+    await asyncio.sleep(0.1)
+    assert peak == 1
+    assert engine.get_stats()["completed"] == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_speculation_falls_through():
+    handler = fake_handler()
+    handler.generate_block = AsyncMock(side_effect=Exception("provider down"))
+    engine = SpeculationEngine(handler, enabled=True)
+    engine.schedule("Recruiter", CONTEXT, BUTTONS[:1])
+
+    assert await engine.take("Recruiter", BUTTONS[0].prompt, CONTEXT) is None
+    stats = engine.get_stats()
+    assert stats["failed"] == 1
+    assert stats["misses"] == 1
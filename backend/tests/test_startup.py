@@ -0,0 +1,72 @@
+"""Unit tests for the background startup supervisor."""
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+
+from startup import StartupPhase, StartupSupervisor
+
+
+@pytest.mark.asyncio
+async def test_required_phase_is_retried_until_it_succeeds():
+    init_db = AsyncMock(side_effect=[ConnectionError("db starting"), ConnectionError("db starting"), None])
+    supervisor = StartupSupervisor(retry_base_seconds=0.01)
+    supervisor.start([StartupPhase("init_db", init_db, required=True, marks_ready=True)])
+    await supervisor.wait()
+
+    assert init_db.await_count == 3
+    status = supervisor.get_status()
+    assert status["ready"] and status["complete"]
+    assert status["errors"] == {}
+    assert set(status["timings"]) == {"init_db", "total"}
+
+
+@pytest.mark.asyncio
+async def test_optional_failure_does_not_block_later_phases():
+    services = AsyncMock()
+    supervisor = StartupSupervisor()
+    supervisor.start([
+        StartupPhase("seed", AsyncMock(side_effect=Exception("embedding API down"))),
+        StartupPhase("services", services),
+    ])
+    await supervisor.wait()
+
+    services.assert_awaited_once()
+    assert supervisor.get_status()["errors"] == {"seed": "embedding API down"}
+
+
+@pytest.mark.asyncio
+async def test_ready_before_seeding_finishes():
+    seed_started, finish_seed = asyncio.Event(), asyncio.Event()
+
+    async def seed():
+        seed_started.set()
+        await finish_seed.wait()
+        return {"new": 2}
+
+    supervisor = StartupSupervisor()
+    supervisor.start([
+        StartupPhase("init_db", AsyncMock(), required=True, marks_ready=True),
+        StartupPhase("seed", seed),
+    ])
+    await seed_started.wait()
+
+    status = supervisor.get_status()
+    assert status["ready"] and not status["complete"]
+    assert status["phase"] == "seed"
+
+    finish_seed.set()
+    await supervisor.wait()
+    assert supervisor.get_status()["seed"] == {"new": 2}
+
+
+@pytest.mark.asyncio
+async def test_not_ready_until_database_is_up():
+    supervisor = StartupSupervisor(retry_base_seconds=10)
+    supervisor.start([StartupPhase("init_db", AsyncMock(side_effect=ConnectionError("refused")), required=True, marks_ready=True)])
+    await asyncio.sleep(0.05)
+
+    status = supervisor.get_status()
+    assert not status["ready"]
+    assert status["errors"] == {"init_db": "refused"}
+    await supervisor.stop()
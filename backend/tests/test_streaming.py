@@ -0,0 +1,153 @@
+"""Unit tests for incremental stream cleanup and SSE block streaming."""
+
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from ai.streaming import StreamCleaner, format_sse
+
+
+def run_cleaner(chunks):
+    cleaner = StreamCleaner()
+    out = "".join(cleaner.feed(c) for c in chunks)
+    return out + cleaner.flush()
+
+
+def reference_clean(text):
+    """The non-streaming cleanup applied by _cerebras_call + _extract_block_html."""
+    import re
+    text = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL).strip()
+    return text.replace("```html", "").replace("```", "").strip()
+
+
+class TestStreamCleaner:
+    """Tests for StreamCleaner."""
+
+    def test_passthrough(self):
+        assert run_cleaner(["<div>", "Hello", "</div>"]) == "<div>Hello</div>"
+
+    def test_strips_think_block_split_across_chunks(self):
+        chunks = ["<thi", "nk>reasoning", " more</th", "ink>", "<p>Hi</p>"]
+        assert run_cleaner(chunks) == "<p>Hi</p>"
+
+    def test_strips_fences_split_across_chunks(self):
+        chunks = ["``", "`ht", "ml\n<section>x</section>\n`", "``"]
+        assert run_cleaner(chunks) == "<section>x</section>"
+
+    def test_plain_fence_without_language(self):
+        assert run_cleaner(["```\n<b>a</b>\n```"]) == "<b>a</b>"
+
+    def test_trims_leading_and_trailing_whitespace(self):
+        assert run_cleaner(["\n\n  ", "<p>a</p>", " \n", "<p>b</p>", "\n\n"]) == "<p>a</p> \n<p>b</p>"
+
+    def test_matches_non_streaming_cleanup_char_by_char(self):
+        raw = "<think>plan the layout</think>\n```html\n<div style=\"color: red\">Body `code`</div>\n```\n"
+        assert run_cleaner(list(raw)) == reference_clean(raw)
+
+    def test_emits_content_before_stream_ends(self):
+        cleaner = StreamCleaner()
+        assert cleaner.feed("<div>first") == "<div>first"
+
+    def test_unclosed_think_is_dropped(self):
+        assert run_cleaner(["<p>a</p><think>never closed"]) == "<p>a</p>"
+
+
+def test_format_sse():
+    assert format_sse("html", "<p>") == 'event: html\ndata: "<p>"\n\n'
+
+
+@pytest.mark.asyncio
+async def test_stream_block_emits_trailing_events():
+    """stream_block yields cleaned HTML first, then experience_ids and block_summary."""
+    from ai.generation import generation_handler
+
+    async def fake_stream(**kwargs):
+        for chunk in ["<think>x</think>```html\n", "<div>Hi", "</div>\n```"]:
+            yield chunk
+
+    with patch('ai.generation.search_similar_experiences', new_callable=AsyncMock) as mock_search, \
+         patch.object(generation_handler.llm, 'llm_stream', side_effect=fake_stream), \
+         patch.object(generation_handler, '_generate_block_summary', new_callable=AsyncMock) as mock_summary:
+
+        mock_search.return_value = [{"id": "1", "title": "T", "skills": [], "content": "c"}]
+        mock_summary.return_value = "Summary"
+
+        events = [e async for e in generation_handler.stream_block(
+            visitor_summary="Recruiter",
+            action_type="initial_load",
+            action_value="Recruiter",
+            context=None
+        )]
+
+    html = "".join(data for event, data in events if event == "html")
+    assert html == "<div>Hi</div>"
+    assert events[-2] == ("experience_ids", ["1"])
+    assert events[-1] == ("block_summary", "Summary")
+    mock_summary.assert_awaited_once_with("<div>Hi</div>", "Recruiter", None, ["T"])
+
+
+@pytest.mark.asyncio
+async def test_block_and_buttons_share_one_retrieval():
+    """Buttons are generated concurrently from the same retrieval and arrive mid-stream."""
+    import asyncio
+    from ai.generation import generation_handler
+    from models import SuggestedButton
+
+    buttons_ready = asyncio.Event()
+
+    async def fake_stream(**kwargs):
+        yield "<div>"
+        # Hold the block open until the buttons have been generated
+        await buttons_ready.wait()
+        yield "</div>"
+
+    async def fake_buttons(*args, **kwargs):
+        buttons_ready.set()
+        return [SuggestedButton(label="L", prompt="P")]
+
+    experiences = [{"id": "1", "title": "T", "skills": [], "content": "c"}]
+    with patch('ai.generation.search_similar_experiences', new_callable=AsyncMock) as mock_search, \
+         patch.object(generation_handler.llm, 'llm_stream', side_effect=fake_stream), \
+         patch.object(generation_handler, 'generate_buttons', side_effect=fake_buttons) as mock_buttons, \
+         patch.object(generation_handler, '_generate_block_summary', new_callable=AsyncMock) as mock_summary:
+
+        mock_search.return_value = experiences
+        mock_summary.return_value = "Summary"
+
+        events = [e async for e in generation_handler.stream_block_and_buttons(
+            visitor_summary="Recruiter",
+            action_type="initial_load",
+            action_value="Recruiter",
+            context=None,
+            chat_history=[]
+        )]
+
+    mock_search.assert_awaited_once()
+    assert mock_buttons.call_args.args[-1] is experiences
+    names = [event for event, _ in events]
+    assert names.index("buttons") < names.index("block_summary")
+    assert ("buttons", [{"label": "L", "prompt": "P"}]) in events
+    assert "".join(data for event, data in events if event == "html") == "<div></div>"
+
+
+@pytest.mark.asyncio
+async def test_block_and_buttons_falls_back_on_button_error():
+    from ai.generation import generation_handler, DEFAULT_BUTTONS
+
+    async def fake_stream(**kwargs):
+        yield "<p>x</p>"
+
+    with patch('ai.generation.search_similar_experiences', new_callable=AsyncMock, return_value=[]), \
+         patch.object(generation_handler.llm, 'llm_stream', side_effect=fake_stream), \
+         patch.object(generation_handler, 'generate_buttons', new_callable=AsyncMock, side_effect=Exception("boom")), \
+         patch.object(generation_handler, '_generate_block_summary', new_callable=AsyncMock, return_value="S"):
+
+        events = dict([e async for e in generation_handler.stream_block_and_buttons(
+            visitor_summary="Recruiter",
+            action_type="initial_load",
+            action_value="Recruiter",
+            context=None,
+            chat_history=[]
+        )])
+
+    assert events["buttons"] == [b.model_dump() for b in DEFAULT_BUTTONS]
+    assert events["block_summary"] == "S"
@@ -97,7 +97,7 @@ class TestCerebrasStructuredCall:
             mock_response = MagicMock()
             mock_response.choices = [MagicMock()]
             mock_response.choices[0].message.content = '{"text": "test", "count": 42}'
-            mock_client.chat.completions.create.return_value = mock_response
+            mock_client.chat.completions.create = AsyncMock(return_value=mock_response)
 
             result = await llm_handler._cerebras_structured_call(
                 prompt="test",
@@ -120,7 +120,7 @@ class TestCerebrasStructuredCall:
             mock_response.choices[0].message.content = (
                 '<think>Let me think about this...</think>{"text": "result", "count": 5}'
             )
-            mock_client.chat.completions.create.return_value = mock_response
+            mock_client.chat.completions.create = AsyncMock(return_value=mock_response)
 
             result = await llm_handler._cerebras_structured_call(
                 prompt="test",
@@ -145,7 +145,7 @@ class TestCerebrasStructuredCall:
             mock_response_valid.choices = [MagicMock()]
             mock_response_valid.choices[0].message.content = '{"text": "test", "count": 10}'
 
-            mock_client.chat.completions.create.side_effect = [mock_response_invalid, mock_response_valid]
+            mock_client.chat.completions.create = AsyncMock(side_effect=[mock_response_invalid, mock_response_valid])
 
             result = await llm_handler._cerebras_structured_call(
                 prompt="test",
@@ -185,13 +185,14 @@ class TestGeminiStructuredCall:
     @pytest.mark.asyncio
     async def test_gemini_structured_call_success(self):
         """Test successful Gemini structured output call."""
-        with patch('ai.llm.genai.GenerativeModel') as mock_model_class:
+        with patch('ai.llm.genai.GenerativeModel') as mock_model_class, \
+             patch.object(llm_handler, 'gemini_configured', True):
             mock_model = MagicMock()
             mock_model_class.return_value = mock_model
 
             mock_response = MagicMock()
             mock_response.text = '{"text": "gemini_result", "count": 99}'
-            mock_model.generate_content.return_value = mock_response
+            mock_model.generate_content_async = AsyncMock(return_value=mock_response)
 
             result = await llm_handler._gemini_structured_call(
                 prompt="test",
@@ -206,7 +207,8 @@ class TestGeminiStructuredCall:
     @pytest.mark.asyncio
     async def test_gemini_structured_call_validation_error_retries(self):
         """Test that Gemini validation errors trigger retries."""
-        with patch('ai.llm.genai.GenerativeModel') as mock_model_class:
+        with patch('ai.llm.genai.GenerativeModel') as mock_model_class, \
+             patch.object(llm_handler, 'gemini_configured', True):
             mock_model = MagicMock()
             mock_model_class.return_value = mock_model
 
@@ -217,7 +219,7 @@ class TestGeminiStructuredCall:
             mock_response_valid = MagicMock()
             mock_response_valid.text = '{"text": "test", "count": 20}'
 
-            mock_model.generate_content.side_effect = [mock_response_invalid, mock_response_valid]
+            mock_model.generate_content_async = AsyncMock(side_effect=[mock_response_invalid, mock_response_valid])
 
             result = await llm_handler._gemini_structured_call(
                 prompt="test",
@@ -227,7 +229,7 @@ class TestGeminiStructuredCall:
 
             assert result.text == "test"
             assert result.count == 20
-            assert mock_model.generate_content.call_count == 2
+            assert mock_model.generate_content_async.call_count == 2
 
     @pytest.mark.asyncio
     async def test_gemini_structured_call_not_configured_raises(self):
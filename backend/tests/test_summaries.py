@@ -0,0 +1,126 @@
+"""Unit tests for deferred block summaries."""
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from ai.summaries import BlockSummaryStore
+from models import CompressedContext
+
+
+async def slow_summary(text, delay=0.0, fail=False):
+    await asyncio.sleep(delay)
+    if fail:
+        raise Exception("summary failed")
+    return text
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestBlockSummaryStore:
+    """Tests for BlockSummaryStore."""
+
+    @pytest.mark.asyncio
+    async def test_resolve_waits_for_running_summary(self):
+        store = BlockSummaryStore()
+        block_id = store.defer(slow_summary("Showed X", delay=0.02))
+        assert await store.resolve(block_id) == "Showed X"
+        assert store.get_stats()["resolved"] == 1
+
+    @pytest.mark.asyncio
+    async def test_resolve_gives_up_after_timeout(self):
+        store = BlockSummaryStore()
+        block_id = store.defer(slow_summary("late", delay=1.0))
+        assert await store.resolve(block_id, timeout=0.01) is None
+        # The summary keeps running and can still be claimed later
+        assert not store._entries[block_id][0].cancelled()
+
+    @pytest.mark.asyncio
+    async def test_unknown_failed_and_expired_ids_are_missing(self):
+        clock = FakeClock()
+        store = BlockSummaryStore(ttl_seconds=10, clock=clock)
+        failed = store.defer(slow_summary("x", fail=True))
+        expired = store.defer(slow_summary("y"))
+
+        assert await store.resolve("nope") is None
+        assert await store.resolve(failed) is None
+        clock.now = 11
+        assert await store.resolve(expired) is None
+        assert store.get_stats()["missing"] == 3
+
+    @pytest.mark.asyncio
+    async def test_oldest_entries_are_evicted(self):
+        store = BlockSummaryStore(max_entries=1)
+        first = store.defer(slow_summary("a"))
+        store.defer(slow_summary("b"))
+        assert await store.resolve(first) is None
+
+    @pytest.mark.asyncio
+    async def test_resolve_context_appends_in_order(self):
+        store = BlockSummaryStore()
+        ids = [store.defer(slow_summary("second", delay=0.02)), store.defer(slow_summary("third"))]
+        context = CompressedContext(
+            block_summaries=["first"],
+            shown_experience_counts={"e": 1},
+            pending_block_ids=ids
+        )
+
+        resolved = await store.resolve_context(context)
+        assert resolved.block_summaries == ["first", "second", "third"]
+        assert resolved.pending_block_ids == []
+        assert resolved.shown_experience_counts == {"e": 1}
+
+
+    @pytest.mark.asyncio
+    async def test_resolve_context_keeps_recorded_order(self):
+        store = BlockSummaryStore()
+        ready = store.defer(slow_summary("second"))
+        running = store.defer(slow_summary("fourth", delay=0.1))
+        await asyncio.sleep(0)
+        # "second" was shown before "third", whose summary was ready immediately
+        context = CompressedContext(
+            block_summaries=["first", "third"],
+            pending_block_ids=[ready, running],
+            pending_block_positions=[1, 2]
+        )
+
+        resolved = await store.resolve_context(context, timeout=0.01)
+        assert resolved.block_summaries == ["first", "second", "third"]
+        # Still generating, so it stays pending at its (shifted) position
+        assert resolved.pending_block_ids == [running]
+        assert resolved.pending_block_positions == [3]
+
+@pytest.mark.asyncio
+async def test_generate_block_defers_summary():
+    from ai.generation import generation_handler, summary_store
+
+    summary_ready = asyncio.Event()
+
+    async def summary(*args, **kwargs):
+        await summary_ready.wait()
+        return "Summary"
+
+    with patch('ai.generation.search_similar_experiences', new_callable=AsyncMock, return_value=[]), \
+         patch.object(generation_handler.llm, 'llm_call', new_callable=AsyncMock, return_value="<div>Hi</div>"), \
+         patch("ai.generation.LLM_BLOCK_SUMMARIES", True), \
+         patch.object(generation_handler, '_generate_block_summary', side_effect=summary):
+
+        result = await generation_handler.generate_block(
+            visitor_summary="Recruiter",
+            action_type="initial_load",
+            action_value="Recruiter",
+            context=None,
+            defer_summary=True
+        )
+
+        # HTML is returned while the summary is still pending
+        assert result["html"] == "<div>Hi</div>"
+        assert result["block_summary"] is None
+        summary_ready.set()
+        assert await summary_store.resolve(result["block_id"]) == "Summary"
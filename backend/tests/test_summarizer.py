@@ -0,0 +1,81 @@
+"""Unit tests for the local extractive block summarizer."""
+
+import time
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from ai.summarizer import summarize_block, FALLBACK_SUMMARY
+
+
+BLOCK = """
+<section>
+  <style>.x { color: red }</style>
+  <h2>Scaling <em>Search</em> Infrastructure</h2>
+  <p>Led the migration of &amp; indexing pipeline.</p>
+  <h3>Technical Leadership</h3>
+  <script>console.log("<h2>not a heading</h2>")</script>
+</section>
+"""
+
+
+def test_titles_and_headings():
+    summary = summarize_block(BLOCK, ["Staff Engineer at Acme", "Search Revamp"])
+    assert summary == (
+        "Highlighted Staff Engineer at Acme and Search Revamp, "
+        "focusing on Scaling Search Infrastructure and Technical Leadership."
+    )
+
+
+def test_titles_are_deduplicated_and_capped():
+    summary = summarize_block("", ["A", "a", "B", "C", "D"])
+    assert summary == "Highlighted A, B, and C."
+
+
+def test_headings_only():
+    assert summarize_block(BLOCK, []) == "Covered Scaling Search Infrastructure and Technical Leadership."
+
+
+def test_falls_back_to_opening_text():
+    assert summarize_block("<div><p>Built   a compiler.</p></div>", []) == "Covered Built a compiler."
+
+
+def test_empty_block_uses_fallback():
+    assert summarize_block("<div></div>", []) == FALLBACK_SUMMARY
+
+
+def test_long_parts_are_truncated():
+    summary = summarize_block(f"<h1>{'word ' * 50}</h1>", [])
+    assert len(summary) < 100
+    assert summary.endswith("….")
+
+
+def test_runs_in_well_under_a_millisecond():
+    start = time.perf_counter()
+    for _ in range(100):
+        summarize_block(BLOCK, ["Staff Engineer at Acme"])
+    assert (time.perf_counter() - start) / 100 < 0.001
+
+
+@pytest.mark.asyncio
+async def test_block_summary_makes_no_provider_call():
+    from ai.generation import generation_handler
+
+    with patch.object(generation_handler.llm, 'llm_call', new_callable=AsyncMock) as mock_call:
+        summary = await generation_handler._generate_block_summary(BLOCK, "Recruiter", titles=["Search Revamp"])
+
+    assert summary.startswith("Highlighted Search Revamp")
+    mock_call.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_llm_summaries_are_opt_in():
+    from ai.generation import generation_handler
+
+    with patch("ai.generation.LLM_BLOCK_SUMMARIES", True), \
+         patch.object(generation_handler.llm, 'llm_call', new_callable=AsyncMock) as mock_call:
+        mock_call.side_effect = Exception("down")
+        summary = await generation_handler._generate_block_summary(BLOCK, "Recruiter", titles=["Search Revamp"])
+
+    mock_call.assert_awaited_once()
+    # Provider failures fall back to the local summary
+    assert summary.startswith("Highlighted Search Revamp")
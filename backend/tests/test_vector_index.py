@@ -0,0 +1,137 @@
+import pytest
+import numpy as np
+from unittest.mock import AsyncMock, patch
+
+from vector_index import VectorIndex, EMBEDDING_DIM
+
+
+def make_row(id, vector, title=None):
+    embedding = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    embedding[:len(vector)] = vector
+    return {
+        "id": id,
+        "title": title or id,
+        "content": "c",
+        "skills": [],
+        "metadata": '{"type": "job"}',
+        "embedding": embedding
+    }
+
+
+def make_chunk(experience_id, position, vector):
+    embedding = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    embedding[:len(vector)] = vector
+    return {"experience_id": experience_id, "position": position, "heading": "Overview",
+            "content": f"{experience_id}-{position}", "embedding": embedding}
+
+
+def serve_corpus(mock_db, rows, count=None, chunks=()):
+    """Have the mock connection answer the index's experience and chunk queries."""
+    pool, conn = mock_db
+    conn.fetchval.side_effect = lambda sql: len(chunks) if "experience_chunks" in sql else \
+        (len(rows) if count is None else count)
+    conn.fetch.side_effect = lambda sql: list(chunks) if "experience_chunks" in sql else rows
+    return pool, conn
+
+
+def query(vector):
+    q = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    q[:len(vector)] = vector
+    return q.tolist()
+
+
+@pytest.mark.asyncio
+async def test_search_returns_none_until_loaded():
+    assert VectorIndex().search(query([1.0]), 5) is None
+
+
+@pytest.mark.asyncio
+async def test_refresh_and_cosine_top_k(mock_db):
+    rows = [
+        make_row("a", [1.0, 0.0]),
+        make_row("b", [0.0, 5.0]),   # unnormalized on purpose
+        make_row("c", [1.0, 1.0]),
+    ]
+    pool, _ = serve_corpus(mock_db, rows)
+    index = VectorIndex()
+
+    with patch("vector_index.get_db_pool", new_callable=AsyncMock, return_value=pool):
+        assert await index.refresh()
+
+    assert index.loaded
+    assert len(index) == 3
+
+    results = index.search(query([0.0, 2.0]), 2)
+    assert [r["id"] for r in results] == ["b", "c"]
+    assert results[0]["similarity"] == pytest.approx(1.0)
+    assert results[1]["similarity"] == pytest.approx(np.sqrt(0.5))
+    assert results[0]["metadata"] == {"type": "job"}
+
+
+@pytest.mark.asyncio
+async def test_large_corpus_falls_back_to_pgvector(mock_db):
+    pool, conn = serve_corpus(mock_db, [], count=10)
+    index = VectorIndex()
+
+    with patch("vector_index.get_db_pool", new_callable=AsyncMock, return_value=pool), \
+         patch("vector_index.VECTOR_INDEX_MAX_ROWS", 5):
+        assert not await index.refresh()
+
+    assert not index.loaded
+    conn.fetch.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_rag_uses_loaded_index(mock_db):
+    from rag import search_similar_experiences
+
+    pool, _ = serve_corpus(mock_db, [make_row("a", [1.0]), make_row("b", [0.0, 1.0])])
+    index = VectorIndex()
+    with patch("vector_index.get_db_pool", new_callable=AsyncMock, return_value=pool):
+        await index.refresh()
+
+    with patch("rag.vector_index", index), \
+         patch("rag.RAG_RETRIEVAL_MODE", "vector"), \
+         patch("rag.CHUNKS_ENABLED", False), \
+         patch("rag.get_db_pool", new_callable=AsyncMock) as mock_get_pool, \
+         patch("ai.llm.llm_handler.generate_embedding", new_callable=AsyncMock) as mock_embed:
+        mock_embed.return_value = query([0.0, 1.0])
+        results = await search_similar_experiences("q", limit=1)
+
+    assert [r["id"] for r in results] == ["b"]
+    mock_get_pool.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_passages_are_scored_in_memory(mock_db):
+    chunks = [make_chunk("a", 0, [1.0]), make_chunk("a", 1, [0.0, 1.0]), make_chunk("b", 0, [1.0])]
+    pool, _ = serve_corpus(mock_db, [make_row("a", [1.0]), make_row("b", [0.0, 1.0])], chunks=chunks)
+    index = VectorIndex()
+    assert index.passages(query([1.0]), ["a"]) is None
+
+    with patch("vector_index.get_db_pool", new_callable=AsyncMock, return_value=pool):
+        await index.refresh()
+
+    passages = index.passages(query([0.0, 3.0]), ["a", "missing"])
+    assert [(p["content"], p["similarity"]) for p in passages] == [("a-0", 0.0), ("a-1", pytest.approx(1.0))]
+
+
+@pytest.mark.asyncio
+async def test_rag_selects_passages_from_loaded_index(mock_db):
+    from rag import search_similar_experiences
+
+    chunks = [make_chunk("b", 0, [0.0, 1.0])]
+    pool, _ = serve_corpus(mock_db, [make_row("a", [1.0]), make_row("b", [0.0, 1.0])], chunks=chunks)
+    index = VectorIndex()
+    with patch("vector_index.get_db_pool", new_callable=AsyncMock, return_value=pool):
+        await index.refresh()
+
+    with patch("rag.vector_index", index), \
+         patch("rag.RAG_RETRIEVAL_MODE", "vector"), \
+         patch("rag.CHUNKS_ENABLED", True), \
+         patch("rag.get_db_pool", new_callable=AsyncMock) as mock_get_pool, \
+         patch("ai.llm.llm_handler.generate_embedding", new_callable=AsyncMock, return_value=query([0.0, 1.0])):
+        results = await search_similar_experiences("q", limit=1)
+
+    assert results[0]["passages"][0]["content"] == "b-0"
+    mock_get_pool.assert_not_awaited()
@@ -0,0 +1,109 @@
+"""Unit tests for the data directory watcher and targeted re-indexing."""
+
+import sys
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+
+import seed
+from watcher import DataWatcher
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    (tmp_path / "jobs").mkdir()
+    (tmp_path / "projects").mkdir()
+    return tmp_path
+
+
+class Recorder:
+    def __init__(self):
+        self.batches = []
+        self.called = asyncio.Event()
+
+    async def __call__(self, paths):
+        self.batches.append(set(paths))
+        self.called.set()
+
+
+async def run_watcher(data_dir, use_inotify, change):
+    recorder = Recorder()
+    watcher = DataWatcher(str(data_dir), recorder, debounce_seconds=0.1, poll_seconds=0.05, use_inotify=use_inotify)
+    watcher.start()
+    try:
+        await asyncio.sleep(0.1)
+        change()
+        await asyncio.wait_for(recorder.called.wait(), 5)
+    finally:
+        await watcher.stop()
+    return watcher, recorder
+
+
+def burst(data_dir):
+    (data_dir / "jobs" / "new.md").write_text("# New\n")
+    (data_dir / "jobs" / "new.md").write_text("# New\nedited\n")
+    (data_dir / "projects" / "notes.txt").write_text("ignored")
+    (data_dir / "projects" / "p.md").write_text("# P\n")
+
+
+@pytest.mark.asyncio
+async def test_polling_debounces_a_burst_into_one_batch(data_dir):
+    watcher, recorder = await run_watcher(data_dir, False, lambda: burst(data_dir))
+
+    assert watcher.backend == "polling"
+    assert recorder.batches == [{"jobs/new.md", "projects/p.md"}]
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux-only")
+async def test_inotify_reports_writes_and_deletes(data_dir):
+    existing = data_dir / "jobs" / "old.md"
+    existing.write_text("# Old\n")
+
+    def change():
+        burst(data_dir)
+        existing.unlink()
+
+    watcher, recorder = await run_watcher(data_dir, True, change)
+
+    assert watcher.backend == "inotify"
+    assert recorder.batches == [{"jobs/new.md", "jobs/old.md", "projects/p.md"}]
+
+
+@pytest.mark.asyncio
+async def test_failed_reindex_is_retried_with_backoff(data_dir):
+    on_change = AsyncMock(side_effect=[Exception("db down"), Exception("db down"), None])
+    watcher = DataWatcher(str(data_dir), on_change, debounce_seconds=0.01, retry_seconds=0.02, use_inotify=False)
+    watcher._tasks.append(asyncio.create_task(watcher._dispatch()))
+    watcher._touch(["jobs/a.md"])
+    await asyncio.sleep(0.05)
+    watcher._touch(["jobs/b.md"])
+    await asyncio.sleep(0.2)
+    await watcher.stop()
+
+    # The failed file is retried without being touched again, along with later changes
+    batches = [c.args[0] for c in on_change.await_args_list]
+    assert batches[0] == {"jobs/a.md"} and batches[-1] == {"jobs/a.md", "jobs/b.md"}
+    stats = watcher.get_stats()
+    assert (stats["failures"], stats["reindexes"], stats["pending_files"]) == (2, 1, 0)
+
+
+@pytest.mark.asyncio
+async def test_seed_paths_only_touches_given_files(data_dir, mock_db):
+    (data_dir / "jobs" / "a.md").write_text("# Job A\n\nDid things.\n")
+    (data_dir / "jobs" / "untouched.md").write_text("# Untouched\n")
+    pool, conn = mock_db
+    conn.execute.return_value = "DELETE 1"
+
+    with patch("seed.resolve_data_dir", return_value=str(data_dir)), \
+         patch("seed.get_db_pool", new_callable=AsyncMock, return_value=pool), \
+         patch("seed.invalidate_caches", new_callable=AsyncMock) as mock_invalidate, \
+         patch.object(seed.llm_handler, "generate_embeddings", new_callable=AsyncMock,
+                      side_effect=lambda texts: [[0.1] * 3 for _ in texts]) as mock_embed:
+        stats = await seed.seed_paths(["jobs/a.md", "jobs/removed.md"])
+
+    assert stats["new"] == 1
+    assert len(mock_embed.await_args.args[0]) == 1
+    delete_call = next(c for c in conn.execute.await_args_list if "DELETE FROM experiences" in c.args[0])
+    assert "ANY" in delete_call.args[0] and delete_call.args[1] == ["jobs/removed.md"]
+    mock_invalidate.assert_awaited_once()
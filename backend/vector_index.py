@@ -0,0 +1,242 @@
+import os
+import json
+import time
+import logging
+from typing import List, Dict, Any, Optional, Sequence
+
+import numpy as np
+
+from db import get_db_pool
+from chunks import CHUNKS_ENABLED
+
+logger = logging.getLogger(__name__)
+
+VECTOR_INDEX_ENABLED = os.getenv("VECTOR_INDEX_ENABLED", "true").lower() == "true"
+# Above this many rows retrieval stays on pgvector instead of an in-memory matrix
+VECTOR_INDEX_MAX_ROWS = int(os.getenv("VECTOR_INDEX_MAX_ROWS", "5000"))
+# Above this many passages they are scored in Postgres instead of in memory
+VECTOR_INDEX_MAX_CHUNKS = int(os.getenv("VECTOR_INDEX_MAX_CHUNKS", "50000"))
+EMBEDDING_DIM = 768
+
+
+def _normalized(vector: Sequence[float]) -> np.ndarray:
+    query = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(query)
+    return query / norm if norm else query
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return np.ascontiguousarray(matrix)
+
+
+class _IndexSnapshot:
+    """Immutable matrix + row records; swapped as a whole on reload."""
+
+    def __init__(self, matrix: np.ndarray, records: List[Dict[str, Any]]):
+        self.matrix = matrix
+        self.records = records
+        self.positions = {record["id"]: i for i, record in enumerate(records)}
+
+
+class _ChunkSnapshot:
+    """Passage embeddings and rows, grouped by experience; swapped as a whole on reload."""
+
+    def __init__(self, matrix: np.ndarray, rows: List[Dict[str, Any]]):
+        self.matrix = matrix
+        self.rows = rows
+        self.by_experience: Dict[str, List[int]] = {}
+        for i, row in enumerate(rows):
+            self.by_experience.setdefault(row["experience_id"], []).append(i)
+
+
+class VectorIndex:
+    """
+    In-process cosine similarity index over all experience embeddings.
+
+    Embeddings are held in one contiguous, L2-normalized float32 matrix so a
+    top-k query is a single matrix-vector product. The corpus is small and only
+    changes at seed time, so the whole index is rebuilt by refresh() and
+    replaced atomically. Passage embeddings are held the same way, so passage
+    selection needs no Postgres round trip either.
+    """
+
+    def __init__(self):
+        self._snapshot: Optional[_IndexSnapshot] = None
+        self._chunks: Optional[_ChunkSnapshot] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._snapshot is not None
+
+    def __len__(self) -> int:
+        return len(self._snapshot.records) if self._snapshot else 0
+
+    async def refresh(self) -> bool:
+        """
+        (Re)load all embeddings from Postgres.
+
+        Returns:
+            True if the index is loaded, False if disabled or the corpus is too
+            large (retrieval then falls back to pgvector).
+        """
+        if not VECTOR_INDEX_ENABLED:
+            return False
+
+        start = time.perf_counter()
+        pool = await get_db_pool()
+        async with pool.acquire() as conn:
+            count = await conn.fetchval("SELECT COUNT(*) FROM experiences WHERE embedding IS NOT NULL")
+            if count > VECTOR_INDEX_MAX_ROWS:
+                logger.info(f"[INDEX] {count} rows exceeds VECTOR_INDEX_MAX_ROWS={VECTOR_INDEX_MAX_ROWS}, using pgvector")
+                self._snapshot = None
+                self._chunks = None
+                return False
+
+            rows = await conn.fetch("""
+                SELECT id, title, content, skills, metadata, embedding
+                FROM experiences
+                WHERE embedding IS NOT NULL
+            """)
+
+        self._snapshot = self._build(rows)
+        logger.info(f"[INDEX] Loaded {len(rows)} embeddings in {(time.perf_counter() - start) * 1000:.1f}ms")
+        await self.refresh_chunks()
+        return True
+
+    async def refresh_chunks(self) -> bool:
+        """
+        (Re)load all passage embeddings from Postgres. Called by refresh() and
+        whenever passages are written without the experiences changing.
+
+        Returns:
+            True if passages are served from memory, False if chunking is
+            disabled, the index isn't loaded or there are too many passages
+        """
+        if not CHUNKS_ENABLED or not self.loaded:
+            self._chunks = None
+            return False
+
+        pool = await get_db_pool()
+        async with pool.acquire() as conn:
+            count = await conn.fetchval("SELECT COUNT(*) FROM experience_chunks")
+            if count > VECTOR_INDEX_MAX_CHUNKS:
+                logger.info(f"[INDEX] {count} passages exceeds VECTOR_INDEX_MAX_CHUNKS={VECTOR_INDEX_MAX_CHUNKS}, scoring in Postgres")
+                self._chunks = None
+                return False
+            rows = await conn.fetch("""
+                SELECT experience_id, position, heading, content, embedding
+                FROM experience_chunks
+            """)
+
+        matrix = np.empty((len(rows), EMBEDDING_DIM), dtype=np.float32)
+        records = []
+        for i, row in enumerate(rows):
+            matrix[i] = row["embedding"]
+            records.append({
+                "experience_id": str(row["experience_id"]),
+                "position": row["position"],
+                "heading": row["heading"],
+                "content": row["content"]
+            })
+        self._chunks = _ChunkSnapshot(_normalize_rows(matrix), records)
+        logger.info(f"[INDEX] Loaded {len(rows)} passage embeddings")
+        return True
+
+    def load(self, matrix: np.ndarray, records: List[Dict[str, Any]]):
+        """
+        Serve an already L2-normalized float32 matrix as-is (e.g. a memory-mapped
+        corpus snapshot), without copying it.
+
+        Args:
+            matrix: (len(records), EMBEDDING_DIM) float32 rows, unit length
+            records: Result dicts (id, title, content, skills, metadata) per row
+        """
+        if matrix.shape != (len(records), EMBEDDING_DIM) or matrix.dtype != np.float32:
+            raise ValueError(f"Expected a ({len(records)}, {EMBEDDING_DIM}) float32 matrix, got {matrix.shape} {matrix.dtype}")
+        self._snapshot = _IndexSnapshot(matrix, records)
+        logger.info(f"[INDEX] Loaded {len(records)} embeddings from a prebuilt matrix")
+
+    def _build(self, rows: Sequence[Any]) -> _IndexSnapshot:
+        matrix = np.empty((len(rows), EMBEDDING_DIM), dtype=np.float32)
+        records = []
+        for i, row in enumerate(rows):
+            matrix[i] = row["embedding"]
+            records.append({
+                "id": str(row["id"]),
+                "title": row["title"],
+                "content": row["content"],
+                "skills": row["skills"],
+                "metadata": json.loads(row["metadata"]) if isinstance(row["metadata"], str) else row["metadata"]
+            })
+
+        return _IndexSnapshot(_normalize_rows(matrix), records)
+
+    def search(
+        self,
+        query_embedding: Sequence[float],
+        limit: int,
+        include_ids: Sequence[str] = ()
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Top-k cosine search.
+
+        Args:
+            include_ids: Experiences to score and append after the top k even if
+                they rank lower (e.g. lexical candidates for hybrid fusion)
+
+        Returns:
+            Result dicts shaped like search_similar_experiences rows, or None if
+            the index isn't loaded and the caller should query pgvector.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        if not snapshot.records:
+            return []
+
+        scores = snapshot.matrix @ _normalized(query_embedding)
+        k = min(limit, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        if include_ids:
+            ranked = set(top.tolist())
+            extra = [snapshot.positions[i] for i in include_ids if i in snapshot.positions]
+            top = [*top.tolist(), *(i for i in dict.fromkeys(extra) if i not in ranked)]
+
+        return [
+            {**snapshot.records[i], "similarity": float(scores[i])}
+            for i in top
+        ]
+
+
+    def passages(
+        self,
+        query_embedding: Sequence[float],
+        experience_ids: Sequence[str]
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Score the passages of some experiences against a query.
+
+        Returns:
+            Chunk dicts shaped like PASSAGES_SQL rows (experience_id, position,
+            heading, content, similarity), or None if passages aren't loaded and
+            the caller should query Postgres
+        """
+        chunks = self._chunks
+        if chunks is None:
+            return None
+        positions = [i for experience_id in experience_ids for i in chunks.by_experience.get(experience_id, ())]
+        if not positions:
+            return []
+        scores = chunks.matrix[positions] @ _normalized(query_embedding)
+        return [
+            {**chunks.rows[i], "similarity": float(score)}
+            for i, score in zip(positions, scores)
+        ]
+
+
+# Global vector index instance
+vector_index = VectorIndex()
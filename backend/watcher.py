@@ -0,0 +1,225 @@
+import os
+import sys
+import time
+import ctypes
+import ctypes.util
+import struct
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+DATA_WATCHER_ENABLED = os.getenv("DATA_WATCHER_ENABLED", "true").lower() == "true"
+# Wait for this long without new events before re-indexing, so editor saves and
+# bulk copies are handled as one batch
+DATA_WATCHER_DEBOUNCE_SECONDS = float(os.getenv("DATA_WATCHER_DEBOUNCE_SECONDS", "1.0"))
+# Scan interval for the polling fallback (non-Linux, or inotify unavailable)
+DATA_WATCHER_POLL_SECONDS = float(os.getenv("DATA_WATCHER_POLL_SECONDS", "2.0"))
+# A failed re-index is retried after this long, doubling up to the max while it keeps failing
+DATA_WATCHER_RETRY_SECONDS = float(os.getenv("DATA_WATCHER_RETRY_SECONDS", "5.0"))
+DATA_WATCHER_RETRY_MAX_SECONDS = float(os.getenv("DATA_WATCHER_RETRY_MAX_SECONDS", "300"))
+WATCHED_SUBDIRS = ("jobs", "projects")
+
+# inotify(7) constants
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_DELETE = 0x00000200
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_DELETE
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _InotifySource:
+    """Kernel file events for the watched subdirectories, read on the event loop."""
+
+    def __init__(self, data_dir: str, on_paths: Callable[[Iterable[str]], None]):
+        self.data_dir = data_dir
+        self.on_paths = on_paths
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watches: Dict[int, str] = {}
+        for subdir in WATCHED_SUBDIRS:
+            path = os.path.join(data_dir, subdir)
+            if not os.path.isdir(path):
+                continue
+            wd = self._libc.inotify_add_watch(self._fd, path.encode(), _WATCH_MASK)
+            if wd < 0:
+                self.close()
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+            self._watches[wd] = subdir
+        if not self._watches:
+            self.close()
+            raise OSError(f"No watchable subdirectories in {data_dir}")
+
+    def start(self):
+        asyncio.get_running_loop().add_reader(self._fd, self._read)
+
+    def _read(self):
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        paths = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, _, _, name_len = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + name_len].rstrip(b"\0").decode(errors="replace")
+            offset += name_len
+            subdir = self._watches.get(wd)
+            if subdir and name.endswith(".md"):
+                paths.append(f"{subdir}/{name}")
+        if paths:
+            self.on_paths(paths)
+
+    def close(self):
+        if self._fd >= 0:
+            try:
+                asyncio.get_running_loop().remove_reader(self._fd)
+            except RuntimeError:
+                pass
+            os.close(self._fd)
+            self._fd = -1
+
+
+def _snapshot(data_dir: str) -> Dict[str, Tuple[int, int]]:
+    """{source_file: (mtime_ns, size)} for every watched markdown file."""
+    files = {}
+    for subdir in WATCHED_SUBDIRS:
+        try:
+            entries = list(os.scandir(os.path.join(data_dir, subdir)))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            if entry.name.endswith(".md") and entry.is_file():
+                stat = entry.stat()
+                files[f"{subdir}/{entry.name}"] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+class DataWatcher:
+    """
+    Watches data/jobs and data/projects and re-indexes touched files.
+
+    Uses inotify on Linux and falls back to polling file mtimes elsewhere (or
+    when inotify can't be set up). Events are debounced and passed to
+    on_change as one set of source files ("jobs/writer.md"), so a burst of
+    saves costs one incremental re-index. If on_change fails, its files are
+    retried with exponential backoff, together with any touched meanwhile.
+    """
+
+    def __init__(
+        self,
+        data_dir: str,
+        on_change: Callable[[Set[str]], Awaitable[Any]],
+        debounce_seconds: float = DATA_WATCHER_DEBOUNCE_SECONDS,
+        poll_seconds: float = DATA_WATCHER_POLL_SECONDS,
+        retry_seconds: float = DATA_WATCHER_RETRY_SECONDS,
+        max_retry_seconds: float = DATA_WATCHER_RETRY_MAX_SECONDS,
+        use_inotify: bool = sys.platform.startswith("linux")
+    ):
+        self.data_dir = data_dir
+        self.on_change = on_change
+        self.debounce_seconds = debounce_seconds
+        self.poll_seconds = poll_seconds
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        self.use_inotify = use_inotify
+        self.backend: Optional[str] = None
+        self._pending: Set[str] = set()
+        self._event = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._inotify: Optional[_InotifySource] = None
+        self.events = 0
+        self.reindexes = 0
+        self.failures = 0
+        self._retry_delay = retry_seconds
+        self.last_reindex_seconds: Optional[float] = None
+
+    def _touch(self, paths: Iterable[str]):
+        for path in paths:
+            self._pending.add(path)
+            self.events += 1
+        self._event.set()
+
+    def start(self):
+        if self.use_inotify:
+            try:
+                self._inotify = _InotifySource(self.data_dir, self._touch)
+                self._inotify.start()
+                self.backend = "inotify"
+            except Exception as e:
+                logger.warning(f"[WATCHER] inotify unavailable, polling instead: {e}")
+                self._inotify = None
+        if self._inotify is None:
+            self.backend = "polling"
+            self._tasks.append(asyncio.create_task(self._poll()))
+        self._tasks.append(asyncio.create_task(self._dispatch()))
+        logger.info(f"[WATCHER] Watching {self.data_dir} ({self.backend})")
+
+    async def stop(self):
+        if self._inotify:
+            self._inotify.close()
+            self._inotify = None
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _poll(self):
+        previous = await asyncio.to_thread(_snapshot, self.data_dir)
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            current = await asyncio.to_thread(_snapshot, self.data_dir)
+            touched = {path for path in previous.keys() | current.keys() if previous.get(path) != current.get(path)}
+            previous = current
+            if touched:
+                self._touch(touched)
+
+    async def _dispatch(self):
+        while True:
+            await self._event.wait()
+            # Debounce: wait until the directory has been quiet for a moment
+            while True:
+                self._event.clear()
+                try:
+                    await asyncio.wait_for(self._event.wait(), self.debounce_seconds)
+                except asyncio.TimeoutError:
+                    break
+
+            batch, self._pending = self._pending, set()
+            start = time.perf_counter()
+            try:
+                await self.on_change(batch)
+            except Exception as e:
+                self.failures += 1
+                logger.error(
+                    f"[WATCHER] Re-index of {sorted(batch)} failed, retrying in {self._retry_delay:.0f}s: {e}",
+                    exc_info=True
+                )
+                # Keep the files pending so the index doesn't stay stale until they're touched again
+                self._pending |= batch
+                await asyncio.sleep(self._retry_delay)
+                self._retry_delay = min(self._retry_delay * 2, self.max_retry_seconds)
+                self._event.set()
+                continue
+
+            self.reindexes += 1
+            self._retry_delay = self.retry_seconds
+            self.last_reindex_seconds = time.perf_counter() - start
+            logger.info(f"[WATCHER] Re-indexed {len(batch)} files in {self.last_reindex_seconds:.2f}s")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "events": self.events,
+            "reindexes": self.reindexes,
+            "failures": self.failures,
+            "pending_files": len(self._pending),
+            "last_reindex_seconds": self.last_reindex_seconds
+        }
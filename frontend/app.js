@@ -13,15 +13,11 @@ document.addEventListener('DOMContentLoaded', () => {
 
     let visitorSummary = null;
     let isChatting = true;
-    let chatHistoryData = []; // Stores {role: 'user'|'ai', content: string}
+    // The server keeps chat history and block context for this session; requests only carry what changed
+    let sessionId = null;
+    let messageCount = 0;
     let blockDataMap = new Map(); // Maps block ID to {actionType, actionValue, blockSummary}
 
-    // Context Tracker
-    let contextTracker = {
-        blockSummaries: [],
-        shownExperienceCounts: {}
-    };
-
     // --- Chat Logic ---
 
     function appendMessage(text, sender) {
@@ -34,11 +30,11 @@ document.addEventListener('DOMContentLoaded', () => {
             chatHistory.appendChild(div);
         });
 
-        chatHistoryData.push({ role: sender === 'user' ? 'user' : 'assistant', content: text });
+        messageCount++;
     }
 
     async function sendChat(message) {
-        if (!message && chatHistoryData.length > 0) return; 
+        if (!message && messageCount > 0) return; 
         
         if (message) {
             appendMessage(message, 'user');
@@ -55,10 +51,22 @@ document.addEventListener('DOMContentLoaded', () => {
                 body: JSON.stringify({ 
                     message: message, 
                     visitor_context: {},
-                    history: chatHistoryData 
+                    session_id: sessionId
                 })
             });
+            if (res.status === 404 && sessionId) {
+                // The session expired or the server restarted; start a fresh conversation
+                sessionId = null;
+                messageCount = 0;
+                chatHistory.innerHTML = '';
+                await startChat();
+                return;
+            }
+            if (!res.ok) {
+                throw new Error(`Chat request failed: ${res.status}`);
+            }
             const data = await res.json();
+            sessionId = data.session_id || sessionId;
 
             if (data.ready) {
                 visitorSummary = data.visitor_summary;
@@ -95,7 +103,11 @@ document.addEventListener('DOMContentLoaded', () => {
                     history: [] 
                 }) 
             });
+            if (!res.ok) {
+                throw new Error(`Chat request failed: ${res.status}`);
+            }
             const data = await res.json();
+            sessionId = data.session_id;
             appendMessage(data.message, 'ai');
         } catch (err) {
             console.error(err);
@@ -124,8 +136,6 @@ document.addEventListener('DOMContentLoaded', () => {
         bottomChatbar.classList.remove('hidden');
         aiDisclaimer.classList.remove('hidden');
         console.log('Bottom chatbar and AI disclaimer shown');
-
-        await loadSuggestedButtons();
     }
 
     async function generateBlock(actionType, actionValue, blockId = null) {
@@ -144,102 +154,132 @@ document.addEventListener('DOMContentLoaded', () => {
         }, 100);
 
         try {
-            // Build context object
-            const context = {
-                block_summaries: contextTracker.blockSummaries,
-                shown_experience_counts: contextTracker.shownExperienceCounts
-            };
+            // Generate unique ID for this block
+            const newBlockId = blockId || 'block-' + Date.now();
 
-            const res = await fetch('/api/generate-block', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({
-                    visitor_summary: visitorSummary,
-                    context: context,
-                    action_type: actionType,
-                    action_value: actionValue
-                })
-            });
+            // Create wrapper for new block; it is filled in as HTML streams in
+            const wrapper = document.createElement('div');
+            wrapper.className = 'block-wrapper';
+            wrapper.id = newBlockId;
 
-            const data = await res.json();
+            let html = '';
+            let renderPending = false;
+            let streamFinished = false;
+            let attached = false;
+            let buttonsReceived = false;
+
+            const stripScripts = (markup) => markup.replace(/<script\b[^<]*(?:(?!<\/script>)<[^<]*)*<\/script>/gi, '');
+
+            const attachWrapper = () => {
+                if (attached) return;
+                attached = true;
+                loadingIndicator.classList.add('hidden');
+                if (blockId) {
+                    const existingBlock = document.getElementById(blockId);
+                    if (existingBlock) {
+                        existingBlock.replaceWith(wrapper);
+                    }
+                } else {
+                    contentStream.appendChild(wrapper);
 
-            // Update context tracker
-            contextTracker.blockSummaries.push(data.block_summary);
+                    // Remove slide-down animation class after content is added
+                    aiDisclaimer.classList.remove('slide-down');
+                }
+            };
 
-            if (data.experience_ids) {
-                data.experience_ids.forEach(id => {
-                    contextTracker.shownExperienceCounts[id] = (contextTracker.shownExperienceCounts[id] || 0) + 1;
+            // Render partial HTML at most once per frame (scripts run only once complete)
+            const scheduleRender = () => {
+                if (renderPending) return;
+                renderPending = true;
+                requestAnimationFrame(() => {
+                    renderPending = false;
+                    if (!streamFinished) {
+                        wrapper.innerHTML = stripScripts(html);
+                    }
                 });
-            }
-
-            // Generate unique ID for this block
-            const newBlockId = blockId || 'block-' + Date.now();
+            };
 
-            // Store block data for regeneration
-            blockDataMap.set(newBlockId, {
-                actionType: actionType,
-                actionValue: actionValue,
-                blockSummary: data.block_summary
-            });
+            // Finish the block as soon as its HTML is complete; the summary follows later
+            // and only matters for the next request's context
+            const finalizeBlock = () => {
+                if (streamFinished) return;
+                attachWrapper();
+
+                // Store block data for regeneration
+                blockDataMap.set(newBlockId, {
+                    actionType: actionType,
+                    actionValue: actionValue,
+                    blockSummary: ''
+                });
 
-            // Create wrapper for new block
-            const wrapper = document.createElement('div');
-            wrapper.className = 'block-wrapper';
-            wrapper.id = newBlockId;
+                // Extract scripts from HTML before injection
+                // (scripts in innerHTML don't execute, so we need to extract and append them separately)
+                const tempDiv = document.createElement('div');
+                tempDiv.innerHTML = html;
+                const scripts = Array.from(tempDiv.querySelectorAll('script'));
+
+                // Set final wrapper content (without scripts)
+                streamFinished = true;
+                wrapper.innerHTML = stripScripts(html);
+
+                // Execute extracted scripts
+                // Scripts appended to DOM after elements are in place will execute properly
+                scripts.forEach(script => {
+                    const newScript = document.createElement('script');
+                    if (script.src) {
+                        newScript.src = script.src;
+                    } else {
+                        newScript.textContent = script.textContent;
+                    }
+                    wrapper.appendChild(newScript);
+                });
 
-            // Extract scripts from HTML before injection
-            // (scripts in innerHTML don't execute, so we need to extract and append them separately)
-            const tempDiv = document.createElement('div');
-            tempDiv.innerHTML = data.html;
-            const scripts = Array.from(tempDiv.querySelectorAll('script'));
+                // Add regenerate button
+                const regenerateBtn = document.createElement('button');
+                regenerateBtn.className = 'regenerate-btn';
+                regenerateBtn.innerHTML = `<svg viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round">
+                    <path d="M21.5 2v6h-6M2.5 22v-6h6M2 11.5a10 10 0 0 1 18.8-4.3M22 12.5a10 10 0 0 1-18.8 4.2"/>
+                </svg>`;
+                regenerateBtn.title = 'Regenerate this block';
+                regenerateBtn.onclick = () => regenerateBlock(newBlockId);
 
-            // Remove script tags from HTML to inject
-            const htmlWithoutScripts = data.html.replace(/<script\b[^<]*(?:(?!<\/script>)<[^<]*)*<\/script>/gi, '');
+                wrapper.appendChild(regenerateBtn);
 
-            // Set wrapper content (without scripts)
-            wrapper.innerHTML = htmlWithoutScripts;
+                // Scroll smoothly to the new block
+                wrapper.scrollIntoView({ behavior: 'smooth', block: 'start' });
+            };
 
-            // Execute extracted scripts
-            // Scripts appended to DOM after elements are in place will execute properly
-            scripts.forEach(script => {
-                const newScript = document.createElement('script');
-                if (script.src) {
-                    newScript.src = script.src;
-                } else {
-                    newScript.textContent = script.textContent;
+            // Block and suggested buttons are generated concurrently from one retrieval
+            // The server tracks shown experiences and block summaries for the session
+            await streamEvents('/api/generate-block-and-buttons/stream', {
+                action_type: actionType,
+                action_value: actionValue,
+                regenerate: Boolean(blockId)
+            }, (event, data) => {
+                if (event === 'html') {
+                    html += data;
+                    attachWrapper();
+                    scheduleRender();
+                } else if (event === 'experience_ids') {
+                    finalizeBlock();
+                } else if (event === 'block_summary') {
+                    const blockData = blockDataMap.get(newBlockId);
+                    if (blockData) blockData.blockSummary = data;
+                } else if (event === 'buttons') {
+                    buttonsReceived = true;
+                    renderSuggestedButtons(data);
+                } else if (event === 'error') {
+                    throw new Error(data.detail);
                 }
-                wrapper.appendChild(newScript);
             });
 
-            // Add regenerate button
-            const regenerateBtn = document.createElement('button');
-            regenerateBtn.className = 'regenerate-btn';
-            regenerateBtn.innerHTML = `<svg viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round">
-                <path d="M21.5 2v6h-6M2.5 22v-6h6M2 11.5a10 10 0 0 1 18.8-4.3M22 12.5a10 10 0 0 1-18.8 4.2"/>
-            </svg>`;
-            regenerateBtn.title = 'Regenerate this block';
-            regenerateBtn.onclick = () => regenerateBlock(newBlockId);
-
-            wrapper.appendChild(regenerateBtn);
-
-            if (blockId) {
-                const existingBlock = document.getElementById(blockId);
-                if (existingBlock) {
-                    existingBlock.replaceWith(wrapper);
-                }
-            } else {
-                contentStream.appendChild(wrapper);
+            finalizeBlock();
 
-                // Remove slide-down animation class after content is added
-                aiDisclaimer.classList.remove('slide-down');
+            // Buttons normally arrive on the stream; only fetch them separately if they didn't
+            if (!buttonsReceived) {
+                await loadSuggestedButtons();
             }
 
-            // Scroll smoothly to the new block
-            wrapper.scrollIntoView({ behavior: 'smooth', block: 'start' });
-
-            // Load suggested buttons while keeping loading indicator briefly visible for consistency
-            await loadSuggestedButtons();
-
         } catch (err) {
             console.error(err);
             alert("Failed to load content.");
@@ -249,13 +289,55 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
-    function extractTopicFromSummary(summary) {
-        if (!summary) return null;
-        const match = summary.match(/(?:Explored|Displayed|Showed|Highlighted)\s+(.+?)(?:\s+at|\s+from|\s+in|$)/i);
-        if (match && match[1]) {
-            return match[1].trim();
+    // POST with the session ID (plus the visitor summary, so the server can still
+    // serve the request statelessly). If the session expired or the server
+    // restarted, drop it and retry without one.
+    async function postWithSession(url, body, headers = {}) {
+        const request = (payload) => fetch(url, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', ...headers },
+            body: JSON.stringify(payload)
+        });
+        const payload = { ...body, visitor_summary: visitorSummary };
+        if (!sessionId) return request(payload);
+
+        const res = await request({ ...payload, session_id: sessionId });
+        if (res.status !== 404) return res;
+        console.warn('Session expired, continuing without it');
+        sessionId = null;
+        return request(payload);
+    }
+
+    // Read a Server-Sent Events response from a POST request, calling onEvent(event, data) per message
+    async function streamEvents(url, body, onEvent) {
+        const res = await postWithSession(url, body, { 'Accept': 'text/event-stream' });
+        if (!res.ok || !res.body) {
+            throw new Error(`Stream request failed: ${res.status}`);
+        }
+
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const message = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let event = 'message';
+                let data = '';
+                message.split('\n').forEach(line => {
+                    if (line.startsWith('event: ')) event = line.slice(7);
+                    else if (line.startsWith('data: ')) data += line.slice(6);
+                });
+                onEvent(event, data ? JSON.parse(data) : null);
+            }
         }
-        return summary.substring(0, 50).trim();
     }
 
     async function regenerateBlock(blockId) {
@@ -287,39 +369,32 @@ document.addEventListener('DOMContentLoaded', () => {
         try {
             console.log('Loading suggested buttons...');
 
-            // Build context object
-            const context = {
-                block_summaries: contextTracker.blockSummaries,
-                shown_experience_counts: contextTracker.shownExperienceCounts
-            };
-
-            const res = await fetch('/api/generate-buttons', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({
-                    visitor_summary: visitorSummary,
-                    chat_history: chatHistoryData,
-                    context: context
-                })
-            });
+            const res = await postWithSession('/api/generate-buttons', {});
+            if (!res.ok) {
+                throw new Error(`Button request failed: ${res.status}`);
+            }
 
             const data = await res.json();
             console.log('Received buttons:', data);
 
-            suggestedButtons.innerHTML = '';
-
-            data.buttons.forEach(btn => {
-                const button = document.createElement('button');
-                button.textContent = btn.label;
-                button.onclick = () => handleChatbarMessage(btn.prompt);
-                suggestedButtons.appendChild(button);
-            });
-            console.log(`Added ${data.buttons.length} buttons to the UI`);
+            renderSuggestedButtons(data.buttons);
         } catch (err) {
             console.error('Failed to load suggested buttons:', err);
         }
     }
 
+    function renderSuggestedButtons(buttons) {
+        suggestedButtons.innerHTML = '';
+
+        buttons.forEach(btn => {
+            const button = document.createElement('button');
+            button.textContent = btn.label;
+            button.onclick = () => handleChatbarMessage(btn.prompt);
+            suggestedButtons.appendChild(button);
+        });
+        console.log(`Added ${buttons.length} buttons to the UI`);
+    }
+
     async function handleChatbarMessage(message) {
         if (!message.trim()) return;
 
@@ -327,8 +402,6 @@ document.addEventListener('DOMContentLoaded', () => {
         chatbarInput.disabled = true;
         chatbarSend.disabled = true;
 
-        chatHistoryData.push({ role: 'user', content: message });
-
         await generateBlock('user_question', message);
 
         chatbarInput.disabled = false;